@@ -0,0 +1,158 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Columns of every channel CSV, in the raw_data layout
+CHANNEL_COLUMNS = {
+    'abm': ['abm_id', 'customer_id', 'amount_cad', 'debit_credit', 'cash_indicator', 'country', 'province',
+            'city', 'transaction_date', 'transaction_time'],
+    'card': ['card_trxn_id', 'customer_id', 'amount_cad', 'debit_credit', 'merchant_category', 'ecommerce_ind',
+             'country', 'province', 'city', 'transaction_date', 'transaction_time'],
+    'cheque': ['cheque_id', 'customer_id', 'amount_cad', 'debit_credit', 'transaction_date'],
+    'eft': ['eft_id', 'customer_id', 'amount_cad', 'debit_credit', 'transaction_date', 'transaction_time'],
+    'emt': ['emt_id', 'customer_id', 'amount_cad', 'debit_credit', 'transaction_date', 'transaction_time'],
+    'wire': ['wire_id', 'customer_id', 'amount_cad', 'debit_credit', 'transaction_date', 'transaction_time'],
+}
+
+# Share of all rows, debit share and transaction ID prefix of every channel
+CHANNEL_SHARES = {'card': 0.6, 'abm': 0.1, 'eft': 0.1, 'emt': 0.1, 'cheque': 0.05, 'wire': 0.05}
+DEBIT_SHARES = {'card': 0.9756, 'abm': 0.5, 'eft': 0.5, 'emt': 0.5, 'cheque': 0.5826, 'wire': 0.5563}
+ID_PREFIXES = {'abm': 'ABM', 'card': 'CAR', 'cheque': 'CHE', 'eft': 'EFT', 'emt': 'EMT', 'wire': 'WIR'}
+
+# (country, province, city) of the card and ABM transactions, 'other' and missing values included
+LOCATIONS = [
+    ('CA', 'ON', 'TORONTO'), ('CA', 'ON', 'NORTH YORK'), ('CA', 'ON', 'OTTAWA'), ('CA', 'QC', 'MONTREAL'),
+    ('CA', 'BC', 'VANCOUVER'), ('CA', 'AB', 'CALGARY'), ('CA', 'SK', 'REGINA'), ('US', 'NY', 'NEW YORK'),
+    ('US', 'CA', 'LOS ANGELES'), ('CA', 'other', 'other'), (None, None, None),
+]
+LOCATION_WEIGHTS = np.array([0.25, 0.1, 0.1, 0.15, 0.12, 0.08, 0.05, 0.05, 0.03, 0.04, 0.03])
+
+MERCHANT_CATEGORIES = ['5411', '5812', '5541', '4111', '5999', 'other']
+INDUSTRIES = {7292: 'Personal Services', 1121: 'Cattle Farms', 5411: 'Grocery Stores', 6221: 'Commodity Dealers',
+              8111: 'Legal Services', 4111: 'Transit Systems', 5812: 'Restaurants', 2362: 'Construction'}
+
+START_DATE = np.datetime64('2022-11-01T00:00:00')
+PERIOD_SECONDS = 92 * 86400
+
+
+def customer_ids(n_customers):
+    return np.array([f'SYNCID{i:010d}' for i in range(n_customers)], dtype=object)
+
+
+def customer_cdf(n_customers, skew):
+    """
+    Cumulative draw probabilities of the customers, Zipf-like with the given exponent.
+
+    A skew of 0 spreads the transactions evenly, around 1 a few customers hold a large
+    share of them, like the heaviest accounts of the real data.
+    """
+    weights = 1.0 / np.arange(1, n_customers + 1) ** skew
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def channel_chunk(channel, rng, start, n, cdf, ids):
+    """One chunk of a channel: n rows with transaction numbers starting at start"""
+    columns = CHANNEL_COLUMNS[channel]
+    debit = rng.random(n) < DEBIT_SHARES[channel]
+    amount = np.round(rng.lognormal(4.5, 1.4, n), 2)
+    seconds = rng.integers(0, PERIOD_SECONDS, n)
+    timestamps = pd.DatetimeIndex(START_DATE + seconds.astype('timedelta64[s]'))
+    data = {
+        columns[0]: [f'{ID_PREFIXES[channel]}{i:017d}' for i in range(start, start + n)],
+        'customer_id': ids[np.minimum(np.searchsorted(cdf, rng.random(n)), len(ids) - 1)],
+        # Credited card transactions are negative in card.csv
+        'amount_cad': np.where(debit, amount, -amount) if channel == 'card' else amount,
+        'debit_credit': np.where(debit, 'debit', 'credit'),
+        'transaction_date': timestamps.strftime('%Y-%m-%d'),
+    }
+    if 'transaction_time' in columns:
+        data['transaction_time'] = timestamps.strftime('%H:%M:%S')
+    if 'city' in columns:
+        location = rng.choice(len(LOCATIONS), n, p=LOCATION_WEIGHTS / LOCATION_WEIGHTS.sum())
+        for i, col in enumerate(['country', 'province', 'city']):
+            data[col] = np.array([loc[i] for loc in LOCATIONS], dtype=object)[location]
+    if channel == 'abm':
+        data['cash_indicator'] = rng.random(n) < 0.6
+    if channel == 'card':
+        data['merchant_category'] = rng.choice(MERCHANT_CATEGORIES, n)
+        data['ecommerce_ind'] = rng.random(n) < 0.3
+    return pd.DataFrame(data, columns=columns)
+
+
+def write_kyc(output_dir, ids, rng):
+    """kyc.csv for every customer and kyc_industry_codes.csv"""
+    n = len(ids)
+    location = rng.choice(len(LOCATIONS) - 2, n)
+    established = START_DATE - rng.integers(365, 20 * 365, n).astype('timedelta64[D]')
+    onboard = START_DATE - rng.integers(30, 3 * 365, n).astype('timedelta64[D]')
+    kyc = pd.DataFrame({
+        'customer_id': ids,
+        'country': [LOCATIONS[i][0] for i in location],
+        'province': [LOCATIONS[i][1] for i in location],
+        'city': [LOCATIONS[i][2] for i in location],
+        'industry_code': rng.choice(list(INDUSTRIES), n),
+        'employee_count': rng.integers(0, 500, n).astype(float),
+        'sales': np.round(rng.lognormal(12, 2, n), 0),
+        'established_date': pd.DatetimeIndex(established).strftime('%Y-%m-%d'),
+        'onboard_date': pd.DatetimeIndex(onboard).strftime('%Y-%m-%d'),
+    })
+    kyc.to_csv(output_dir / 'kyc.csv', index=False)
+    pd.DataFrame({'industry_code': list(INDUSTRIES), 'industry': list(INDUSTRIES.values())}).to_csv(
+        output_dir / 'kyc_industry_codes.csv', index=False)
+
+
+def generate_dataset(output_dir, n_rows, n_customers=None, skew=1.0, seed=0, chunk_rows=1_000_000):
+    """
+    Write the six channel CSVs and the KYC files of a synthetic dataset in the raw_data layout.
+
+    Rows are generated and appended chunk by chunk, so memory does not grow with n_rows.
+    The same arguments always give the same files.
+
+    Args:
+        output_dir (str or Path): Folder to write the CSVs to
+        n_rows (int): Total number of transactions over all channels
+        n_customers (int): Number of customers, default one per 50 transactions
+        skew (float): Zipf exponent of the transactions per customer, 0 for uniform
+        seed (int): Random seed
+        chunk_rows (int): Rows generated and written at a time
+
+    Returns:
+        dict: Number of rows written per channel
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    n_customers = n_customers or max(100, n_rows // 50)
+    ids = customer_ids(n_customers)
+    cdf = customer_cdf(n_customers, skew)
+    write_kyc(output_dir, ids, np.random.default_rng([seed, len(CHANNEL_SHARES)]))
+
+    rows = {}
+    for channel_index, (channel, share) in enumerate(CHANNEL_SHARES.items()):
+        rows[channel] = max(1, int(round(n_rows * share)))
+        path = output_dir / f'{channel}.csv'
+        for chunk_index, start in enumerate(range(0, rows[channel], chunk_rows)):
+            rng = np.random.default_rng([seed, channel_index, chunk_index])
+            chunk = channel_chunk(channel, rng, start, min(chunk_rows, rows[channel] - start), cdf, ids)
+            chunk.to_csv(path, mode='w' if chunk_index == 0 else 'a', header=chunk_index == 0, index=False)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic dataset in the raw_data layout')
+    parser.add_argument('output_dir', help='Folder to write the CSVs to')
+    parser.add_argument('--rows', type=float, default=1e5, help='Total number of transactions, e.g. 1e6')
+    parser.add_argument('--customers', type=int, default=None, help='Number of customers, default rows / 50')
+    parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of the transactions per customer')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = generate_dataset(args.output_dir, int(args.rows), args.customers, args.skew, args.seed)
+    print(f"Wrote {sum(rows.values())} transactions to {args.output_dir}: {rows}")
+
+
+if __name__ == "__main__":
+    main()
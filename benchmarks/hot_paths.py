@@ -0,0 +1,159 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / 'features' / 'Debit_Credit_Ratio'))
+sys.path.append(str(ROOT / 'features' / 'section3'))
+
+from Debit_Credit_Ratio import standardize_credit_debit, standardize_credit_debit_column
+from TransactionLocations import CustomerCityAnalyzer
+from chunked_reader import amount_sums
+from geo_entropy import ENTROPY_SCHEMAS, entropy_features
+from raw_data_cache import CHANNELS, load_channels
+
+
+def legacy_standardize(df):
+    """Row by row apply of standardize_credit_debit, as Debit_Credit_Ratio used to do"""
+    return df['debit_credit'].apply(standardize_credit_debit)
+
+
+def vectorized_standardize(df):
+    return standardize_credit_debit_column(df['debit_credit'])
+
+
+def legacy_abs_sum(df):
+    """Lambda aggregation formerly used by process_abm_file and process_transaction_files"""
+    return df.groupby('customer_id').agg({'amount_cad': lambda x: np.sum(np.abs(x))})['amount_cad']
+
+
+def vectorized_abs_sum(df):
+    """The integer cents sum the cash and debit/credit summaries now use"""
+    return amount_sums(df['customer_id'], df['amount_cad'].abs())
+
+
+def legacy_unique_cities(df):
+    """Set-building lambda formerly used by CustomerCityAnalyzer.process_frame"""
+    cities = df.groupby('customer_id')['city'].agg(
+        lambda x: set(str(city).lower().strip() for city in x if pd.notna(city))
+    )
+    return cities.map(len).sort_index()
+
+
+def vectorized_unique_cities(df):
+    analyzer = CustomerCityAnalyzer()
+    analyzer.process_frame(df, 'benchmark')
+    return analyzer.summary_frame().set_index('customer_id')['unique_cities']
+
+
+def location_counts(df):
+    """Share of every location in a customer's transactions, the input of the entropy step"""
+    parts = [df[col].replace(['other', np.nan], 'unknown') for col in ['country', 'province', 'city']]
+    locations = pd.DataFrame({'customer_id': df['customer_id'],
+                              'location': parts[0] + '_' + parts[1] + '_' + parts[2]})
+    counts = locations.groupby(['customer_id', 'location']).size().reset_index(name='count')
+    counts['proportion'] = counts['count'] / counts.groupby('customer_id')['count'].transform('sum')
+    return counts
+
+
+# The city level of the competition schema, on the stacked card and abm locations
+CITY_ENTROPY_SCHEMA = {
+    'value_channels': ['located'],
+    'value_columns': ENTROPY_SCHEMAS['competition']['value_columns'],
+    'fill_channels': ['located'],
+    'levels': {'city': ENTROPY_SCHEMAS['competition']['levels']['city']},
+}
+
+
+def legacy_entropy(df):
+    """Per-customer apply formerly used by Geo Entropy.py"""
+    def calculate_entropy(group):
+        proportions = group['proportion']
+        return -np.sum(proportions * np.log2(proportions))
+    return location_counts(df).groupby('customer_id').apply(calculate_entropy, include_groups=False)
+
+
+def vectorized_entropy(df):
+    """The geo_entropy city entropy behind geographical_entropy.csv"""
+    return entropy_features({'located': df}, CITY_ENTROPY_SCHEMA)['city_entropy']
+
+
+def best_time(func, data, repeats):
+    """Fastest of several runs in seconds, with the result of the last run"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def same_result(legacy, vectorized):
+    """Whether two results agree, floats up to summation order"""
+    legacy = pd.Series(legacy).reset_index(drop=True)
+    vectorized = pd.Series(vectorized).reset_index(drop=True)
+    if len(legacy) != len(vectorized):
+        return False
+    if pd.api.types.is_float_dtype(legacy) and pd.api.types.is_float_dtype(vectorized):
+        return bool(np.allclose(legacy, vectorized, rtol=1e-12, atol=1e-12))
+    return bool(legacy.fillna('').astype(str).equals(vectorized.fillna('').astype(str)))
+
+
+def benchmark_cases(dfs):
+    """(name, legacy, vectorized, data) of every hot path, on the channels that have the columns"""
+    stacked = pd.concat([df[['customer_id', 'amount_cad', 'debit_credit']] for df in dfs.values()],
+                        ignore_index=True)
+    located = pd.concat([dfs[channel][['customer_id', 'country', 'province', 'city']]
+                         for channel in ['card', 'abm'] if channel in dfs], ignore_index=True)
+    return [
+        ('standardize_credit_debit', legacy_standardize, vectorized_standardize, stacked),
+        ('abs_amount_sum', legacy_abs_sum, vectorized_abs_sum, stacked),
+        ('unique_cities', legacy_unique_cities, vectorized_unique_cities, located),
+        ('geographical_entropy', legacy_entropy, vectorized_entropy, located),
+    ]
+
+
+def run_benchmarks(data_dir='raw_data', repeats=3):
+    """
+    Time the legacy lambda/apply implementations against their vectorized replacements.
+
+    Args:
+        data_dir (str): Folder with the channel CSVs
+        repeats (int): Runs per implementation, the fastest one is reported
+
+    Returns:
+        pd.DataFrame: One row per hot path with both timings, the speedup and whether the
+            results agree
+    """
+    dfs = load_channels([channel for channel in CHANNELS if (Path(data_dir) / f'{channel}.csv').exists()],
+                        data_dir=data_dir)
+    rows = []
+    for name, legacy, vectorized, data in benchmark_cases(dfs):
+        legacy_seconds, legacy_result = best_time(legacy, data, repeats)
+        vectorized_seconds, vectorized_result = best_time(vectorized, data, repeats)
+        rows.append({'hot_path': name,
+                     'rows': len(data),
+                     'legacy_seconds': legacy_seconds,
+                     'vectorized_seconds': vectorized_seconds,
+                     'speedup': legacy_seconds / vectorized_seconds,
+                     'same_result': same_result(legacy_result, vectorized_result)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vectorized feature hot paths on raw_data')
+    parser.add_argument('--data-dir', default='raw_data', help='Folder with the channel CSVs')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per implementation')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.data_dir, args.repeats)
+    print(results.to_string(index=False, float_format=lambda value: f'{value:.4f}'))
+
+
+if __name__ == "__main__":
+    main()
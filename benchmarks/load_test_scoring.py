@@ -0,0 +1,134 @@
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from scoring_service import AnomalyModel, ScoringService
+
+
+def random_model(n_customers=5000, n_features=120, n_components=50, seed=0):
+    """An AnomalyModel fitted on random data shaped like comp_cust_level_training_data.csv"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.lognormal(0, 1, (n_customers, n_features)),
+                      columns=[f'feature_{i}' for i in range(n_features)])
+    return AnomalyModel.fit(df, n_components)
+
+
+def in_process_client(service):
+    return lambda rows: service.score_features(rows, timeout=30)
+
+
+def http_client(url):
+    def score(rows):
+        request = urllib.request.Request(url, data=json.dumps({'rows': rows.tolist()}).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())['scores']
+    return score
+
+
+def load_test(score, rows, clients=8, requests_per_client=200, rows_per_request=1, seed=0):
+    """
+    Send requests from concurrent client threads and time every one of them.
+
+    Args:
+        score (callable): Scores a (rows_per_request, n_features) array
+        rows (np.ndarray): Feature rows the requests are drawn from
+        clients (int): Concurrent client threads
+        requests_per_client (int): Requests sent by every client, one after the other
+        rows_per_request (int): Customers per request
+
+    Returns:
+        dict: Latency percentiles in milliseconds, requests and rows per second, errors
+    """
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+
+    def client(i):
+        rng = np.random.default_rng([seed, i])
+        for _ in range(requests_per_client):
+            batch = rows[rng.integers(0, len(rows), rows_per_request)]
+            start = time.perf_counter()
+            try:
+                score(batch)
+            except (RuntimeError, OSError, FutureTimeoutError, urllib.error.URLError):
+                errors[i] += 1
+                continue
+            latencies[i].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    latencies = np.concatenate([np.array(client_latencies) for client_latencies in latencies]) * 1000
+    return {'requests': len(latencies),
+            'errors': sum(errors),
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p90_ms': float(np.percentile(latencies, 90)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'max_ms': float(latencies.max()) if len(latencies) else None,
+            'requests_per_second': len(latencies) / seconds,
+            'rows_per_second': len(latencies) * rows_per_request / seconds,
+            'seconds': seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency and throughput of the anomaly scoring service')
+    parser.add_argument('--model', default=None, help='AnomalyModel pickle, default a model fitted on random data')
+    parser.add_argument('--data', default=None, help='Feature CSV the requests are drawn from')
+    parser.add_argument('--url', default=None, help='Test a running server, e.g. http://127.0.0.1:8000/score')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per client')
+    parser.add_argument('--rows-per-request', type=int, default=1)
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=1, help='torch CPU threads')
+    args = parser.parse_args()
+
+    model = AnomalyModel.load(args.model) if args.model else random_model()
+    if args.data:
+        rows = model.feature_matrix(pd.read_csv(args.data))
+    else:
+        rows = np.random.default_rng(1).lognormal(0, 1, (1000, len(model.columns)))
+
+    service = None
+    if args.url:
+        score = http_client(args.url)
+    else:
+        service = ScoringService(model, args.max_batch_size, args.max_wait_ms, num_threads=args.threads)
+        score = in_process_client(service)
+
+    # Warm up the model and the threads before measuring
+    load_test(score, rows, clients=1, requests_per_client=10, rows_per_request=args.rows_per_request)
+    result = load_test(score, rows, args.clients, args.requests, args.rows_per_request)
+    print(f"{result['requests']} requests ({result['errors']} errors) from {args.clients} clients, "
+          f"{args.rows_per_request} rows each")
+    if result['requests']:
+        print(f"latency p50 {result['p50_ms']:.2f} ms  p90 {result['p90_ms']:.2f} ms  "
+              f"p99 {result['p99_ms']:.2f} ms  max {result['max_ms']:.2f} ms")
+    else:
+        print("latency n/a, every request failed")
+    print(f"throughput {result['requests_per_second']:.0f} requests/s, {result['rows_per_second']:.0f} rows/s")
+    if service is not None:
+        stats = service.stats()['features']
+        print(f"mean batch {stats['items'] / max(stats['batches'], 1):.1f} rows over {stats['batches']} batches")
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
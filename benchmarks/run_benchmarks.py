@@ -0,0 +1,307 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, memory is then not reported
+    resource = None
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+for folder in ['Cash_Indicator_Ratio', 'Debit_Credit_Ratio', 'HighRiskTransactionFlag', 'section3', 'section_4_5']:
+    sys.path.append(str(ROOT / 'features' / folder))
+
+from generate_data import CHANNEL_COLUMNS, generate_dataset
+from raw_data_cache import load_csv
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def volume_frequency_case(data_dir, work_dir):
+    from transaction_volume_and_frequency import load_transaction_files, transaction_features
+    transaction_features(load_transaction_files(data_dir))
+
+
+def cash_indicator_case(data_dir, work_dir, memory_limit_mb=None):
+    import cash_indicator_ratio
+    summary = cash_indicator_ratio.process_transaction_files(data_dir, memory_limit_mb)
+    cash_indicator_ratio.compute_abm_ratios(summary)
+
+
+def debit_credit_case(data_dir, work_dir, memory_limit_mb=None):
+    import Debit_Credit_Ratio
+    summary = Debit_Credit_Ratio.process_transaction_files(data_dir, memory_limit_mb)
+    Debit_Credit_Ratio.compute_credit_debit_ratio(summary)
+
+
+def high_value_case(data_dir, work_dir):
+    from High_value_transaction import TransactionAnalyzer
+    analyzer = TransactionAnalyzer(os.path.join(data_dir, 'kyc.csv'))
+    for channel in CHANNEL_COLUMNS:
+        analyzer.load_transaction_file(channel, os.path.join(data_dir, f'{channel}.csv'))
+    analyzer.process_transactions(work_dir)
+
+
+def city_case(data_dir, work_dir):
+    from TransactionLocations import CustomerCityAnalyzer
+    analyzer = CustomerCityAnalyzer()
+    for channel in CHANNEL_COLUMNS:
+        analyzer.process_file(Path(data_dir) / f'{channel}.csv')
+    analyzer.summary_frame()
+
+
+def geo_entropy_case(data_dir, work_dir):
+    from geo_entropy import entropy_features, load_schema_frames
+    entropy_features(load_schema_frames('competition', data_dir), 'competition')
+
+
+def features_4_5_case(data_dir, work_dir):
+    from rolling_velocity import DEFAULT_WINDOWS
+    from sharded_features import compute_sharded_features
+    dfs = {channel: load_csv(os.path.join(data_dir, f'{channel}.csv')) for channel in CHANNEL_COLUMNS}
+    for df in dfs.values():
+        df.sort_values(by=['customer_id', 'transaction_datetime'], ignore_index=True, inplace=True)
+    compute_sharded_features(dfs, DEFAULT_WINDOWS)
+
+
+# Benchmark name -> function(data_dir, work_dir) running one feature module end to end
+CASES = {
+    'transaction_volume_and_frequency': volume_frequency_case,
+    'cash_indicator_ratio': cash_indicator_case,
+    'cash_indicator_ratio_chunked': partial(cash_indicator_case, memory_limit_mb=64),
+    'Debit_Credit_Ratio': debit_credit_case,
+    'Debit_Credit_Ratio_chunked': partial(debit_credit_case, memory_limit_mb=64),
+    'High_value_transaction': high_value_case,
+    'TransactionLocations': city_case,
+    'Geo Entropy': geo_entropy_case,
+    'synth_features_4_5': features_4_5_case,
+}
+
+
+def peak_rss_mb(who=None):
+    """Peak resident memory in megabytes of this process (or its finished children), None without resource"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return usage / 2 ** 20 if sys.platform == 'darwin' else usage / 2 ** 10
+
+
+def run_case(name, data_dir, queue):
+    """Run one benchmark in this (fresh) process and put its measurements on the queue"""
+    start_rss = peak_rss_mb()
+    status = 'ok'
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        try:
+            CASES[name](str(data_dir), work_dir)
+        except Exception as e:
+            status = f'error: {e}'
+        seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+    queue.put({'seconds': seconds,
+               'peak_rss_mb': peak,
+               'rss_increase_mb': peak - start_rss if peak is not None else None,
+               'children_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource is not None else None,
+               'status': status})
+
+
+def wait_for_run(process, queue, timeout=None, poll_seconds=1.0):
+    """
+    Measurements of a run_case process, or a failed run when it dies or times out.
+
+    The queue is polled while the process is alive, so a child killed by the OOM killer or
+    a signal does not block the benchmark run forever.
+
+    Returns:
+        dict: The measurements put on the queue, or None measurements and a 'crashed' or
+            'timeout' status
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    result, status = None, None
+    while result is None:
+        try:
+            result = queue.get(timeout=poll_seconds)
+        except queue_module.Empty:
+            if not process.is_alive():
+                # The result may still be in flight when the process exits
+                try:
+                    result = queue.get(timeout=poll_seconds)
+                except queue_module.Empty:
+                    status = f'crashed: exit code {process.exitcode}'
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                process.terminate()
+                status = f'timeout after {timeout:g}s'
+                break
+    process.join()
+    if result is not None:
+        return result
+    return {'seconds': None, 'peak_rss_mb': None, 'rss_increase_mb': None, 'children_peak_rss_mb': None,
+            'status': status}
+
+
+def measure(name, data_dir, repeats=1, timeout=None):
+    """
+    Time and memory of one benchmark, every run in a freshly spawned process so the
+    memory peak only covers that run.
+
+    Args:
+        name (str): Name in CASES
+        data_dir (Path): Dataset folder
+        repeats (int): Runs, the fastest time is kept
+        timeout (float): Seconds after which a run is stopped, None to wait for it
+
+    Returns:
+        dict: Fastest time, largest memory peaks and the status of the last run, or of the
+            first run that crashed or timed out (later runs are then skipped)
+    """
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeats):
+        queue = context.Queue()
+        process = context.Process(target=run_case, args=(name, data_dir, queue))
+        process.start()
+        runs.append(wait_for_run(process, queue, timeout))
+        if runs[-1]['seconds'] is None:
+            break
+
+    def smallest(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return min(values) if values else None
+
+    def largest(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return max(values) if values else None
+
+    return {'seconds': smallest('seconds'),
+            'peak_rss_mb': largest('peak_rss_mb'),
+            'rss_increase_mb': largest('rss_increase_mb'),
+            'children_peak_rss_mb': largest('children_peak_rss_mb'),
+            'status': runs[-1]['status']}
+
+
+def dataset_dir(n_rows, skew, seed):
+    """Folder of a generated dataset, generated on first use"""
+    path = DATA_DIR / f'rows{n_rows}_skew{skew:g}_seed{seed}'
+    if not (path / 'kyc.csv').exists():
+        print(f"Generating {n_rows} rows in {path}")
+        generate_dataset(path, n_rows, skew=skew, seed=seed)
+    # Build the Parquet cache up front so the first benchmark does not pay for it
+    for channel in CHANNEL_COLUMNS:
+        load_csv(path / f'{channel}.csv')
+    return path
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, skew=1.0, seed=0, cases=None, repeats=1, timeout=None):
+    """
+    Run the feature module benchmarks on generated datasets of several sizes.
+
+    Args:
+        sizes (list): Total transaction counts of the datasets
+        skew (float): Zipf exponent of the transactions per customer
+        seed (int): Seed of the generated datasets
+        cases (list): Names in CASES to run, None for all of them
+        repeats (int): Runs per benchmark, the fastest time is kept
+        timeout (float): Seconds after which a run is stopped and reported as failed
+
+    Returns:
+        dict: 'metadata' about the environment and 'results', one entry per (case, rows)
+    """
+    results = []
+    for n_rows in sizes:
+        data_dir = dataset_dir(n_rows, skew, seed)
+        for name in cases or list(CASES):
+            result = {'case': name, 'rows': n_rows, **measure(name, data_dir, repeats, timeout)}
+            print(f"{name:<34} {n_rows:>12} rows {result['seconds'] or float('nan'):>9.3f}s "
+                  f"peak {result['peak_rss_mb'] or float('nan'):>8.1f} MB  {result['status']}")
+            results.append(result)
+    metadata = {'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'git_commit': git_commit(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'skew': skew,
+                'seed': seed,
+                'repeats': repeats,
+                'timeout': timeout}
+    return {'metadata': metadata, 'results': results}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Benchmarks that got slower than a baseline run by more than the tolerance.
+
+    Returns:
+        list: (case, rows, baseline seconds, seconds) of every regression
+    """
+    previous = {(result['case'], result['rows']): result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        before = previous.get((result['case'], result['rows']))
+        if before is None or before['status'] != 'ok' or result['status'] != 'ok':
+            continue
+        if result['seconds'] > before['seconds'] * (1 + tolerance):
+            regressions.append((result['case'], result['rows'], before['seconds'], result['seconds']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and memory-profile the feature modules on generated data')
+    parser.add_argument('--rows', type=float, nargs='+', default=[1e4, 1e5],
+                        help='Dataset sizes in total transactions, from 1e4 up to 1e8')
+    parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of the transactions per customer')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=None)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=None, help='Seconds after which a run counts as failed')
+    parser.add_argument('--output', default=None, help='Results JSON, default results/<timestamp>.json')
+    parser.add_argument('--compare', default=None, help='Baseline results JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    results = run_benchmarks([int(rows) for rows in args.rows], args.skew, args.seed, args.cases, args.repeats,
+                             args.timeout)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + '\n')
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for case, rows, before, after in regressions:
+            print(f"Regression: {case} at {rows} rows took {after:.3f}s, {before:.3f}s before")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
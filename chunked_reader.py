@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+
+# Memory ceiling used when none is given, in megabytes
+DEFAULT_MEMORY_LIMIT_MB = 256
+
+# A chunk is parsed, masked and grouped, so it is held a few times over at peak
+CHUNK_COPIES = 4
+
+
+def estimate_row_bytes(csv_path, columns=None, sample_rows=10_000):
+    """Average in-memory size of one parsed row, measured on the first rows of the file"""
+    sample = pd.read_csv(csv_path, usecols=columns, nrows=sample_rows)
+    if len(sample) == 0:
+        return 1
+    return max(1, int(sample.memory_usage(index=True, deep=True).sum() / len(sample)))
+
+
+def chunk_rows(csv_path, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, columns=None):
+    """
+    Number of rows per chunk that keeps one chunk's working set under the memory ceiling.
+
+    Args:
+        csv_path (str or Path): CSV to read
+        memory_limit_mb (float): Memory ceiling in megabytes
+        columns (list): Columns that will be read, None for all of them
+
+    Returns:
+        int: Rows per chunk, at least 1000
+    """
+    row_bytes = estimate_row_bytes(csv_path, columns)
+    return max(1000, int(memory_limit_mb * 2 ** 20 / (row_bytes * CHUNK_COPIES)))
+
+
+def iter_csv_chunks(csv_path, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, columns=None):
+    """
+    Read a CSV in chunks sized by chunk_rows, parsed the same way as pd.read_csv.
+
+    Yields:
+        pd.DataFrame: Consecutive row chunks of the file
+    """
+    rows = chunk_rows(csv_path, memory_limit_mb, columns)
+    yield from pd.read_csv(csv_path, usecols=columns, chunksize=rows)
+
+
+def to_cents(amounts):
+    """
+    Amounts as int64 cents, or None when some amount is not a whole number of cents.
+
+    Integer sums are exact, so cent totals do not depend on the order the rows are added
+    in, which is what makes chunked and whole-file totals identical.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    cents = np.round(amounts * 100)
+    if not np.all(cents / 100 == amounts):
+        return None
+    return cents.astype(np.int64)
+
+
+def amount_sums(customer_ids, amounts):
+    """
+    Sum amounts per customer, over integer cents when the amounts allow it (see to_cents).
+
+    Returns:
+        pd.Series: Total per customer_id, sorted by customer_id
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    cents = to_cents(amounts)
+    if cents is None:
+        sums = pd.Series(amounts).groupby(np.asarray(customer_ids)).sum()
+    else:
+        sums = pd.Series(cents).groupby(np.asarray(customer_ids)).sum() / 100
+    return sums.rename_axis('customer_id')
+
+
+def amount_partial(amounts, name):
+    """
+    Columns to sum an amount with CustomerAccumulator: name holds the amounts and
+    name_cents the same amounts in cents, 0 when they are not whole cents.
+
+    Returns:
+        tuple: (columns, exact) where exact tells whether the cent column is usable
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    cents = to_cents(amounts)
+    exact = cents is not None
+    return {name: amounts, f'{name}_cents': cents if exact else np.zeros(len(amounts), dtype=np.int64)}, exact
+
+
+class CustomerAccumulator:
+    def __init__(self):
+        """
+        Running per-customer sums of chunk aggregates.
+
+        Every chunk is reduced to one row per customer first, so the accumulator only
+        ever holds one row per customer seen so far. Amount columns built with
+        amount_partial are totalled over exact cents when every chunk allowed it.
+        """
+        self.totals = None
+        self.exact = True
+
+    def add(self, partial, exact=True):
+        """
+        Fold in the aggregates of one chunk.
+
+        Args:
+            partial (pd.DataFrame): Numeric sums and counts indexed by customer_id
+            exact (bool): Whether the chunk's *_cents columns hold exact cents
+        """
+        self.exact = self.exact and exact
+        if self.totals is None:
+            self.totals = partial
+            return
+        # Reindexing with a 0 fill keeps integer columns integer, so cent sums stay exact
+        index = self.totals.index.union(partial.index)
+        self.totals = self.totals.reindex(index, fill_value=0) + partial.reindex(index, fill_value=0)
+
+    def result(self):
+        """Accumulated sums indexed by customer_id, sorted, None when nothing was added"""
+        if self.totals is None:
+            return None
+        totals = self.totals.sort_index()
+        totals.index.name = 'customer_id'
+        for cents_col in [col for col in totals.columns if col.endswith('_cents')]:
+            name = cents_col[:-len('_cents')]
+            if self.exact:
+                totals[name] = totals[cents_col] / 100
+            totals = totals.drop(columns=cents_col)
+        return totals
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class CustomerIndex:
+    def __init__(self, customers, indptr):
+        """
+        CSR-style index of the rows of every customer in a frame sorted by customer.
+
+        Rows indptr[i]:indptr[i + 1] belong to customers[i], so a customer's slice is found
+        without scanning, and per-customer reductions run as one ufunc.reduceat call.
+
+        Parameters:
+        customers (np.ndarray): Sorted unique customer IDs
+        indptr (np.ndarray): len(customers) + 1 row offsets, indptr[-1] is the number of rows
+        """
+        self.customers = customers
+        self.indptr = indptr
+
+    @classmethod
+    def from_sorted(cls, values):
+        """
+        Build the index of an array of customer IDs (or integer codes) sorted ascending.
+
+        Args:
+            values (np.ndarray): customer_id of every row, equal IDs contiguous
+
+        Returns:
+            CustomerIndex: The offsets index
+
+        Raises:
+            ValueError: If the rows of a customer are not contiguous
+        """
+        values = np.asarray(values)
+        customers, starts, counts = np.unique(values, return_index=True, return_counts=True)
+        indptr = np.append(starts, len(values)).astype(np.int64)
+        if not np.array_equal(np.diff(indptr), counts):
+            raise ValueError("Rows must be sorted by customer_id before building a CustomerIndex")
+        return cls(customers, indptr)
+
+    def __len__(self):
+        return len(self.customers)
+
+    def __iter__(self):
+        """Yield (customer, start, stop) for every customer"""
+        return zip(self.customers, self.indptr[:-1], self.indptr[1:])
+
+    def lengths(self):
+        """Number of rows of every customer"""
+        return np.diff(self.indptr)
+
+    def row_customers(self):
+        """Position in self.customers of every row, e.g. for np.bincount"""
+        return np.repeat(np.arange(len(self.customers)), self.lengths())
+
+    def reduce(self, values, ufunc=np.add):
+        """
+        Reduce a per-row array to one value per customer.
+
+        Args:
+            values (np.ndarray): One value per row, in the indexed row order
+            ufunc (np.ufunc): Reduction such as np.add, np.maximum or np.minimum
+
+        Returns:
+            np.ndarray: One value per customer
+        """
+        if len(self.customers) == 0:
+            return np.zeros(0, dtype=np.asarray(values).dtype)
+        return ufunc.reduceat(values, self.indptr[:-1])
+
+    def split_frame(self, df):
+        """
+        Split a DataFrame sorted like the index into per-customer slices.
+
+        Returns:
+            dict: customer_id mapped to the customer's rows (views, not copies)
+        """
+        return {customer: df.iloc[start:stop] for customer, start, stop in self}
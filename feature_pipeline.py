@@ -0,0 +1,146 @@
+import argparse
+import functools
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent
+for folder in ['Cash_Indicator_Ratio', 'Debit_Credit_Ratio', 'HighRiskTransactionFlag', 'section3', 'section_4_5']:
+    sys.path.append(str(ROOT / 'features' / folder))
+
+import cash_indicator_ratio
+import Debit_Credit_Ratio
+from High_value_transaction import TransactionAnalyzer
+from TransactionLocations import CustomerCityAnalyzer
+from geo_entropy import entropy_features
+from period_features import PERIOD_CHANNELS, compute_period_features
+from raw_data_cache import CHANNELS, load_channels
+from transaction_volume_and_frequency import transaction_features
+
+
+def cash_indicator_stage(dfs):
+    """ABM share of every customer's transaction count and amount"""
+    summary = cash_indicator_ratio.process_transaction_frames(dfs)
+    result_df, _ = cash_indicator_ratio.compute_abm_ratios(summary)
+    return result_df
+
+
+def debit_credit_stage(dfs):
+    """Credit and debit share of every customer's total amount"""
+    summary = Debit_Credit_Ratio.process_transaction_frames(dfs)
+    return Debit_Credit_Ratio.compute_credit_debit_ratio(summary)
+
+
+def high_value_stage(dfs, kyc_file):
+    """Number of transactions above the industry's 90th normalized percentile, per channel"""
+    analyzer = TransactionAnalyzer(kyc_file)
+    # Same channel order as HighRiskTransactionFlag/High_value_transaction.py
+    channels = [channel for channel in ['abm', 'emt', 'card', 'wire', 'eft', 'cheque'] if channel in dfs]
+    for channel in channels:
+        analyzer.add_transactions(channel, dfs[channel])
+    summary_df = analyzer.process_transactions()
+
+    columns = [f'{channel}_high_value_count' for channel in channels]
+    if summary_df is None:
+        return pd.DataFrame(columns=['customer_id'] + columns)
+    return summary_df.reindex(columns=['customer_id'] + columns, fill_value=0)
+
+
+def city_stage(dfs):
+    """Number of unique cities every customer transacted in"""
+    analyzer = CustomerCityAnalyzer()
+    for channel, df in dfs.items():
+        analyzer.process_frame(df, channel)
+    return analyzer.summary_frame()
+
+
+def volume_frequency_stage(dfs):
+    """Transaction frequency and debit/credit mean and std per channel"""
+    dfs = dict(dfs)
+    if 'card' in dfs:
+        # Credited card transactions are negative in card.csv
+        dfs['card'] = dfs['card'].assign(amount_cad=dfs['card']['amount_cad'].abs())
+    features = transaction_features(dfs)
+    return features.rename(columns={'customer ID': 'customer_id'})
+
+
+def period_stage(dfs):
+    """Section 4/5 weekly/monthly maxima, activity shares and merchant category dissimilarity"""
+    channel_features = []
+    for channel in [channel for channel in PERIOD_CHANNELS if channel in dfs]:
+        df = dfs[channel]
+        if channel == 'card':
+            # Credited card transactions are negative in card.csv
+            df = df.assign(amount_cad=df['amount_cad'].abs())
+        channel_features.append(compute_period_features(df, channel))
+
+    features = pd.concat(channel_features, axis=1).fillna(0)
+    features.index.name = 'customer_id'
+    return features.reset_index()
+
+
+def geo_entropy_stage(dfs):
+    """Shannon entropy of the country/province/city locations of card and ABM transactions"""
+    features = entropy_features(dfs, 'competition')
+    return features[['customer_id', 'city_entropy']].rename(columns={'city_entropy': 'geographical_entropy'})
+
+
+def default_stages(data_dir='raw_data'):
+    """Stages in the column order of comp_cust_level_training_data.csv"""
+    return [
+        ('cash_indicator_ratio', cash_indicator_stage),
+        ('debit_credit_ratio', debit_credit_stage),
+        ('high_risk_flag', functools.partial(high_value_stage, kyc_file=os.path.join(data_dir, 'kyc.csv'))),
+        ('customer_city_summary', city_stage),
+        ('transaction_volume_freq', volume_frequency_stage),
+        ('features_4_5', period_stage),
+        ('geographical_entropy', geo_entropy_stage),
+    ]
+
+
+def run_pipeline(data_dir='raw_data', output_file='comp_cust_level_training_data.csv', stages=None):
+    """
+    Build the customer-level training table in one process.
+
+    The raw channels are loaded once (through the Parquet cache) and every feature
+    family runs as a stage over those shared frames. Stage outputs are joined on
+    customer_id, so no stage depends on another one's row order.
+
+    Args:
+        data_dir (str): Folder with the channel CSVs and kyc.csv
+        output_file (str): Where to write the table, None to skip writing
+        stages (list): (name, function) pairs, each taking the channel frames and returning a
+            frame with a customer_id column, default default_stages(data_dir)
+
+    Returns:
+        pd.DataFrame: One row per customer seen in any channel, sorted by customer_id
+    """
+    stages = default_stages(data_dir) if stages is None else stages
+    dfs = load_channels(CHANNELS, data_dir)
+    customer_ids = np.sort(pd.unique(np.concatenate([df['customer_id'].dropna().to_numpy() for df in dfs.values()])))
+    table = pd.DataFrame({'customer_id': customer_ids})
+
+    for name, stage in stages:
+        start_time = time.time()
+        features = stage(dfs)
+        table = table.merge(features, on='customer_id', how='left')
+        print(f"Stage {name}: {features.shape[1] - 1} features in {time.time() - start_time:.1f}s")
+
+    table = table.fillna(0)
+    if output_file is not None:
+        table.to_csv(output_file, index=False)
+        print(f"Saved {table.shape[0]} customers x {table.shape[1] - 1} features to {output_file}")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the customer-level training table from the raw channels')
+    parser.add_argument('--data-dir', default='raw_data')
+    parser.add_argument('--output', default='comp_cust_level_training_data.csv')
+    args = parser.parse_args()
+
+    run_pipeline(args.data_dir, args.output)
@@ -1,8 +1,13 @@
 import pandas as pd
 import os
+import sys
 from pathlib import Path
 import numpy as np
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from raw_data_cache import load_csv
+from chunked_reader import DEFAULT_MEMORY_LIMIT_MB, CustomerAccumulator, amount_partial, amount_sums, iter_csv_chunks
+
 
 def process_abm_file(df):
     """
@@ -15,23 +20,18 @@ def process_abm_file(df):
         pd.DataFrame: Customer summary with cash-specific metrics
     """
     # Standard ABM metrics
-    standard_metrics = df.groupby('customer_id').agg({
-        'customer_id': 'count',  # Count of all transactions
-        'amount_cad': lambda x: np.sum(np.abs(x))  # Sum of all transaction amounts
-    }).rename(columns={
-        'customer_id': 'abm_count',
-        'amount_cad': 'abm_amount_cad'
+    standard_metrics = pd.DataFrame({
+        'abm_count': df.groupby('customer_id').size(),  # Count of all transactions
+        'abm_amount_cad': amount_sums(df['customer_id'], df['amount_cad'].abs())  # Sum of all transaction amounts
     })
 
     # Cash-specific metrics
     # Filter for cash transactions (where cash_indicator is True)
     cash_transactions = df[df['cash_indicator'] == True]
-    cash_metrics = cash_transactions.groupby('customer_id').agg({
-        'customer_id': 'count',  # Count of cash transactions
-        'amount_cad': lambda x: np.sum(np.abs(x))  # Sum of cash transaction amounts
-    }).rename(columns={
-        'customer_id': 'abm_cash_count',
-        'amount_cad': 'abm_cash_amount_cad'
+    cash_metrics = pd.DataFrame({
+        'abm_cash_count': cash_transactions.groupby('customer_id').size(),  # Count of cash transactions
+        'abm_cash_amount_cad': amount_sums(cash_transactions['customer_id'],
+                                           cash_transactions['amount_cad'].abs())  # Sum of cash transaction amounts
     })
 
     # Merge standard and cash metrics
@@ -49,10 +49,117 @@ def process_abm_file(df):
     return combined
 
 
-def process_transaction_files(folder_path):
+def summarize_channel(channel, df):
+    """
+    Count and sum the transactions of every customer in one channel.
+
+    Args:
+        channel (str): Channel name, used as the column prefix
+        df (pd.DataFrame): Transactions of the channel
+
+    Returns:
+        pd.DataFrame: Customer summary with customer_id as a column
+    """
+    # Special processing for ABM file
+    if channel == 'abm':
+        return process_abm_file(df)
+
+    # Standard processing for other files. Amounts are summed over exact cents when
+    # possible, so the totals match summarize_channel_chunked to the last digit
+    customer_summary = pd.DataFrame({
+        f'{channel}_count': df.groupby('customer_id').size(),
+        f'{channel}_amount_cad': amount_sums(df['customer_id'], df['amount_cad'].abs())
+    })
+    customer_summary.reset_index(inplace=True)
+    return customer_summary
+
+
+def summarize_channel_chunked(channel, file_path, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB):
+    """
+    Same summary as summarize_channel, read in chunks so that the channel never has to
+    fit in memory.
+
+    Args:
+        channel (str): Channel name, used as the column prefix
+        file_path (str): Path to the channel CSV
+        memory_limit_mb (float): Memory ceiling of one chunk, see chunked_reader.chunk_rows
+
+    Returns:
+        pd.DataFrame: Customer summary with customer_id as a column
+    """
+    columns = ['customer_id', 'amount_cad'] + (['cash_indicator'] if channel == 'abm' else [])
+    accumulator = CustomerAccumulator()
+    for chunk in iter_csv_chunks(file_path, memory_limit_mb, columns):
+        amount = chunk['amount_cad'].abs().to_numpy()
+        amount_columns, exact = amount_partial(amount, 'amount')
+        partial = pd.DataFrame({'count': np.ones(len(chunk), dtype=np.int64), **amount_columns})
+        if channel == 'abm':
+            is_cash = (chunk['cash_indicator'] == True).to_numpy()
+            cash_columns, cash_exact = amount_partial(np.where(is_cash, amount, 0), 'cash_amount')
+            partial = partial.assign(cash_count=is_cash.astype(np.int64), **cash_columns)
+            exact = exact and cash_exact
+        accumulator.add(partial.groupby(chunk['customer_id'].to_numpy()).sum(), exact)
+
+    totals = accumulator.result()
+    if totals is None:
+        return summarize_channel(channel, pd.read_csv(file_path, usecols=columns))
+
+    # Same columns and dtypes as summarize_channel builds from the full channel
+    standard_metrics = pd.DataFrame({f'{channel}_count': totals['count'].astype(np.int64),
+                                     f'{channel}_amount_cad': totals['amount']})
+    if channel != 'abm':
+        return standard_metrics.reset_index()
+
+    cash_totals = totals[totals['cash_count'] > 0]
+    cash_metrics = pd.DataFrame({'abm_cash_count': cash_totals['cash_count'].astype(np.int64),
+                                 'abm_cash_amount_cad': cash_totals['cash_amount']})
+    combined = pd.merge(standard_metrics, cash_metrics, how='left', left_index=True, right_index=True)
+    return combined.reset_index().fillna(0)
+
+
+def finalize_summary(final_df):
+    """Fill missing values, order the columns and sort the merged channel summaries"""
+    # Fill NaN values with 0
+    if final_df is not None:
+        final_df = final_df.fillna(0)
+
+        # Sort columns alphabetically after customer_id
+        cols = ['customer_id'] + sorted([col for col in final_df.columns if col != 'customer_id'])
+        final_df = final_df[cols]
+
+        # Sort by customer_id
+        final_df = final_df.sort_values('customer_id')
+
+    return final_df
+
+
+def process_transaction_frames(dfs):
+    """
+    Same summary as process_transaction_files, built from channel DataFrames already in memory.
+
+    Args:
+        dfs (dict): Channel name mapped to its transactions
+
+    Returns:
+        pd.DataFrame: Consolidated customer-level summary
+    """
+    final_df = None
+    for channel, df in dfs.items():
+        customer_summary = summarize_channel(channel, df)
+        if final_df is None:
+            final_df = customer_summary
+        else:
+            final_df = pd.merge(final_df, customer_summary, on='customer_id', how='outer')
+    return finalize_summary(final_df)
+
+
+def process_transaction_files(folder_path, memory_limit_mb=None):
     """
     Process transaction CSV files to create a consolidated customer-level summary.
     Special handling for ABM transactions to include cash indicators.
+
+    With a memory_limit_mb every channel is read in chunks under that ceiling instead of
+    being loaded whole, see summarize_channel_chunked.
     """
     # Initialize empty dataframe for final results
     final_df = None
@@ -67,21 +174,11 @@ def process_transaction_files(folder_path):
 
             # Read the CSV file
             file_path = os.path.join(folder_path, file)
-            df = pd.read_csv(file_path)
-
-            # Special processing for ABM file
-            if channel == 'abm':
-                customer_summary = process_abm_file(df)
+            if memory_limit_mb is None:
+                df = load_csv(file_path)
+                customer_summary = summarize_channel(channel, df)
             else:
-                # Standard processing for other files
-                customer_summary = df.groupby('customer_id').agg({
-                    'customer_id': 'count',
-                    'amount_cad': lambda x: np.sum(np.abs(x))
-                }).rename(columns={
-                    'customer_id': f'{channel}_count',
-                    'amount_cad': f'{channel}_amount_cad'
-                })
-                customer_summary.reset_index(inplace=True)
+                customer_summary = summarize_channel_chunked(channel, file_path, memory_limit_mb)
 
             # Merge with final_df if it exists, otherwise initialize it
             if final_df is None:
@@ -95,22 +192,12 @@ def process_transaction_files(folder_path):
 
         except Exception as e:
             print(f"Error processing {file}: {str(e)}")
-            print(f"Columns in the current file: {df.columns.tolist()}")
+            if 'df' in locals():
+                print(f"Columns in the current file: {df.columns.tolist()}")
             if final_df is not None:
                 print(f"Columns in final_df: {final_df.columns.tolist()}")
 
-    # Fill NaN values with 0
-    if final_df is not None:
-        final_df = final_df.fillna(0)
-
-        # Sort columns alphabetically after customer_id
-        cols = ['customer_id'] + sorted([col for col in final_df.columns if col != 'customer_id'])
-        final_df = final_df[cols]
-
-        # Sort by customer_id
-        final_df = final_df.sort_values('customer_id')
-
-    return final_df
+    return finalize_summary(final_df)
 
 
 def save_results(df, output_path, filename="transaction_summary.csv"):
@@ -138,6 +225,58 @@ def save_results(df, output_path, filename="transaction_summary.csv"):
                     print(f"  Total amount: ${df[col].sum():,.2f}")
 
 
+def compute_abm_ratios(df):
+    """
+    Calculate the ABM share of every customer's transaction count and amount.
+
+    Args:
+        df (pd.DataFrame): Transaction summary as returned by process_transaction_files
+
+    Returns:
+        tuple: (result_df, summary_stats) with the per-customer ratios and the overall totals
+    """
+    # Calculate total counts (excluding cash_count)
+    count_columns = [col for col in df.columns if col.endswith('_count') and col != 'cash_count']
+    total_count = df[count_columns].sum(axis=1)
+
+    # Calculate total amounts (excluding cash_amount_cad)
+    amount_columns = [col for col in df.columns if col.endswith('_amount_cad') and col != 'cash_amount_cad']
+    total_amount = df[amount_columns].sum(axis=1)
+
+    # Create new dataframe with ratios
+    result_df = pd.DataFrame()
+    result_df['customer_id'] = df['customer_id']
+
+    # Calculate ratios     
+    result_df['abm_count_ratio'] = df['abm_count'] / total_count.replace(0, np.nan)
+    result_df['abm_amount_ratio'] = df['abm_amount_cad'] / total_amount.replace(0, np.nan)
+
+    # Fill NaN values with 0
+    result_df = result_df.fillna(0)
+
+    # Calculate summary statistics
+    summary_stats = pd.DataFrame({
+        'Metric': [
+            'Overall ABM Count Ratio',
+            'Overall ABM Amount Ratio',
+            'Total ABM Transactions',
+            'Total All Transactions',
+            'Total ABM Amount',
+            'Total All Amount'
+        ],
+        'Value': [
+            df['abm_count'].sum() / total_count.sum() * 100,
+            df['abm_amount_cad'].sum() / total_amount.sum() * 100,
+            df['abm_count'].sum(),
+            total_count.sum(),
+            df['abm_amount_cad'].sum(),
+            total_amount.sum()
+        ]
+    })
+
+    return result_df, summary_stats
+
+
 def calculate_transaction_ratios(folder_path):
     """
     Calculate ABM transaction ratios (count and amount) compared to all transactions.
@@ -156,24 +295,7 @@ def calculate_transaction_ratios(folder_path):
         # Read the transaction summary file
         df = pd.read_csv(input_file)
 
-        # Calculate total counts (excluding cash_count)
-        count_columns = [col for col in df.columns if col.endswith('_count') and col != 'cash_count']
-        total_count = df[count_columns].sum(axis=1)
-
-        # Calculate total amounts (excluding cash_amount_cad)
-        amount_columns = [col for col in df.columns if col.endswith('_amount_cad') and col != 'cash_amount_cad']
-        total_amount = df[amount_columns].sum(axis=1)
-
-        # Create new dataframe with ratios
-        result_df = pd.DataFrame()
-        result_df['customer_id'] = df['customer_id']
-
-        # Calculate ratios     
-        result_df['abm_count_ratio'] = df['abm_count'] / total_count.replace(0, np.nan)
-        result_df['abm_amount_ratio'] = df['abm_amount_cad'] / total_amount.replace(0, np.nan)
-
-        # Fill NaN values with 0
-        result_df = result_df.fillna(0)
+        result_df, summary_stats = compute_abm_ratios(df)
 
         # Add original counts and amounts for reference
         #result_df['abm_count'] = df['abm_count']
@@ -185,26 +307,6 @@ def calculate_transaction_ratios(folder_path):
         #result_df['abm_count_percentage'] = result_df['abm_count_ratio'] * 100
         #result_df['abm_amount_percentage'] = result_df['abm_amount_ratio'] * 100
 
-        # Calculate summary statistics
-        summary_stats = pd.DataFrame({
-            'Metric': [
-                'Overall ABM Count Ratio',
-                'Overall ABM Amount Ratio',
-                'Total ABM Transactions',
-                'Total All Transactions',
-                'Total ABM Amount',
-                'Total All Amount'
-            ],
-            'Value': [
-                df['abm_count'].sum() / total_count.sum() * 100,
-                df['abm_amount_cad'].sum() / total_amount.sum() * 100,
-                df['abm_count'].sum(),
-                total_count.sum(),
-                df['abm_amount_cad'].sum(),
-                total_amount.sum()
-            ]
-        })
-
         # Create Excel writer object
         with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
             # Write detailed ratios to first sheet
@@ -218,7 +320,7 @@ def calculate_transaction_ratios(folder_path):
                 worksheet = writer.sheets[sheet_name]
                 for idx, col in enumerate(result_df.columns):
                     max_length = max(
-                        result_df[col].astype(str).apply(len).max(),
+                        result_df[col].astype(str).str.len().max(),
                         len(str(col))
                     ) + 2
                     worksheet.column_dimensions[chr(65 + idx)].width = max_length
@@ -247,10 +349,14 @@ if __name__ == "__main__":
 
     folder_path = os.curdir + '/raw_data'
     output_path = os.curdir + '/features/Cash_Indicator_Ratio'
-    
+
+    # --memory-limit-mb N reads the channels in chunks that stay under N megabytes
+    memory_limit_mb = None
+    if '--memory-limit-mb' in sys.argv:
+        memory_limit_mb = float(sys.argv[sys.argv.index('--memory-limit-mb') + 1])
 
     # Process files and create summary
-    result_df = process_transaction_files(folder_path)
+    result_df = process_transaction_files(folder_path, memory_limit_mb)
 
     # Save results
     save_results(result_df, output_path)
@@ -1,8 +1,13 @@
 import pandas as pd
 import os
+import sys
 from pathlib import Path
 import numpy as np
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from raw_data_cache import load_csv
+from chunked_reader import DEFAULT_MEMORY_LIMIT_MB, CustomerAccumulator, amount_partial, amount_sums, iter_csv_chunks
+
 
 def standardize_credit_debit(value):
     """
@@ -18,9 +23,163 @@ def standardize_credit_debit(value):
     return None
 
 
-def process_transaction_files(folder_path):
+def standardize_credit_debit_column(values):
+    """
+    Vectorized standardize_credit_debit for a whole column.
+
+    The rules are only applied once per distinct value, the rows then take their label
+    from that lookup table by integer code, so a column of millions of rows costs one
+    hashing pass instead of one Python call per row.
+
+    Args:
+        values (pd.Series): Raw debit_credit indicators
+
+    Returns:
+        pd.Series: 'credit', 'debit' or None for every row, on the index of values
+    """
+    codes, uniques = pd.factorize(values)
+    # Missing values get code -1, which picks the trailing None
+    labels = np.array([standardize_credit_debit(value) for value in uniques] + [None], dtype=object)
+    return pd.Series(labels[codes], index=values.index, name=values.name)
+
+
+def summarize_channel(channel, df):
+    """
+    Sum and count the credit and debit transactions of every customer in one channel.
+
+    Args:
+        channel (str): Channel name, used as the column prefix
+        df (pd.DataFrame): Transactions of the channel, left unchanged
+
+    Returns:
+        pd.DataFrame: Channel summary with customer_id as a column
+    """
+    # Because all the credited transactions are negative in the card.csv file 
+    # But all the other type of transactions are positive for both credited and debited transactions. 
+    amount_cad = df['amount_cad'].abs() if channel == 'card' else df['amount_cad']
+
+    # Standardize debit_credit column values
+    df = df.assign(amount_cad=amount_cad,
+                   debit_credit=standardize_credit_debit_column(df['debit_credit']))
+
+    # Calculate credit and debit amounts, summed over exact cents when possible so the
+    # totals match summarize_channel_chunked to the last digit
+    credit_rows = df[df['debit_credit'] == 'credit']
+    credit_df = amount_sums(credit_rows['customer_id'], credit_rows['amount_cad'].abs()).to_frame(f'{channel}_credit_amount')
+
+    debit_rows = df[df['debit_credit'] == 'debit']
+    debit_df = amount_sums(debit_rows['customer_id'], debit_rows['amount_cad'].abs()).to_frame(f'{channel}_debit_amount')
+
+    # Merge credit and debit summaries
+    channel_summary = pd.merge(credit_df, debit_df,
+                               how='outer',
+                               left_index=True,
+                               right_index=True)
+
+    # Reset index to make customer_id a column
+    channel_summary.reset_index(inplace=True)
+
+    # Add count columns
+    credit_counts = df[df['debit_credit'] == 'credit']['customer_id'].value_counts()
+    debit_counts = df[df['debit_credit'] == 'debit']['customer_id'].value_counts()
+
+    channel_summary[f'{channel}_credit_count'] = channel_summary['customer_id'].map(credit_counts).fillna(0)
+    channel_summary[f'{channel}_debit_count'] = channel_summary['customer_id'].map(debit_counts).fillna(0)
+
+    # Fill NaN values with 0
+    return channel_summary.fillna(0)
+
+
+def summarize_channel_chunked(channel, file_path, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB):
+    """
+    Same summary as summarize_channel, read in chunks so that the channel never has to
+    fit in memory.
+
+    Args:
+        channel (str): Channel name, used as the column prefix
+        file_path (str): Path to the channel CSV
+        memory_limit_mb (float): Memory ceiling of one chunk, see chunked_reader.chunk_rows
+
+    Returns:
+        pd.DataFrame: Channel summary with customer_id as a column
+    """
+    columns = ['customer_id', 'amount_cad', 'debit_credit']
+    accumulator = CustomerAccumulator()
+    for chunk in iter_csv_chunks(file_path, memory_limit_mb, columns):
+        amount = chunk['amount_cad'].abs().to_numpy()
+        direction = standardize_credit_debit_column(chunk['debit_credit'])
+        is_credit = (direction == 'credit').to_numpy()
+        is_debit = (direction == 'debit').to_numpy()
+        credit_columns, credit_exact = amount_partial(np.where(is_credit, amount, 0), 'credit_amount')
+        debit_columns, debit_exact = amount_partial(np.where(is_debit, amount, 0), 'debit_amount')
+        partial = pd.DataFrame({**credit_columns, **debit_columns,
+                                'credit_count': is_credit.astype(np.int64),
+                                'debit_count': is_debit.astype(np.int64)})
+        accumulator.add(partial.groupby(chunk['customer_id'].to_numpy()).sum(), credit_exact and debit_exact)
+
+    totals = accumulator.result()
+    if totals is None:
+        return summarize_channel(channel, pd.read_csv(file_path, usecols=columns))
+
+    # Same columns and dtypes as summarize_channel builds from the full channel
+    credit_totals = totals[totals['credit_count'] > 0]
+    debit_totals = totals[totals['debit_count'] > 0]
+    channel_summary = pd.merge(credit_totals[['credit_amount']].rename(columns={'credit_amount': f'{channel}_credit_amount'}),
+                               debit_totals[['debit_amount']].rename(columns={'debit_amount': f'{channel}_debit_amount'}),
+                               how='outer',
+                               left_index=True,
+                               right_index=True)
+    channel_summary.reset_index(inplace=True)
+
+    credit_counts = credit_totals['credit_count'].astype(np.int64)
+    debit_counts = debit_totals['debit_count'].astype(np.int64)
+    channel_summary[f'{channel}_credit_count'] = channel_summary['customer_id'].map(credit_counts).fillna(0)
+    channel_summary[f'{channel}_debit_count'] = channel_summary['customer_id'].map(debit_counts).fillna(0)
+    return channel_summary.fillna(0)
+
+
+def finalize_summary(final_df):
+    """Fill missing values, order the columns and sort the merged channel summaries"""
+    # Fill any remaining NaN values with 0
+    if final_df is not None:
+        final_df = final_df.fillna(0)
+
+        # Sort columns alphabetically after customer_id
+        cols = ['customer_id'] + sorted([col for col in final_df.columns if col != 'customer_id'])
+        final_df = final_df[cols]
+
+        # Sort by customer_id
+        final_df = final_df.sort_values('customer_id')
+
+    return final_df
+
+
+def process_transaction_frames(dfs):
+    """
+    Same summary as process_transaction_files, built from channel DataFrames already in memory.
+
+    Args:
+        dfs (dict): Channel name mapped to its transactions
+
+    Returns:
+        pd.DataFrame: Customer-level credit and debit summary
+    """
+    final_df = None
+    for channel, df in dfs.items():
+        channel_summary = summarize_channel(channel, df)
+        if final_df is None:
+            final_df = channel_summary
+        else:
+            final_df = pd.merge(final_df, channel_summary, on='customer_id', how='outer')
+    return finalize_summary(final_df)
+
+
+def process_transaction_files(folder_path, memory_limit_mb=None):
     """
     Process transaction CSV files to create customer-level summary of credit and debit amounts.
+
+    With a memory_limit_mb every channel is read in chunks under that ceiling instead of
+    being loaded whole, see summarize_channel_chunked.
     """
     final_df = None
     csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
@@ -38,43 +197,11 @@ def process_transaction_files(folder_path):
 
             # Read the CSV file
             file_path = os.path.join(folder_path, file)
-            df = pd.read_csv(file_path)
-            
-            # Because all the credited transactions are negative in the card.csv file 
-            # But all the other type of transactions are positive for both credited and debited transactions. 
-            if file == 'card.csv':
-                df['amount_cad'] = df['amount_cad'].abs()
-
-            # Standardize debit_credit column values
-            df['debit_credit'] = df['debit_credit'].apply(standardize_credit_debit)
-
-            # Calculate credit and debit amounts
-            credit_df = df[df['debit_credit'] == 'credit'].groupby('customer_id').agg({
-                'amount_cad': lambda x: np.sum(np.abs(x))
-            }).rename(columns={'amount_cad': f'{channel}_credit_amount'})
-
-            debit_df = df[df['debit_credit'] == 'debit'].groupby('customer_id').agg({
-                'amount_cad': lambda x: np.sum(np.abs(x))
-            }).rename(columns={'amount_cad': f'{channel}_debit_amount'})
-
-            # Merge credit and debit summaries
-            channel_summary = pd.merge(credit_df, debit_df,
-                                       how='outer',
-                                       left_index=True,
-                                       right_index=True)
-
-            # Reset index to make customer_id a column
-            channel_summary.reset_index(inplace=True)
-
-            # Add count columns
-            credit_counts = df[df['debit_credit'] == 'credit']['customer_id'].value_counts()
-            debit_counts = df[df['debit_credit'] == 'debit']['customer_id'].value_counts()
-
-            channel_summary[f'{channel}_credit_count'] = channel_summary['customer_id'].map(credit_counts).fillna(0)
-            channel_summary[f'{channel}_debit_count'] = channel_summary['customer_id'].map(debit_counts).fillna(0)
-
-            # Fill NaN values with 0
-            channel_summary = channel_summary.fillna(0)
+            if memory_limit_mb is None:
+                df = load_csv(file_path)
+                channel_summary = summarize_channel(channel, df)
+            else:
+                channel_summary = summarize_channel_chunked(channel, file_path, memory_limit_mb)
 
             # Merge with final_df
             if final_df is None:
@@ -97,18 +224,7 @@ def process_transaction_files(folder_path):
             if final_df is not None:
                 print(f"Columns in final_df: {final_df.columns.tolist()}")
 
-    # Fill any remaining NaN values with 0
-    if final_df is not None:
-        final_df = final_df.fillna(0)
-
-        # Sort columns alphabetically after customer_id
-        cols = ['customer_id'] + sorted([col for col in final_df.columns if col != 'customer_id'])
-        final_df = final_df[cols]
-
-        # Sort by customer_id
-        final_df = final_df.sort_values('customer_id')
-
-    return final_df
+    return finalize_summary(final_df)
 
 
 def save_results(df, folder_path, filename="transaction_credit_debit_summary.csv"):
@@ -144,6 +260,54 @@ def save_results(df, folder_path, filename="transaction_credit_debit_summary.csv
             print(f"Net Amount: ${(credit_amount - debit_amount):,.2f}")
 
 
+def compute_credit_debit_ratio(df):
+    """
+    Calculate the share of credit and debit amounts in every customer's total amount.
+
+    Args:
+        df (pd.DataFrame): Credit/debit summary as returned by process_transaction_files
+
+    Returns:
+        pd.DataFrame: customer_id, credit_total_amount_ratio and debit_total_amount_ratio
+    """
+    # Create new dataframe for ratios
+    result_df = pd.DataFrame()
+    result_df['customer_id'] = df['customer_id']
+
+    # Calculate total credit and debit amounts
+    credit_cols = [col for col in df.columns if col.endswith('_credit_amount')]
+    debit_cols = [col for col in df.columns if col.endswith('_debit_amount')]
+
+    total_credit = df[credit_cols].sum(axis=1)
+    total_debit = df[debit_cols].sum(axis=1)
+
+    # Calculate ratio, set to 1000000000 if debit is zero
+    # result_df['credit_debit_ratio'] = np.where(
+    #     total_debit == 0,
+    #     1000000000,
+    #     total_credit / total_debit
+    # )
+    # Instead of saving the ratio of debit to credit, save the ratio debit to total amount
+    # and credit to total amount. This will avoid dealing with case when credit is zero
+    
+    result_df['credit_total_amount_ratio'] = np.where(
+        total_debit + total_credit == 0,
+        0,
+        total_credit / (total_debit+total_credit)
+    )
+    
+    result_df['debit_total_amount_ratio'] = np.where(
+        total_debit + total_credit == 0,
+        0,
+        total_debit / (total_debit+total_credit)
+    )
+    
+    #result_df["total_credit"] = total_credit
+    #result_df["total_debit"] = total_debit
+
+    return result_df
+
+
 def calculate_credit_debit_ratio(folder_path):
     """
     Calculate credit to debit ratio and save to Excel with just customer_id and ratio.
@@ -153,40 +317,7 @@ def calculate_credit_debit_ratio(folder_path):
         input_file = os.path.join(folder_path, "transaction_credit_debit_summary.csv")
         df = pd.read_csv(input_file)
 
-        # Create new dataframe for ratios
-        result_df = pd.DataFrame()
-        result_df['customer_id'] = df['customer_id']
-
-        # Calculate total credit and debit amounts
-        credit_cols = [col for col in df.columns if col.endswith('_credit_amount')]
-        debit_cols = [col for col in df.columns if col.endswith('_debit_amount')]
-
-        total_credit = df[credit_cols].sum(axis=1)
-        total_debit = df[debit_cols].sum(axis=1)
-
-        # Calculate ratio, set to 1000000000 if debit is zero
-        # result_df['credit_debit_ratio'] = np.where(
-        #     total_debit == 0,
-        #     1000000000,
-        #     total_credit / total_debit
-        # )
-        # Instead of saving the ratio of debit to credit, save the ratio debit to total amount
-        # and credit to total amount. This will avoid dealing with case when credit is zero
-        
-        result_df['credit_total_amount_ratio'] = np.where(
-            total_debit + total_credit == 0,
-            0,
-            total_credit / (total_debit+total_credit)
-        )
-        
-        result_df['debit_total_amount_ratio'] = np.where(
-            total_debit + total_credit == 0,
-            0,
-            total_debit / (total_debit+total_credit)
-        )
-        
-        #result_df["total_credit"] = total_credit
-        #result_df["total_debit"] = total_debit
+        result_df = compute_credit_debit_ratio(df)
 
         # Save results to Excel
         output_file = os.path.join(folder_path, "credit_debit_ratio.csv")
@@ -194,7 +325,7 @@ def calculate_credit_debit_ratio(folder_path):
 
         print(f"\nResults saved to: {output_file}")
         print(f"Total customers: {len(result_df)}")
-        print(f"Customers with zero debit: {(total_debit == 0).sum()}")
+        print(f"Customers with zero debit: {(result_df['debit_total_amount_ratio'] == 0).sum()}")
 
     except Exception as e:
         print(f"Error processing file: {str(e)}")
@@ -205,8 +336,13 @@ if __name__ == "__main__":
     data_path = os.curdir + '/raw_data'
     folder_path = os.curdir + '/features/Debit_Credit_Ratio'
 
+    # --memory-limit-mb N reads the channels in chunks that stay under N megabytes
+    memory_limit_mb = None
+    if '--memory-limit-mb' in sys.argv:
+        memory_limit_mb = float(sys.argv[sys.argv.index('--memory-limit-mb') + 1])
+
     # Process files and create summary
-    result_df = process_transaction_files(data_path)
+    result_df = process_transaction_files(data_path, memory_limit_mb)
 
     # Save results
     save_results(result_df, folder_path)
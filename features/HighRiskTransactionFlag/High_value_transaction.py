@@ -1,15 +1,54 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from raw_data_cache import load_csv
+from quantile_sketch import KLLSketch
+
+
+def grouped_quantile(codes, values, n_groups, q):
+    """
+    Quantile of the values of every group, with the same linear interpolation (and the
+    same floating point result) as pd.Series.quantile.
+
+    Args:
+        codes (np.ndarray): Group number of every value, 0 <= code < n_groups
+        values (np.ndarray): Values to take the quantile of
+        n_groups (int): Number of groups
+        q (float): Quantile between 0 and 1
+
+    Returns:
+        np.ndarray: Quantile of every group, NaN for empty groups
+    """
+    sizes = np.bincount(codes, minlength=n_groups)
+    if len(values) == 0:
+        return np.full(n_groups, np.nan)
+    sorted_values = values[np.lexsort((values, codes))]
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    virtual_index = (sizes - 1) * q
+    previous = np.floor(virtual_index)
+    gamma = virtual_index - previous
+    previous = previous.astype(np.int64)
+    following = np.minimum(previous + 1, np.maximum(sizes - 1, 0))
+
+    last = len(sorted_values) - 1
+    below = sorted_values[np.minimum(starts + previous, last)]
+    above = sorted_values[np.minimum(starts + following, last)]
+    diff = above - below
+    quantile = np.where(gamma >= 0.5, above - diff * (1 - gamma), below + diff * gamma)
+    return np.where(sizes > 0, quantile, np.nan)
+
 
 class TransactionAnalyzer:
     def __init__(self, kyc_file_path):
         self.unique_customer_ids = set()
         """Initialize the analyzer with the KYC data file"""
         try:
-            self.kyc_data = pd.read_csv(kyc_file_path)
+            self.kyc_data = load_csv(kyc_file_path)
             self.kyc_data['industry_code'] = self.kyc_data['industry_code'].fillna('UNKNOWN').astype(str)
             print(f"Loaded KYC data with {len(self.kyc_data)} records")
         except Exception as e:
@@ -27,9 +66,13 @@ class TransactionAnalyzer:
 
     def load_transaction_file(self, transaction_type, file_path):
         """Load and prepare transaction data"""
+        self.add_transactions(transaction_type, load_csv(file_path))
+
+    def add_transactions(self, transaction_type, df):
+        """Prepare transaction data that is already in memory, the given frame is left unchanged"""
         try:
-            df = pd.read_csv(file_path)
-            
+            df = df.copy()
+
             # # Because all the credited transactions are negative in the card.csv file
             # # but all the other type of transactions are positive for both credited and debited transactions.
             if transaction_type == 'card':
@@ -38,10 +81,7 @@ class TransactionAnalyzer:
             amount_col = self.get_amount_column(df)
             print(f"Using '{amount_col}' as amount column for {transaction_type}")
 
-            # Convert to numeric, take absolute value, and exclude zeros
-            df['amount'] = pd.to_numeric(df[amount_col].astype(str).str.replace(',', ''), errors='coerce').abs()
-            df = df.dropna(subset=['amount'])
-            df = df[df['amount'] > 0]  # Exclude zero values
+            df = self.clean_amounts(df, amount_col)
 
             self.transaction_data[transaction_type] = df
             print(f"Loaded {len(df)} valid transactions for type {transaction_type}")
@@ -49,6 +89,141 @@ class TransactionAnalyzer:
         except Exception as e:
             raise Exception(f"Error loading transaction file {transaction_type}: {str(e)}")
 
+    def clean_amounts(self, df, amount_col):
+        """Add a positive numeric 'amount' column and drop the rows without a usable amount"""
+        # Convert to numeric, take absolute value, and exclude zeros. The cache already
+        # stores numeric amounts, only text columns need the thousands separator stripped
+        if pd.api.types.is_numeric_dtype(df[amount_col]):
+            df['amount'] = df[amount_col].abs()
+        else:
+            df['amount'] = pd.to_numeric(df[amount_col].astype(str).str.replace(',', ''), errors='coerce').abs()
+        df = df.dropna(subset=['amount'])
+        return df[df['amount'] > 0]  # Exclude zero values
+
+    def read_chunks(self, transaction_files, chunksize, customer_ids=None):
+        """
+        Read the transaction files in chunks, without keeping them in memory.
+
+        Args:
+            transaction_files (dict): Transaction type mapped to its CSV path
+            chunksize (int): Rows read at a time
+            customer_ids (set): When given, updated with every customer_id read, before the
+                rows without an amount or a KYC record are dropped, like add_transactions does
+
+        Yields:
+            tuple: (transaction_type, chunk) where chunk has customer_id, amount and the
+                customer's industry_code. Customers without a KYC record are dropped.
+        """
+        industries = self.kyc_data[['customer_id', 'industry_code']].drop_duplicates()
+        for trans_type, file_path in transaction_files.items():
+            for chunk in pd.read_csv(file_path, chunksize=chunksize):
+                if customer_ids is not None:
+                    customer_ids.update(chunk['customer_id'].unique())
+                chunk = self.clean_amounts(chunk, self.get_amount_column(chunk))
+                chunk = chunk[['customer_id', 'amount']].merge(industries, on='customer_id', how='inner')
+                yield trans_type, chunk
+
+    def stream_thresholds(self, transaction_files, chunksize=500_000, k=200, seed=0):
+        """
+        Approximate the (industry, type) 90th percentiles in two streaming passes.
+
+        The first pass sums every customer's amounts per transaction type. The second one
+        normalizes each chunk with those totals and feeds it to one KLL sketch per
+        (industry, type) group, so memory stays bounded by the number of customers and
+        groups instead of the number of transactions.
+
+        Args:
+            transaction_files (dict): Transaction type mapped to its CSV path
+            chunksize (int): Rows read at a time
+            k (int): Sketch size, the normalized rank error is roughly 1.7 / k
+            seed (int): Seed of the sketches, for reproducible thresholds
+
+        Returns:
+            tuple: (customer_totals, thresholds) where customer_totals maps every type to a
+                Series of customer sums and thresholds is indexed by (industry_code, transaction_type)
+        """
+        customer_totals = {}
+        for trans_type, chunk in self.read_chunks(transaction_files, chunksize, self.unique_customer_ids):
+            sums = chunk.groupby('customer_id')['amount'].sum()
+            customer_totals[trans_type] = customer_totals[trans_type].add(sums, fill_value=0) \
+                if trans_type in customer_totals else sums
+
+        sketches = {}
+        for trans_type, chunk in self.read_chunks(transaction_files, chunksize):
+            normalized = chunk['amount'] / chunk['customer_id'].map(customer_totals[trans_type])
+            for industry, values in normalized.groupby(chunk['industry_code'], sort=False):
+                key = (industry, trans_type)
+                if key not in sketches:
+                    sketches[key] = KLLSketch(k, seed=seed)
+                sketches[key].update(values.to_numpy())
+
+        thresholds = pd.Series({key: sketch.quantile(0.9) for key, sketch in sketches.items()}, dtype=np.float64)
+        thresholds.index.names = ['industry_code', 'transaction_type']
+        return customer_totals, thresholds
+
+    def stream_transactions(self, transaction_files, output_dir=None, chunksize=500_000, k=200, seed=0):
+        """
+        Streaming version of process_transactions for extracts that do not fit in memory.
+
+        Thresholds come from stream_thresholds and a third pass over the files counts the
+        transactions above them. The result has the layout of process_transactions.
+        """
+        customer_totals, thresholds = self.stream_thresholds(transaction_files, chunksize, k, seed)
+
+        all_high_value_results = {trans_type: pd.Series(dtype=np.int64) for trans_type in transaction_files.keys()}
+        for trans_type, chunk in self.read_chunks(transaction_files, chunksize):
+            normalized = chunk['amount'] / chunk['customer_id'].map(customer_totals[trans_type])
+            threshold = chunk['industry_code'].map(thresholds.xs(trans_type, level='transaction_type'))
+            counts = chunk.loc[(normalized > threshold).to_numpy(), 'customer_id'].value_counts()
+            all_high_value_results[trans_type] = all_high_value_results[trans_type].add(counts, fill_value=0)
+
+        all_high_value_results = {trans_type: counts.astype(np.int64).sort_index().to_dict()
+                                  for trans_type, counts in all_high_value_results.items()}
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        return self.create_customer_summary(all_high_value_results, output_dir)
+
+    def quantile_deviation_report(self, transaction_files, chunksize=500_000, k=200, seed=0):
+        """
+        Compare the streaming thresholds with the exact quantile(0.9) of every group.
+
+        The transactions must fit in memory for the exact side, so this is meant for
+        validating the sketch settings on a sample such as raw_data.
+
+        Returns:
+            pd.DataFrame: Per (industry, type) exact and approximate thresholds, their
+                absolute difference, the rank error of the approximate threshold and the
+                exact and approximate number of high value transactions
+        """
+        for trans_type, file_path in transaction_files.items():
+            self.load_transaction_file(trans_type, file_path)
+        transactions = self.flag_high_value_transactions()
+        _, thresholds = self.stream_thresholds(transaction_files, chunksize, k, seed)
+
+        transactions['approximate_threshold'] = pd.MultiIndex.from_frame(
+            transactions[['industry_code', 'transaction_type']]).map(thresholds)
+        transactions['below_exact'] = transactions['normalized_amount'] <= transactions['normalized_90th_percentile']
+        transactions['below_approximate'] = transactions['normalized_amount'] <= transactions['approximate_threshold']
+
+        grouped = transactions.groupby(['industry_code', 'transaction_type'])
+        report = pd.DataFrame({
+            'transactions': grouped.size(),
+            'exact_threshold': grouped['normalized_90th_percentile'].first(),
+            'approximate_threshold': grouped['approximate_threshold'].first(),
+            'rank_error': (grouped['below_approximate'].mean() - grouped['below_exact'].mean()).abs(),
+            'exact_high_value': grouped['is_high_value'].sum(),
+            'approximate_high_value': (~transactions['below_approximate']).groupby(
+                [transactions['industry_code'], transactions['transaction_type']]).sum(),
+        })
+        report['abs_error'] = (report['approximate_threshold'] - report['exact_threshold']).abs()
+
+        print(f"Compared {len(report)} (industry, type) thresholds over {len(transactions)} transactions, k={k}")
+        print(f"Rank error: max {report['rank_error'].max():.4f}, mean {report['rank_error'].mean():.4f}")
+        print(f"Threshold error: max {report['abs_error'].max():.3g}, mean {report['abs_error'].mean():.3g}")
+        print(f"High value transactions: exact {report['exact_high_value'].sum()}, "
+              f"approximate {report['approximate_high_value'].sum()}")
+        return report.reset_index()
+
     def normalize_customer_transactions(self, transactions_df):
         """Normalize transaction amounts for each customer more efficiently"""
         # Calculate sums using vectorized operations
@@ -62,120 +237,129 @@ class TransactionAnalyzer:
 
         return normalized_df
 
-    def process_transactions(self, output_dir):
-        """Process transactions and generate analysis files"""
-        os.makedirs(output_dir, exist_ok=True)
-        processing_summary = []
-
-        # Store all high value transactions for final summary
+    def flag_high_value_transactions(self):
+        """
+        Flag the transactions above the 90th percentile of their (industry, type) group.
+
+        Amounts are normalized by the customer's total for the transaction type, then every
+        (industry, type) group gets its 90th percentile from one grouped quantile. The
+        industry is joined onto the transactions once, instead of filtering every
+        transaction type once per industry.
+
+        Returns:
+            pd.DataFrame: industry_code, transaction_type, customer_id, amount,
+                normalized_amount, normalized_90th_percentile and is_high_value per transaction
+        """
+        industries = self.kyc_data[['customer_id', 'industry_code']].drop_duplicates()
+        frames = [pd.DataFrame({'customer_id': trans_df['customer_id'].to_numpy(),
+                                'transaction_type': trans_type,
+                                'amount': trans_df['amount'].to_numpy(dtype=np.float64)})
+                  for trans_type, trans_df in self.transaction_data.items()]
+        if not frames:
+            frames = [pd.DataFrame(columns=['customer_id', 'transaction_type', 'amount'])]
+        # Transactions of customers without a KYC record belong to no industry and are dropped
+        transactions = pd.concat(frames, ignore_index=True).merge(industries, on='customer_id', how='inner')
+
+        group_keys = ['industry_code', 'transaction_type']
+        customer_sums = transactions.groupby(group_keys + ['customer_id'])['amount'].transform('sum')
+        transactions['normalized_amount'] = transactions['amount'] / customer_sums
+
+        group_codes = transactions.groupby(group_keys, sort=False).ngroup().to_numpy()
+        percentiles = grouped_quantile(group_codes, transactions['normalized_amount'].to_numpy(),
+                                       group_codes.max() + 1 if len(group_codes) else 0, 0.9)
+        transactions['normalized_90th_percentile'] = percentiles[group_codes]
+        transactions['is_high_value'] = transactions['normalized_amount'] > transactions['normalized_90th_percentile']
+        return transactions
+
+    def industry_summaries(self, transactions):
+        """
+        Per-customer rows of the per-industry analysis files, for customers with at least one
+        high value transaction.
+        """
+        grouped = transactions.groupby(['industry_code', 'transaction_type', 'customer_id'], sort=False)
+        summary = grouped.agg(transactions_above_90th=('is_high_value', 'sum'),
+                              total_transactions=('amount', 'size'),
+                              normalized_90th_percentile=('normalized_90th_percentile', 'first'),
+                              total_amount=('amount', 'sum')).reset_index()
+        summary = summary[summary['transactions_above_90th'] > 0]
+        summary['high_value_transaction_percentage'] = (
+                summary['transactions_above_90th'] / summary['total_transactions'] * 100
+        ).round(2)
+        return summary[['customer_id', 'transactions_above_90th', 'total_transactions', 'normalized_90th_percentile',
+                        'high_value_transaction_percentage', 'industry_code', 'transaction_type', 'total_amount']]
+
+    def processing_summary(self, transactions, summary):
+        """Status of every (industry, transaction type) pair, in the layout of processing_summary.csv"""
+        grouped = transactions.groupby(['industry_code', 'transaction_type'])
+        processed = pd.DataFrame({
+            'transactions_processed': grouped.size(),
+            'customers_with_high_value_trans': summary.groupby(['industry_code', 'transaction_type']).size(),
+            'normalized_90th_percentile': grouped['normalized_90th_percentile'].first(),
+        })
+        processed['customers_with_high_value_trans'] = processed['customers_with_high_value_trans'].fillna(0).astype(int)
+        processed['status'] = 'Success'
+
+        all_pairs = pd.MultiIndex.from_product([self.kyc_data['industry_code'].unique(), list(self.transaction_data.keys())],
+                                               names=['industry_code', 'transaction_type'])
+        processed = processed.reindex(all_pairs)
+        processed['status'] = processed['status'].fillna('Skipped - No transactions found')
+        processed = processed.reset_index().rename(columns={'industry_code': 'industry'})
+        return processed[['industry', 'transaction_type', 'status', 'transactions_processed',
+                          'customers_with_high_value_trans', 'normalized_90th_percentile']]
+
+    def process_transactions(self, output_dir=None, write_industry_files=False):
+        """
+        Process transactions and generate analysis files.
+
+        When output_dir is None nothing is written and only the customer summary is returned.
+        The per-industry analysis files are only written with write_industry_files=True.
+        """
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+        print(f"\nFlagging high value transactions of {self.kyc_data['industry_code'].nunique()} industries...")
+        transactions = self.flag_high_value_transactions()
+        summary = self.industry_summaries(transactions)
+
+        if output_dir is not None:
+            self.processing_summary(transactions, summary).to_csv(f"{output_dir}/processing_summary.csv", index=False)
+
+        high_value = transactions[transactions['is_high_value']]
+        if output_dir is not None and write_industry_files:
+            os.makedirs(f"{output_dir}/analysis_data", exist_ok=True)
+            industry_summaries = dict(list(summary.groupby(['industry_code', 'transaction_type'])))
+            high_value_customers = dict(list(high_value.groupby(['industry_code', 'transaction_type'])['customer_id']))
+            # Every processed pair gets a file, also when none of its customers has a high value transaction
+            for industry, trans_type in transactions.groupby(['industry_code', 'transaction_type']).groups.keys():
+                industry_summary = industry_summaries.get((industry, trans_type), summary.iloc[:0])
+                safe_industry = str(industry).replace(' ', '_').replace('/', '_').replace('\\', '_')
+                output_file = f"{output_dir}/analysis_data/industry_{safe_industry}_{trans_type}_analysis.csv"
+                # Rows in value_counts order of the pair's high value transactions, ties included,
+                # like the per-industry loop wrote them
+                pair_customers = high_value_customers.get((industry, trans_type), pd.Series(dtype=object))
+                positions = pd.Index(industry_summary['customer_id']).get_indexer(pair_customers.value_counts().index)
+                industry_summary = industry_summary.iloc[positions]
+                industry_summary.drop(columns='transaction_type').to_csv(output_file, index=False)
+
+        # High value counts per customer, summed over the industries a customer belongs to
         all_high_value_results = {
-            trans_type: {} for trans_type in self.transaction_data.keys()
+            trans_type: high_value[high_value['transaction_type'] == trans_type].groupby('customer_id').size().to_dict()
+            for trans_type in self.transaction_data.keys()
         }
 
-        # Get list of industries once
-        known_industries = self.kyc_data['industry_code'].unique()
-
-        # Create customer to industry mapping for faster lookup
-        customer_industry_map = dict(zip(self.kyc_data['customer_id'], self.kyc_data['industry_code']))
-
-        print(f"\nProcessing {len(known_industries)} industries...")
-        total_industries = len(known_industries)
-
-        for idx, industry in enumerate(known_industries, 1):
-            print(f"\nProcessing industry {idx}/{total_industries}: {industry}")
-
-            # Get customers for this industry
-            industry_customers = set(self.kyc_data[self.kyc_data['industry_code'] == industry]['customer_id'])
-
-            for trans_type, trans_df in self.transaction_data.items():
-                try:
-                    # Filter transactions more efficiently using isin
-                    industry_transactions = trans_df[trans_df['customer_id'].isin(industry_customers)].copy()
-
-                    if len(industry_transactions) == 0:
-                        processing_summary.append({
-                            'industry': industry,
-                            'transaction_type': trans_type,
-                            'status': 'Skipped - No transactions found'
-                        })
-                        continue
-
-                    print(f"  Processing {trans_type}: {len(industry_transactions)} transactions")
-
-                    # Normalize transactions
-                    normalized_transactions = self.normalize_customer_transactions(industry_transactions)
-
-                    # Calculate 90th percentile
-                    percentile_90 = normalized_transactions['normalized_amount'].quantile(0.9)
-
-                    # Find high-value transactions efficiently
-                    high_value_mask = normalized_transactions['normalized_amount'] > percentile_90
-                    high_value_counts = normalized_transactions[high_value_mask]['customer_id'].value_counts()
-
-                    # Store results efficiently
-                    for customer_id, count in high_value_counts.items():
-                        all_high_value_results[trans_type][customer_id] = \
-                            all_high_value_results[trans_type].get(customer_id, 0) + count
-
-                    # Store results for final summary
-                    for customer_id in high_value_counts.index:
-                        if customer_id not in all_high_value_results[trans_type]:
-                            all_high_value_results[trans_type][customer_id] = 0
-                        all_high_value_results[trans_type][customer_id] += high_value_counts[customer_id]
-
-                    # Create individual industry summary
-                    summary = pd.DataFrame({
-                        'customer_id': high_value_counts.index,
-                        'transactions_above_90th': high_value_counts.values,
-                        'total_transactions': normalized_transactions['customer_id'].value_counts()[
-                            high_value_counts.index].values
-                    })
-
-                    # Add additional info
-                    summary['normalized_90th_percentile'] = percentile_90
-                    summary['high_value_transaction_percentage'] = (
-                            summary['transactions_above_90th'] / summary['total_transactions'] * 100
-                    ).round(2)
-                    summary['industry_code'] = industry
-                    summary['total_amount'] = industry_transactions.groupby('customer_id')['amount'].sum()[
-                        high_value_counts.index].values
-
-                    # Save individual industry results
-                    safe_industry = str(industry).replace(' ', '_').replace('/', '_').replace('\\', '_')
-                    output_file = f"{output_dir}/analysis_data/industry_{safe_industry}_{trans_type}_analysis.csv"
-                    summary.to_csv(output_file, index=False)
-
-                    processing_summary.append({
-                        'industry': industry,
-                        'transaction_type': trans_type,
-                        'status': 'Success',
-                        'transactions_processed': len(normalized_transactions),
-                        'customers_with_high_value_trans': len(summary),
-                        'normalized_90th_percentile': percentile_90
-                    })
-
-                except Exception as e:
-                    processing_summary.append({
-                        'industry': industry,
-                        'transaction_type': trans_type,
-                        'status': f'Error - {str(e)}'
-                    })
-
-        # Save processing summary
-        pd.DataFrame(processing_summary).to_csv(
-            f"{output_dir}/processing_summary.csv",
-            index=False
-        )
-
         # Create final customer summary
         print("\nStarting to create final customer summary...")
         print(f"Number of transaction types with high value results: {len(all_high_value_results)}")
         for t_type, results in all_high_value_results.items():
             print(f"Transaction type {t_type}: {len(results)} customers with high value transactions")
-        self.create_customer_summary(all_high_value_results, output_dir)
+        return self.create_customer_summary(all_high_value_results, output_dir)
 
-    def create_customer_summary(self, all_high_value_results, output_dir):
-        """Create summary of high value transactions across all industries more efficiently"""
+    def create_customer_summary(self, all_high_value_results, output_dir=None):
+        """
+        Create summary of high value transactions across all industries more efficiently.
+
+        Returns the summary DataFrame, and saves it when output_dir is given.
+        """
         try:
             print("\nStarting to create customer summary...")
             all_trans_types = list(self.transaction_data.keys())
@@ -213,13 +397,15 @@ class TransactionAnalyzer:
             #summary_df = summary_df.sort_values('total_high_value_count', ascending=False)
 
             # Save summary
-            output_file = f"{output_dir}/customer_high_value_summary.csv"
-            summary_df.to_csv(output_file, index=False)
             print(f"\nCreated customer summary with {len(summary_df)} customers")
             print(f"Transaction types included: {', '.join(all_trans_types)}")
-            print(f"Summary file saved to: {output_file}")
+            if output_dir is not None:
+                output_file = f"{output_dir}/customer_high_value_summary.csv"
+                summary_df.to_csv(output_file, index=False)
+                print(f"Summary file saved to: {output_file}")
             print("\nFirst few rows of summary:")
             print(summary_df.head())
+            return summary_df
 
         except Exception as e:
             print(f"\nError creating customer summary: {str(e)}")
@@ -253,10 +439,22 @@ def main():
         'eft': data_dir + '/eft.csv',
         'cheque': data_dir + '/cheque.csv',
     }
-    for trans_type, file_path in transaction_files.items():
-        analyzer.load_transaction_file(trans_type, file_path)
+    # Channels without a file in raw_data are skipped
+    transaction_files = {trans_type: file_path for trans_type, file_path in transaction_files.items()
+                         if os.path.exists(file_path)}
     output_dir = os.getcwd() + '/features/HighRiskTransactionFlag' # Path to the output directory
-    analyzer.process_transactions(output_dir)
+
+    if '--quantile-report' in sys.argv:
+        # Deviation of the streaming (sketch) thresholds from the exact ones
+        report = analyzer.quantile_deviation_report(transaction_files)
+        report.to_csv(output_dir + '/quantile_deviation_report.csv', index=False)
+        return
+    if '--streaming' in sys.argv:
+        analyzer.stream_transactions(transaction_files, output_dir)
+    else:
+        for trans_type, file_path in transaction_files.items():
+            analyzer.load_transaction_file(trans_type, file_path)
+        analyzer.process_transactions(output_dir, write_industry_files='--industry-files' in sys.argv)
 
     print(f'Number of unique customers: {len(analyzer.unique_customer_ids)}')
     
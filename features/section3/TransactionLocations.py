@@ -1,25 +1,41 @@
 import pandas as pd
+import argparse
 import os
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from raw_data_cache import load_csv
+from city_counting import ExactCityCounter, HyperLogLogCityCounter
+
 
 class CustomerCityAnalyzer:
-    def __init__(self, input_folder, output_folder):
+    def __init__(self, input_folder=None, output_folder=None, mode='exact', precision=8):
         """
         Initialize the analyzer with input and output paths
 
         Parameters:
         input_folder (str): Path to folder containing transaction CSV files
-        output_folder (str): Path where output files will be saved
+        output_folder (str): Path where output files will be saved, None when the
+            summary is only used in memory
+        mode (str): 'exact' for exact distinct-city counts or 'hll' for HyperLogLog
+            estimates that can be saved and merged across partitions and days
+        precision (int): Index bits of the HyperLogLog sketches, only used in 'hll' mode
         """
-        self.input_folder = Path(input_folder)
-        self.output_folder = Path(output_folder)
-        self.customer_cities = {}
+        self.input_folder = Path(input_folder) if input_folder is not None else None
+        self.output_folder = Path(output_folder) if output_folder is not None else None
+        if mode == 'exact':
+            self.counter = ExactCityCounter()
+        elif mode == 'hll':
+            self.counter = HyperLogLogCityCounter(precision)
+        else:
+            raise ValueError(f"Unknown mode {mode!r}, expected 'exact' or 'hll'")
         self.files_processed = []
         self.files_skipped = []
 
         # Create output folder if it doesn't exist
-        self.output_folder.mkdir(parents=True, exist_ok=True)
+        if self.output_folder is not None:
+            self.output_folder.mkdir(parents=True, exist_ok=True)
 
     def get_city_column(self, df):
         """Find the city column in the dataframe"""
@@ -33,57 +49,59 @@ class CustomerCityAnalyzer:
         """Process a single transaction file"""
         try:
             print(f"\nProcessing file: {file_path}")
-            df = pd.read_csv(file_path)
-
-            # Find city column
-            city_col = self.get_city_column(df)
-            if city_col is None:
-                print(f"No city column found in {file_path}, skipping...")
-                self.files_skipped.append(file_path.name)
-                return
-
-            # Ensure we have customer_id
-            if 'customer_id' not in df.columns:
-                print(f"No customer_id column found in {file_path}, skipping...")
-                self.files_skipped.append(file_path.name)
-                return
-
-            # Process cities
-            print(f"Found city column: {city_col}")
-
-            # Group by customer and get unique cities (normalized to lowercase)
-            customer_cities = df.groupby('customer_id')[city_col].agg(
-                lambda x: set(str(city).lower().strip() for city in x if pd.notna(city))
-            )
-
-            # Update the main dictionary
-            for customer_id, cities in customer_cities.items():
-                if customer_id not in self.customer_cities:
-                    self.customer_cities[customer_id] = set()
-                self.customer_cities[customer_id].update(cities)
-
-            self.files_processed.append(file_path.name)
-            print(f"Processed {len(df)} transactions")
+            df = load_csv(file_path)
+            self.process_frame(df, file_path.name)
 
         except Exception as e:
             print(f"Error processing file {file_path}: {str(e)}")
             self.files_skipped.append(file_path.name)
 
+    def process_frame(self, df, name):
+        """
+        Add the cities of a transaction DataFrame that is already in memory
+
+        Parameters:
+        df (pd.DataFrame): Transactions with customer_id and a city column
+        name (str): Name recorded in the processing log
+        """
+        # Find city column
+        city_col = self.get_city_column(df)
+        if city_col is None:
+            print(f"No city column found in {name}, skipping...")
+            self.files_skipped.append(name)
+            return
+
+        # Ensure we have customer_id
+        if 'customer_id' not in df.columns:
+            print(f"No customer_id column found in {name}, skipping...")
+            self.files_skipped.append(name)
+            return
+
+        # Process cities
+        print(f"Found city column: {city_col}")
+
+        # Unique (customer, city) pairs with the cities normalized to lowercase, the
+        # string methods and drop_duplicates run over the whole column at once
+        pairs = df[['customer_id', city_col]].dropna()
+        pairs = pd.DataFrame({'customer_id': pairs['customer_id'],
+                              'city': pairs[city_col].astype(str).str.lower().str.strip()})
+        pairs = pairs.drop_duplicates()
+
+        # Customers whose cities are all missing are still counted, with 0 cities
+        self.counter.add(pairs['customer_id'], pairs['city'], df['customer_id'].dropna())
+
+        self.files_processed.append(name)
+        print(f"Processed {len(df)} transactions")
+
+    def summary_frame(self):
+        """Number of unique cities of every customer, sorted by customer_id"""
+        summary_df = self.counter.counts().rename('unique_cities').reset_index()
+        return summary_df.sort_values('customer_id', ascending=True)
+
     def create_summary(self):
         """Create summary file with customer city counts"""
         try:
-            # Create summary data
-            summary_data = []
-            for customer_id, cities in self.customer_cities.items():
-                summary_data.append({
-                    'customer_id': customer_id,
-                    'unique_cities': len(cities)#,
-                    #'cities_list': '|'.join(sorted(cities))
-                })
-
-            # Convert to DataFrame and sort by unique city count
-            summary_df = pd.DataFrame(summary_data)
-            summary_df = summary_df.sort_values('customer_id', ascending=True)
+            summary_df = self.summary_frame()
 
             # Save to file
             output_file = self.output_folder / 'customer_city_summary.csv'
@@ -125,11 +143,23 @@ class CustomerCityAnalyzer:
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Count the unique cities every customer transacted in')
     # Example usage with input and output folders
-    input_folder = r"C:\Users\arthu\Downloads\ML_comp\section_3"  # Replace with your input folder path
-    output_folder = r"C:\Users\arthu\Downloads\ML_comp"  # Replace with your output folder path
-
-    analyzer = CustomerCityAnalyzer(input_folder, output_folder)
+    parser.add_argument('--input-folder', default=r"C:\Users\arthu\Downloads\ML_comp\section_3",
+                        help='Folder containing the transaction CSV files')
+    parser.add_argument('--output-folder', default=r"C:\Users\arthu\Downloads\ML_comp",
+                        help='Folder where the summary is saved')
+    parser.add_argument('--mode', choices=['exact', 'hll'], default='exact',
+                        help='Exact counts or mergeable HyperLogLog estimates')
+    parser.add_argument('--precision', type=int, default=8, help='Index bits of the HyperLogLog sketches')
+    parser.add_argument('--merge-sketches', nargs='*', default=[],
+                        help='HyperLogLog sketches of other partitions or days to merge in (hll mode)')
+    parser.add_argument('--save-sketch', default=None, help='Where to save the HyperLogLog sketches (hll mode)')
+    args = parser.parse_args()
+    input_folder = args.input_folder
+    output_folder = args.output_folder
+
+    analyzer = CustomerCityAnalyzer(input_folder, output_folder, args.mode, args.precision)
 
     # Get all CSV files in input directory
     csv_files = list(Path(input_folder).glob('*.csv'))
@@ -139,6 +169,12 @@ def main():
     for file_path in csv_files:
         analyzer.process_file(file_path)
 
+    if args.mode == 'hll':
+        for sketch_file in args.merge_sketches:
+            analyzer.counter.merge(HyperLogLogCityCounter.load(sketch_file))
+        if args.save_sketch is not None:
+            analyzer.counter.save(args.save_sketch)
+
     # Create summary
     analyzer.create_summary()
 
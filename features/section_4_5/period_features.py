@@ -0,0 +1,170 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from customer_index import CustomerIndex
+from time_encoding import MISSING_SECONDS, epoch_seconds
+
+from burst_features import bucket_peaks
+
+
+# Channel order of features_4_5.ipynb, which sets the column order of features_4_5.csv
+PERIOD_CHANNELS = ['wire', 'abm', 'cheque', 'eft', 'emt', 'card']
+
+
+def period_columns(df_key, ecommerce=False, cash=False, merchant=False):
+    """
+    Output columns of compute_period_features for one channel, in the order of
+    features_4_5.csv (including its 'weekely' spelling).
+    """
+    columns = []
+    for side in ['credit', 'debit']:
+        columns += [f'{df_key}_max_{side}_weekly_trx', f'{df_key}_max_{side}_monthly_trx',
+                    f'{df_key}_max_{side}_weekely_trx_avg_val', f'{df_key}_max_{side}_monthly_trx_avg_val']
+    if ecommerce:
+        columns.append(f'{df_key}_ecommerce_activity')
+    if cash:
+        columns.append(f'{df_key}_cash_activity')
+    if merchant:
+        columns += [f'{df_key}_merchant_categories', f'{df_key}_merchant_category_dissimilarity',
+                    f'{df_key}_merchant_category_dissimilarity_std']
+    return columns
+
+
+def period_buckets(days):
+    """
+    Week and month of every transaction day.
+
+    Returns:
+        tuple: (weeks, months) int64 arrays. Weeks start on Monday like the 'W-MON' ranges of
+            the notebook, months are calendar months.
+    """
+    # 1970-01-01 was a Thursday, so Monday-aligned weeks start 3 days earlier
+    weeks = (days + 3) // 7
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    return weeks, months
+
+
+def merchant_dissimilarity(codes, weeks, categories, n_customers):
+    """
+    Mean and standard deviation of the distance between the merchant category counts of
+    consecutive active weeks.
+
+    Every week a customer transacted in is a vector of transaction counts per merchant
+    category. The Euclidean distance between each active week and the previous one is
+    |a|^2 + |b|^2 - 2 a.b, computed from the (customer, week, category) counts only, so
+    the dense weeks x categories matrix of every customer is never built.
+
+    Args:
+        codes (np.ndarray): Integer customer code per transaction
+        weeks (np.ndarray): Week per transaction, see period_buckets
+        categories (np.ndarray): Integer merchant category code per transaction
+        n_customers (int): Number of distinct customer codes
+
+    Returns:
+        tuple: (mean, std) arrays of length n_customers, 0 for customers with fewer than
+            two active weeks
+    """
+    mean = np.zeros(n_customers)
+    std = np.zeros(n_customers)
+    if len(codes) == 0:
+        return mean, std
+
+    counts = (pd.DataFrame({'code': codes, 'week': weeks, 'category': categories})
+              .groupby(['code', 'week', 'category'], sort=True).size().reset_index(name='count'))
+    # Rows are sorted by (customer, week), so consecutive active weeks get consecutive ranks
+    count_codes, count_weeks = counts['code'].to_numpy(), counts['week'].to_numpy()
+    new_week = np.ones(len(counts), dtype=bool)
+    new_week[1:] = (count_codes[1:] != count_codes[:-1]) | (count_weeks[1:] != count_weeks[:-1])
+    counts['rank'] = np.cumsum(new_week) - 1
+    active_codes = count_codes[new_week]
+
+    square_norms = np.bincount(counts['rank'], weights=counts['count'].astype(np.float64) ** 2,
+                               minlength=len(active_codes))
+    previous = counts.assign(rank=counts['rank'] + 1)
+    shared = counts.merge(previous, on=['code', 'rank', 'category'], suffixes=('', '_previous'))
+    dots = np.bincount(shared['rank'], weights=(shared['count'] * shared['count_previous']).astype(np.float64),
+                       minlength=len(active_codes))
+
+    has_previous = np.zeros(len(active_codes), dtype=bool)
+    has_previous[1:] = active_codes[1:] == active_codes[:-1]
+    ranks = np.flatnonzero(has_previous)
+    distances = np.sqrt(np.maximum(square_norms[ranks] + square_norms[ranks - 1] - 2 * dots[ranks], 0))
+
+    # Population standard deviation, like np.std in the notebook
+    index = CustomerIndex.from_sorted(active_codes[ranks])
+    lengths = index.lengths()
+    customer_mean = index.reduce(distances) / lengths
+    mean[index.customers] = customer_mean
+    std[index.customers] = np.sqrt(index.reduce((distances - np.repeat(customer_mean, lengths)) ** 2) / lengths)
+    return mean, std
+
+
+def compute_period_features(df, df_key):
+    """
+    Compute the section 4/5 features of features_4_5.ipynb for one transaction channel.
+
+    These are the busiest week and month of credit and debit transactions with their
+    average amount, the e-commerce and cash shares, the number of merchant categories and
+    the week-to-week merchant category dissimilarity. Transactions are bucketed by their
+    transaction_date with integer arithmetic instead of filtering every customer's
+    transactions once per week and month of the channel's date range.
+
+    Args:
+        df (pd.DataFrame): Transactions with customer_id, transaction_date, debit_credit
+            ('credit'/'debit' or 'C'/'D') and amount_cad columns, and optionally
+            ecommerce_ind, cash_indicator and merchant_category
+        df_key (str): Channel name used as the column prefix
+
+    Returns:
+        pd.DataFrame: One row per customer (index sorted by customer_id) with the
+            period_columns of the channel
+    """
+    codes, customers = pd.factorize(df['customer_id'], sort=True)
+    n_customers = len(customers)
+
+    seconds = epoch_seconds(df['transaction_date'])
+    valid = (codes >= 0) & (seconds != MISSING_SECONDS)
+    codes = codes[valid]
+    days = seconds[valid] // 86400
+    amounts = df['amount_cad'].to_numpy(dtype=np.float64)[valid]
+    direction = df['debit_credit'].astype(object).replace({'C': 'credit', 'D': 'debit'}).to_numpy()[valid]
+
+    order = np.lexsort((days, codes))
+    codes, days, amounts, direction = codes[order], days[order], amounts[order], direction[order]
+    weeks, months = period_buckets(days)
+
+    features = {}
+    for side in ['credit', 'debit']:
+        mask = direction == side
+        for period, buckets in [('weekly', weeks), ('monthly', months)]:
+            max_count, avg_amount = bucket_peaks(codes[mask], buckets[mask], amounts[mask], n_customers)
+            features[f'{df_key}_max_{side}_{period}_trx'] = max_count
+            spelling = 'weekely' if period == 'weekly' else period
+            features[f'{df_key}_max_{side}_{spelling}_trx_avg_val'] = avg_amount
+
+    transactions = np.bincount(codes, minlength=n_customers)
+    shares = [('ecommerce_ind', 'ecommerce_activity'), ('cash_indicator', 'cash_activity')]
+    for column, name in shares:
+        if column in df.columns:
+            flags = (df[column] == True).to_numpy()[valid][order]
+            share = np.bincount(codes, weights=flags, minlength=n_customers) / np.maximum(transactions, 1)
+            features[f'{df_key}_{name}'] = share
+
+    merchant = 'merchant_category' in df.columns
+    if merchant:
+        # 'other' is category 0 in the notebook
+        merchant_categories = df['merchant_category'].astype(str).replace('other', '0').to_numpy()
+        categories, _ = pd.factorize(merchant_categories[valid][order])
+        pairs = np.unique(np.stack([codes, categories]), axis=1)
+        features[f'{df_key}_merchant_categories'] = np.bincount(pairs[0], minlength=n_customers).astype(np.float64)
+        mean, std = merchant_dissimilarity(codes, weeks, categories, n_customers)
+        features[f'{df_key}_merchant_category_dissimilarity'] = mean
+        features[f'{df_key}_merchant_category_dissimilarity_std'] = std
+
+    customer_stats = pd.DataFrame(features, index=pd.Index(customers))
+    columns = period_columns(df_key, 'ecommerce_ind' in df.columns, 'cash_indicator' in df.columns, merchant)
+    return customer_stats[columns]
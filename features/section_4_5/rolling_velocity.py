@@ -0,0 +1,126 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from customer_index import CustomerIndex
+
+
+# Window lengths used when none are given, written as pandas timedelta strings
+DEFAULT_WINDOWS = ['5m', '1h', '24h', '7d', '30d']
+
+
+def window_seconds(windows):
+    """
+    Convert window lengths ('5m', '1h', '7d', pd.Timedelta, ...) to whole seconds.
+
+    Args:
+        windows (list): Window lengths as pandas timedelta strings or Timedelta objects
+
+    Returns:
+        dict: Column label of each window mapped to its length in seconds
+    """
+    lengths = {}
+    for window in windows:
+        seconds = int(pd.Timedelta(window).total_seconds())
+        if seconds <= 0:
+            raise ValueError(f"Window length must be positive, got {window!r}")
+        label = window if isinstance(window, str) else f'{seconds}s'
+        lengths[label] = seconds
+    return lengths
+
+
+def rolling_columns(df_key, windows=DEFAULT_WINDOWS):
+    """Output columns of compute_rolling_velocity for one channel"""
+    columns = []
+    for label in window_seconds(windows).keys():
+        for side in ['credit', 'debit']:
+            columns.append(f'{df_key}_max_{side}_{label}_rolling_trx')
+            columns.append(f'{df_key}_max_{side}_{label}_rolling_sum')
+    return columns
+
+
+def rolling_peaks(codes, seconds, amounts, n_customers, width):
+    """
+    Maximum number and sum of transactions any customer made within `width` seconds.
+
+    Every transaction is treated as the end of a window (t - width, t]. The start of each
+    window is found with one searchsorted over a (customer, time) composite key, so
+    windows never straddle two customers and the whole pass is O(n log n).
+
+    Args:
+        codes (np.ndarray): Integer customer code per transaction, sorted ascending
+        seconds (np.ndarray): Epoch seconds per transaction, sorted within a customer
+        amounts (np.ndarray): Transaction amounts
+        n_customers (int): Number of distinct customer codes
+        width (int): Window length in seconds
+
+    Returns:
+        tuple: (max_count, max_sum) arrays of length n_customers, 0 for customers without
+            transactions
+    """
+    max_count = np.zeros(n_customers)
+    max_sum = np.zeros(n_customers)
+    if len(codes) == 0:
+        return max_count, max_sum
+
+    # Spread customers far enough apart that no window can reach the previous customer
+    offset = seconds - seconds.min()
+    span = int(offset.max()) + width + 1
+    key = codes.astype(np.int64) * span + offset
+
+    ends = np.arange(len(key))
+    starts = np.searchsorted(key, key - width + 1, side='left')
+    counts = ends - starts + 1
+    cumulative = np.concatenate(([0.0], np.cumsum(amounts)))
+    sums = cumulative[ends + 1] - cumulative[starts]
+
+    index = CustomerIndex.from_sorted(codes)
+    max_count[index.customers] = index.reduce(counts, np.maximum)
+    max_sum[index.customers] = index.reduce(sums, np.maximum)
+    return max_count, max_sum
+
+
+def compute_rolling_velocity(df, df_key, windows=DEFAULT_WINDOWS):
+    """
+    Compute true rolling-window velocity features for one transaction channel.
+
+    Unlike the hourly/daily burst buckets, windows are not aligned to the calendar, so a
+    burst straddling an hour or day boundary is counted in full.
+
+    Args:
+        df (pd.DataFrame): Transactions with customer_id, transaction_datetime, debit_credit
+            and amount_cad columns
+        df_key (str): Channel name used as the column prefix
+        windows (list): Window lengths, e.g. ['5m', '1h', '24h', '7d', '30d']
+
+    Returns:
+        pd.DataFrame: One row per customer (index sorted by customer_id) with the max count
+            and max amount sum per window and direction
+    """
+    lengths = window_seconds(windows)
+    codes, customers = pd.factorize(df['customer_id'], sort=True)
+    n_customers = len(customers)
+
+    valid = (codes >= 0) & df['transaction_datetime'].notna().to_numpy()
+    codes = codes[valid]
+    seconds = df['transaction_datetime'].to_numpy()[valid].astype('datetime64[s]').astype(np.int64)
+    amounts = df['amount_cad'].to_numpy(dtype=np.float64)[valid]
+    direction = df['debit_credit'].to_numpy()[valid]
+
+    order = np.lexsort((seconds, codes))
+    codes, seconds, amounts, direction = codes[order], seconds[order], amounts[order], direction[order]
+
+    features = {}
+    for side in ['credit', 'debit']:
+        mask = direction == side
+        side_codes, side_seconds, side_amounts = codes[mask], seconds[mask], amounts[mask]
+        for label, width in lengths.items():
+            max_count, max_sum = rolling_peaks(side_codes, side_seconds, side_amounts, n_customers, width)
+            features[f'{df_key}_max_{side}_{label}_rolling_trx'] = max_count
+            features[f'{df_key}_max_{side}_{label}_rolling_sum'] = max_sum
+
+    customer_stats = pd.DataFrame(features, index=pd.Index(customers))
+    return customer_stats[rolling_columns(df_key, windows)]
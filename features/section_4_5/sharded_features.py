@@ -0,0 +1,133 @@
+import concurrent.futures
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from burst_features import compute_burst_features
+from rolling_velocity import DEFAULT_WINDOWS, compute_rolling_velocity
+
+
+# debit_credit is stored as an int8 code in the shared arrays, see DIRECTION_NAMES
+DIRECTION_CODES = {'debit': 0, 'credit': 1}
+DIRECTION_NAMES = np.array(['debit', 'credit', 'other'], dtype=object)
+
+ARRAY_NAMES = ['codes', 'seconds', 'amounts', 'direction']
+
+
+def customer_shards(customers, n_shards):
+    """
+    Assign every customer to a shard by hashing its ID, so a customer's transactions
+    always land in the same shard whatever the channel or the row order.
+    """
+    hashes = pd.util.hash_array(np.asarray(customers, dtype=object))
+    return (hashes % np.uint64(n_shards)).astype(np.int64)
+
+
+def write_shared_arrays(df, df_key, n_shards, array_dir):
+    """
+    Write one channel as flat .npy arrays sorted by (shard, customer, time).
+
+    Workers open the arrays with mmap_mode='r' and read only their shard's slice, so the
+    channel is written once instead of being pickled to every worker.
+
+    Args:
+        df (pd.DataFrame): Transactions with customer_id, transaction_datetime, debit_credit
+            and amount_cad columns
+        df_key (str): Channel name, used as the file prefix
+        n_shards (int): Number of customer shards
+        array_dir (Path): Folder for the .npy files
+
+    Returns:
+        tuple: (customers, offsets) where customers maps the stored codes back to customer_id
+            and rows offsets[i]:offsets[i + 1] belong to shard i
+    """
+    codes, customers = pd.factorize(df['customer_id'], sort=True)
+    valid = (codes >= 0) & df['transaction_datetime'].notna().to_numpy()
+    codes = codes[valid].astype(np.int64)
+    seconds = df['transaction_datetime'].to_numpy()[valid].astype('datetime64[s]').astype(np.int64)
+    amounts = df['amount_cad'].to_numpy(dtype=np.float64)[valid]
+    direction = df['debit_credit'].map(DIRECTION_CODES).fillna(2).to_numpy(dtype=np.int8)[valid]
+
+    shards = customer_shards(customers, n_shards)[codes]
+    order = np.lexsort((seconds, codes, shards))
+    arrays = {'codes': codes[order], 'seconds': seconds[order], 'amounts': amounts[order],
+              'direction': direction[order]}
+    for name, values in arrays.items():
+        np.save(array_dir / f'{df_key}_{name}.npy', values)
+
+    offsets = np.searchsorted(shards[order], np.arange(n_shards + 1), side='left')
+    return customers, offsets
+
+
+def process_shard(task):
+    """
+    Compute the burst and rolling-window features of one customer shard.
+
+    Args:
+        task (tuple): (array_dir, df_key, start, stop, windows)
+
+    Returns:
+        tuple: (df_key, customer_stats_p) where customer_stats_p is indexed by customer code
+    """
+    array_dir, df_key, start, stop, windows = task
+    arrays = {name: np.load(Path(array_dir) / f'{df_key}_{name}.npy', mmap_mode='r')[start:stop]
+              for name in ARRAY_NAMES}
+    df = pd.DataFrame({
+        'customer_id': np.asarray(arrays['codes']),
+        'transaction_datetime': np.asarray(arrays['seconds']).astype('datetime64[s]'),
+        'debit_credit': DIRECTION_NAMES[arrays['direction']],
+        'amount_cad': np.asarray(arrays['amounts']),
+    })
+    customer_stats_p = pd.concat([compute_burst_features(df, df_key),
+                                  compute_rolling_velocity(df, df_key, windows)], axis=1)
+    return (df_key, customer_stats_p)
+
+
+def compute_sharded_features(dfs, windows=DEFAULT_WINDOWS, max_workers=None, n_shards=None):
+    """
+    Compute the section 4/5 burst and rolling-window features of every channel, with the
+    work split into hash-partitioned customer shards across a process pool.
+
+    Every (channel, shard) pair is one task, so large channels are spread over all cores
+    instead of occupying a single worker.
+
+    Args:
+        dfs (dict): Channel name mapped to its transactions
+        windows (list): Rolling window lengths, see rolling_velocity.DEFAULT_WINDOWS
+        max_workers (int): Number of worker processes, defaults to the number of CPUs
+        n_shards (int): Customer shards per channel, defaults to 4 per worker
+
+    Returns:
+        pd.DataFrame: One row per customer (index sorted by customer_id), channel features
+            side by side and 0 for channels a customer did not use
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    n_shards = n_shards or 4 * max_workers
+
+    with tempfile.TemporaryDirectory() as array_dir:
+        customers = {}
+        tasks = []
+        for df_key, df in dfs.items():
+            customers[df_key], offsets = write_shared_arrays(df, df_key, n_shards, Path(array_dir))
+            tasks += [(array_dir, df_key, start, stop, windows)
+                      for start, stop in zip(offsets[:-1], offsets[1:]) if stop > start]
+
+        shard_results = {df_key: [] for df_key in dfs.keys()}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for df_key, customer_stats_p in executor.map(process_shard, tasks):
+                shard_results[df_key].append(customer_stats_p)
+
+    channel_features = []
+    for df_key, results in shard_results.items():
+        if not results:
+            continue
+        # Shards hold disjoint customers, so stacking them gives the whole channel
+        channel_stats = pd.concat(results).reindex(np.arange(len(customers[df_key])), fill_value=0)
+        channel_stats.index = pd.Index(np.asarray(customers[df_key])[channel_stats.index.to_numpy()])
+        channel_features.append(channel_stats)
+
+    final_df = pd.concat(channel_features, axis=1, join='outer').sort_index()
+    return final_df.fillna(0)
@@ -1,182 +1,50 @@
 import pandas as pd
-from collections import Counter
 import numpy as np
-from tqdm import tqdm
-import matplotlib.pyplot as plt
-import concurrent.futures
-import os
+import sys
 from pathlib import Path
-import pickle as pkl
-import time 
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from raw_data_cache import load_csv
 
-def get_minute_day_ranges(start_date_time, end_date_time):
-    # Convert inputs to pandas timestamps
-    start_date_time = pd.to_datetime(start_date_time)
-    end_date_time = pd.to_datetime(end_date_time)
+from burst_features import compute_burst_features
+from rolling_velocity import DEFAULT_WINDOWS, compute_rolling_velocity
+from sharded_features import compute_sharded_features
 
-    # ------------------------------------------
-    # 60-minute intervals
-    # ------------------------------------------
-    # Align the start to the nearest 60-minute boundary (rounding down)
-    start_60min = start_date_time.floor('60min')
-    # Align the end to the nearest 60-minute boundary (rounding up)
-    end_60min = end_date_time.ceil('60min')
-
-    # Create 60-minute interval ranges.
-    # We subtract 60 minutes from end_5min because we want full 60-minute blocks.
-    five_min_intervals = []
-    five_min_starts = pd.date_range(start=start_60min, 
-                                    end=end_60min - pd.Timedelta(minutes=5), 
-                                    freq='60min')
-    for start in five_min_starts:
-        # Define the end of the interval as exactly 5 minutes later,
-        # subtracting a microsecond so that intervals don't overlap (if needed)
-        end = start + pd.Timedelta(minutes=60) - pd.Timedelta(microseconds=1)
-        five_min_intervals.append((start, end))
-
-    # ------------------------------------------
-    # Daily intervals
-    # ------------------------------------------
-    # Normalize the start to midnight
-    start_day = start_date_time.normalize()
-    # Normalize the end to midnight.
-    # Note: if end_date_time is not exactly midnight, this represents the beginning
-    #       of that day. That day will be included as a full day interval.
-    end_day = end_date_time.normalize()
-
-    daily_intervals = []
-    # Create a date_range for each day
-    day_starts = pd.date_range(start=start_day, end=end_day, freq='D')
-    for day in day_starts:
-        # Each interval spans the entire day.
-        # We set the end to be one day later minus one microsecond.
-        day_end = day + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
-        daily_intervals.append((day, day_end))
-
-    return five_min_intervals, daily_intervals
 
 def process_single_df(item):
-    df_key, df = item
-    
-    df_customers = sorted(df['customer_id'].unique()) 
-    customer_stats_p = pd.DataFrame(index=df_customers)
-    start_idx = 0
-    curr_idx = 0
-    last_idx = None
-    
-    l = 0
-    cust_len = len(df_customers)
-    very_start_time = time.time()
-    start_time = time.time()
-    for customer in df_customers:
-        end_flag = False
-        while (df.loc[curr_idx, 'customer_id'] == customer):
-            # print(df.loc[curr_idx, 'customer_id'])
-            curr_idx += 1
-            # print(curr_idx)
-            if curr_idx == len(df):
-                end_flag = True
-                break
-        last_idx = curr_idx            
-        
-        if not end_flag:
-            customer_df = df.iloc[start_idx:last_idx, :]
-        else:
-            customer_df = df.iloc[start_idx:, :]
+    """
+    Compute the hourly/daily burst features and the rolling-window velocity
+    features for one transaction channel.
 
-        start_idx = curr_idx
-        
-        max_credit_minute_trx = 0 
-        max_credit_daily_trx = 0
-        # max_credit_weekly_trx = 0
-        # max_credit_monthly_trx = 0
-        max_credit_minute_trx_avg_val = 0
-        max_credit_daily_trx_avg_val = 0
-        # max_credit_weekly_trx_avg_val = 0
-        # max_credit_monthly_trx_avg_val = 0
-        
-        max_debit_minute_trx = 0
-        max_debit_daily_trx = 0
-        # max_debit_weekly_trx = 0
-        # max_debit_monthly_trx = 0
-        max_debit_minute_trx_avg_val = 0
-        max_debit_daily_trx_avg_val = 0
-        # max_debit_weekly_trx_avg_val = 0
-        # max_debit_monthly_trx_avg_val = 0
-                
-        start_date = df['transaction_datetime'].min()
-        end_date = df['transaction_datetime'].max()
-        # weekly_ranges, monthly_ranges = get_date_ranges(start_date, end_date)
-        minute_ranges, day_ranges = get_minute_day_ranges(start_date, end_date)
- 
-        
-        for i, (start, end) in enumerate(minute_ranges):
-            period_df = customer_df[(customer_df['transaction_datetime'] >= start) & (customer_df['transaction_datetime'] <= end)]
-            
-            credit_period_df = period_df[period_df['debit_credit'] == 'credit']
-            debit_period_df = period_df[period_df['debit_credit'] == 'debit']
-            
-            if len(credit_period_df) > max_credit_minute_trx:
-                max_credit_minute_trx = len(credit_period_df)
-                max_credit_minute_trx_avg_val = credit_period_df['amount_cad'].mean()    
-            if len(debit_period_df) > max_debit_minute_trx:
-                max_debit_minute_trx = len(debit_period_df)
-                max_debit_minute_trx_avg_val = debit_period_df['amount_cad'].mean()
-
-        customer_stats_p.loc[customer, df_key+'_max_credit_minute_trx'] = max_credit_minute_trx
-        customer_stats_p.loc[customer, df_key+'_max_debit_minute_trx_avg_val'] = max_debit_minute_trx_avg_val
-        customer_stats_p.loc[customer, df_key+'_max_debit_minute_trx'] = max_debit_minute_trx
-        customer_stats_p.loc[customer, df_key+'_max_credit_minute_trx_avg_val'] = max_credit_minute_trx_avg_val
-        
-        for i, (start, end) in enumerate(day_ranges):
-            period_df = customer_df[(customer_df['transaction_datetime'] >= start) & (customer_df['transaction_datetime'] <= end)]
-            
-            credit_period_df = period_df[period_df['debit_credit'] == 'credit']
-            debit_period_df = period_df[period_df['debit_credit'] == 'debit']
-            
-            if len(credit_period_df) > max_credit_daily_trx:
-                max_credit_daily_trx = len(credit_period_df)
-                max_credit_daily_trx_avg_val = credit_period_df['amount_cad'].mean()
-            
-            if len(debit_period_df) > max_debit_daily_trx:
-                max_debit_daily_trx = len(debit_period_df)
-                max_debit_daily_trx_avg_val = debit_period_df['amount_cad'].mean()
+    Args:
+        item (tuple): (df_key, df) pair as produced by dfs.items()
 
-        customer_stats_p.loc[customer, df_key+'_max_credit_daily_trx'] = max_credit_daily_trx
-        customer_stats_p.loc[customer, df_key+'_max_credit_daily_trx_avg_val'] = max_credit_daily_trx_avg_val
-        customer_stats_p.loc[customer, df_key+'_max_debit_daily_trx'] = max_debit_daily_trx
-        customer_stats_p.loc[customer, df_key+'_max_debit_daily_trx_avg_val'] = max_debit_daily_trx_avg_val
-        
-        l = l+1
-        if l%100 == 0:
-            curr_time = time.time()
-            seconds_remaining = (cust_len - l) * (curr_time - very_start_time) / l
-            hours_remaining = seconds_remaining // 3600
-            minutes_remaining = (seconds_remaining % 3600) // 60
-            seconds_remaining = seconds_remaining % 60
-            print(f'{df_key} - Percentage complete: {(l/cust_len)*100}%  - ETA: {int(hours_remaining)}h {int(minutes_remaining)}m {int(seconds_remaining)}s')
-            start_time = curr_time
-        
+    Returns:
+        tuple: (df_key, customer_stats_p) where customer_stats_p is indexed by customer_id
+    """
+    df_key, df = item
+    customer_stats_p = pd.concat([compute_burst_features(df, df_key),
+                                  compute_rolling_velocity(df, df_key, DEFAULT_WINDOWS)], axis=1)
     return (df_key, customer_stats_p)
 
 
 if __name__ == "__main__":
     datapath = Path('processed_synth_dataset/')
-    feature_output_dir = Path.mkdir('synth_features', exist_ok=True)
+    feature_output_dir = Path('synth_features')
+    feature_output_dir.mkdir(exist_ok=True)
     
     print(datapath.absolute())
     
     frac = 1
-    wire = pd.read_csv(datapath/'wire_s.csv', engine="pyarrow").sample(frac = frac)
-    ach = pd.read_csv(datapath/'ach_s.csv', engine="pyarrow").sample(frac = frac)
-    cheque = pd.read_csv(datapath/'cheque_s.csv', engine="pyarrow").sample(frac = frac)
-    card = pd.read_csv(datapath/'card_s.csv', engine="pyarrow").sample(frac = frac)
+    # The cache already carries the combined transaction_datetime column
+    wire = load_csv(datapath/'wire_s.csv').sample(frac = frac)
+    ach = load_csv(datapath/'ach_s.csv').sample(frac = frac)
+    cheque = load_csv(datapath/'cheque_s.csv').sample(frac = frac)
+    card = load_csv(datapath/'card_s.csv').sample(frac = frac)
 
     dfs = {'card': card, 'wire': wire, 'ach': ach, 'cheque': cheque}
-    #Sorting the DFs by date and Time
+    #Sorting the DFs by customer, date and Time
     for key in dfs.keys():
-        dfs[key]['transaction_datetime'] = pd.to_datetime(dfs[key]['transaction_date'].astype(str) + ' ' + dfs[key]['transaction_time'].astype(str))
         dfs[key].sort_values( by = ['customer_id', 'transaction_datetime'] , ascending = [True, True], ignore_index=True, inplace = True)
         
     
@@ -184,13 +52,9 @@ if __name__ == "__main__":
     all_customers= list(set(np.concatenate([dfs[trx_type]['customer_id'].unique() for trx_type in dfs.keys()], axis=0)))
     print(len(all_customers))
     
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-    # dfs.items() produces (df_key, df) tuples.
-        results = list((executor.map(process_single_df, dfs.items())))
-    
-    final_df = pd.concat([value for key, value in results], axis = 1, join='outer')
-    # fill all the missing data cells
-    final_df.fillna(0, inplace=True)
+    # Customers are hash-partitioned into shards and every (channel, shard) pair runs as
+    # its own task, so the card channel no longer occupies a single worker
+    final_df = compute_sharded_features(dfs, DEFAULT_WINDOWS)
 
     # convert the index into a column feature and replace index with just numbers
     final_df = final_df.reset_index().rename(columns={'index': 'customer_id'})
@@ -0,0 +1,202 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from customer_index import CustomerIndex
+from raw_data_cache import load_csv
+
+
+# How each dataset is turned into entropy features.
+#   channels:      channel name -> CSV file name inside data_dir
+#   value_columns: columns read from the channels whose values are counted
+#   fill_channels: channels where missing and 'other' values become 'unknown', rows
+#                  that are still missing in the other channels are left out of a level
+#   levels:        level name -> columns identifying a value of the level; a province
+#                  is keyed by (country, province) so equal names in two countries differ
+#   outputs:       file name -> {feature column: column name in the file}, the per-level
+#                  files the feature collection notebooks read
+#   levels_file:   file with every feature of every level
+ENTROPY_SCHEMAS = {
+    'competition': {
+        'data_dir': 'raw_data',
+        'output_dir': 'features',
+        'channels': {channel: f'{channel}.csv' for channel in ['card', 'abm', 'cheque', 'eft', 'emt', 'wire']},
+        'value_channels': ['card', 'abm'],
+        'value_columns': ['country', 'province', 'city'],
+        'fill_channels': ['card', 'abm'],
+        'levels': {
+            'country': ['country'],
+            'province': ['country', 'province'],
+            'city': ['country', 'province', 'city'],
+        },
+        'outputs': {'geographical_entropy.csv': {'city_entropy': 'geographical_entropy'}},
+        'levels_file': 'geo_entropy_levels.csv',
+    },
+    'synthetic': {
+        'data_dir': 'processed_synth_dataset',
+        'output_dir': 'synth_features',
+        'channels': {channel: f'{channel}_s.csv' for channel in ['wire', 'ach', 'cheque', 'card']},
+        'value_channels': ['card', 'ach', 'wire', 'cheque'],
+        'value_columns': ['city', 'currency'],
+        # Only card values were filled when these features were first built
+        'fill_channels': ['card'],
+        'levels': {
+            'city': ['city'],
+            'currency': ['currency'],
+        },
+        'outputs': {
+            'synth_city_entropy.csv': {'city_entropy': 'city_entropy'},
+            'synth_currency_entropy.csv': {'currency_entropy': 'currency_entropy'},
+        },
+        'levels_file': 'synth_geo_entropy_levels.csv',
+    },
+}
+
+
+def level_codes(df, columns):
+    """
+    Integer code of every row's value at one level, built from the codes of its columns.
+
+    Returns:
+        np.ndarray: int64 codes numbered from 0, -1 where any of the columns is missing
+    """
+    codes = np.zeros(len(df), dtype=np.int64)
+    missing = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        col_codes, uniques = pd.factorize(df[col])
+        missing |= col_codes < 0
+        # Renumbering after every column keeps the combined codes small
+        codes, _ = pd.factorize(codes * (len(uniques) + 1) + col_codes + 1)
+    codes = codes.astype(np.int64)
+    codes[missing] = -1
+    return codes
+
+
+def level_entropy(customer_codes, value_codes, n_customers, top_k=1):
+    """
+    Entropy features of one level from the integer codes of its rows.
+
+    Args:
+        customer_codes (np.ndarray): Customer position of every row, 0..n_customers-1
+        value_codes (np.ndarray): Value code of every row, -1 for rows to leave out
+        n_customers (int): Number of customers
+        top_k (int): Number of most frequent values in the concentration share
+
+    Returns:
+        dict: 'entropy' (Shannon entropy in bits), 'normalized_entropy' (entropy over
+            log2 of the number of distinct values, 0 with one value) and 'top_share'
+            (share of the rows in the top_k most frequent values), one float per
+            customer, 0 for customers without rows
+    """
+    valid = value_codes >= 0
+    customer_codes = customer_codes[valid]
+    value_codes = value_codes[valid]
+    n_values = int(value_codes.max()) + 1 if len(value_codes) else 1
+
+    # Transaction count of every (customer, value) pair, sorted by customer
+    pairs, counts = np.unique(customer_codes * n_values + value_codes, return_counts=True)
+    pair_customers = pairs // n_values
+    totals = np.bincount(pair_customers, weights=counts, minlength=n_customers)
+    distinct = np.bincount(pair_customers, minlength=n_customers)
+
+    proportion = counts / totals[pair_customers]
+    entropy = np.bincount(pair_customers, weights=-proportion * np.log2(proportion), minlength=n_customers)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = np.where(distinct > 1, entropy / np.log2(np.maximum(distinct, 2)), 0.0)
+
+    # Rank of every pair within its customer, largest count first
+    order = np.lexsort((-counts, pair_customers))
+    index = CustomerIndex.from_sorted(pair_customers[order])
+    ranks = np.arange(len(order)) - np.repeat(index.indptr[:-1], index.lengths())
+    top = order[ranks < top_k]
+    top_counts = np.bincount(pair_customers[top], weights=counts[top], minlength=n_customers)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        top_share = np.where(totals > 0, top_counts / totals, 0.0)
+
+    return {'entropy': entropy, 'normalized_entropy': normalized, 'top_share': top_share}
+
+
+def entropy_features(dfs, schema='competition', top_k=1):
+    """
+    Entropy, normalized entropy and top-k concentration of every level of a schema.
+
+    Args:
+        dfs (dict): Channel name -> transactions, with customer_id and the value columns
+            for the value channels of the schema
+        schema (str or dict): Name in ENTROPY_SCHEMAS or a schema of the same layout
+        top_k (int): Number of most frequent values in the concentration share
+
+    Returns:
+        pd.DataFrame: customer_id then {level}_entropy, {level}_normalized_entropy and
+            {level}_top{top_k}_share for every level, one row per customer seen in any
+            channel, sorted by customer_id
+    """
+    schema = ENTROPY_SCHEMAS[schema] if isinstance(schema, str) else schema
+    columns = schema['value_columns']
+
+    customer_ids = np.sort(pd.unique(np.concatenate(
+        [df['customer_id'].dropna().to_numpy() for df in dfs.values()])))
+
+    values = []
+    for channel in schema['value_channels']:
+        if channel not in dfs:
+            continue
+        df = dfs[channel][['customer_id'] + columns]
+        if channel in schema['fill_channels']:
+            df = df.assign(**{col: df[col].replace(['other', np.nan], 'unknown') for col in columns})
+        values.append(df)
+    values = pd.concat(values, ignore_index=True)
+    values = values[values['customer_id'].notna()]
+    customer_codes = np.searchsorted(customer_ids, values['customer_id'].to_numpy())
+
+    features = {'customer_id': customer_ids}
+    for level, level_columns in schema['levels'].items():
+        result = level_entropy(customer_codes, level_codes(values, level_columns), len(customer_ids), top_k)
+        features[f'{level}_entropy'] = result['entropy']
+        features[f'{level}_normalized_entropy'] = result['normalized_entropy']
+        features[f'{level}_top{top_k}_share'] = result['top_share']
+    return pd.DataFrame(features)
+
+
+def load_schema_frames(schema, data_dir=None):
+    """Read the channels of a schema, only the columns the entropy features need"""
+    schema = ENTROPY_SCHEMAS[schema] if isinstance(schema, str) else schema
+    data_dir = Path(data_dir if data_dir is not None else schema['data_dir'])
+    dfs = {}
+    for channel, file_name in schema['channels'].items():
+        columns = ['customer_id'] + schema['value_columns'] if channel in schema['value_channels'] else ['customer_id']
+        dfs[channel] = load_csv(data_dir / file_name, columns=columns)
+    return dfs
+
+
+def write_outputs(features, schema, output_dir=None):
+    """Write the per-level files read by the feature collection notebooks and the levels file"""
+    schema = ENTROPY_SCHEMAS[schema] if isinstance(schema, str) else schema
+    output_dir = Path(output_dir if output_dir is not None else schema['output_dir'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for file_name, renames in schema['outputs'].items():
+        output = features[['customer_id'] + list(renames)].rename(columns=renames)
+        output.to_csv(output_dir / file_name, index=False)
+        print(f"{', '.join(renames.values())} saved to {output_dir / file_name}.")
+    features.to_csv(output_dir / schema['levels_file'], index=False)
+    print(f"Entropy features of every level saved to {output_dir / schema['levels_file']}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Entropy features of the transaction locations of every customer')
+    parser.add_argument('--schema', choices=list(ENTROPY_SCHEMAS), default='competition')
+    parser.add_argument('--data-dir', default=None, help='Folder with the channel CSVs, default from the schema')
+    parser.add_argument('--output-dir', default=None, help='Where to write the CSVs, default from the schema')
+    parser.add_argument('--top-k', type=int, default=1, help='Most frequent values in the concentration share')
+    args = parser.parse_args()
+
+    dfs = load_schema_frames(args.schema, args.data_dir)
+    features = entropy_features(dfs, args.schema, args.top_k)
+    write_outputs(features, args.schema, args.output_dir)
+    print(features.head())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT / 'features' / 'section_4_5'))
+
+from burst_features import BUCKET_SECONDS, burst_columns, peak_buckets
+from raw_data_cache import CHANNELS, load_channels
+from transaction_volume_and_frequency import assemble_features, channel_dates
+
+
+# debit_credit values after strip/lower, same rules as Debit_Credit_Ratio.standardize_credit_debit
+DIRECTIONS = {'d': 0, 'debit': 0, 'c': 1, 'credit': 1}
+
+# Sufficient statistics kept on disk, with the key columns of every table
+STATE_KEYS = {
+    'dates': ['customer_id'],
+    'amounts': ['customer_id', 'channel', 'direction'],
+    'cash': ['customer_id'],
+    'locations': ['customer_id', 'location'],
+    'buckets': ['customer_id', 'channel', 'direction', 'period', 'bucket'],
+}
+
+
+def stack_batch(batch):
+    """
+    Stack a batch of channel DataFrames into one frame with normalized columns.
+
+    Card amounts are made positive (credits are negative in card.csv) and debit_credit
+    becomes 0 (debit), 1 (credit) or -1 (unrecognized).
+    """
+    frames = []
+    for channel, df in batch.items():
+        if channel not in CHANNELS:
+            continue
+        amount = df['amount_cad'].to_numpy(dtype=np.float64)
+        direction = df['debit_credit'].astype(str).str.strip().str.lower().map(DIRECTIONS)
+        datetime = df['transaction_datetime'] if 'transaction_datetime' in df.columns \
+            else pd.to_datetime(df['transaction_date'], format='%Y-%m-%d')
+        frame = pd.DataFrame({
+            'customer_id': df['customer_id'].to_numpy(),
+            'channel': channel,
+            'amount': np.abs(amount) if channel == 'card' else amount,
+            'direction': direction.fillna(-1).astype(np.int64).to_numpy(),
+            'datetime': datetime.to_numpy(),
+            # First/final dates come from transaction_date like in transaction_features, a
+            # transaction_datetime is NaT when only the time is unparseable
+            'date': channel_dates(df),
+        })
+        frame['cash'] = (df['cash_indicator'] == True).to_numpy() if 'cash_indicator' in df.columns else False
+        if 'city' in df.columns and channel in ['card', 'abm']:
+            parts = [df[col].replace(['other', np.nan], 'unknown') for col in ['country', 'province', 'city']]
+            frame['location'] = (parts[0] + '_' + parts[1] + '_' + parts[2]).to_numpy()
+        else:
+            frame['location'] = None
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def batch_statistics(transactions):
+    """Sufficient statistics of one stacked batch, in the layout of STATE_KEYS"""
+    dates = transactions['date'].groupby(transactions['customer_id']).agg(['min', 'max'])
+    dates = dates.rename(columns={'min': 'first_date', 'max': 'final_date'}).reset_index()
+
+    transactions = transactions.assign(abs_amount=transactions['amount'].abs())
+    grouped = transactions.groupby(STATE_KEYS['amounts'])
+    amounts = grouped['amount'].agg(count='size', sum='sum')
+    amounts['abs_sum'] = grouped['abs_amount'].sum()
+    amounts['m2'] = grouped['amount'].var(ddof=0) * amounts['count']
+    amounts = amounts.reset_index()
+
+    abm_cash = transactions[(transactions['channel'] == 'abm') & transactions['cash']]
+    cash = abm_cash.groupby('customer_id')['abs_amount'].agg(count='size', abs_sum='sum').reset_index()
+
+    located = transactions.dropna(subset=['location'])
+    locations = located.groupby(STATE_KEYS['locations']).size().rename('count').reset_index()
+
+    seconds = transactions['datetime'].to_numpy().astype('datetime64[s]').astype(np.int64)
+    directed = (transactions['direction'].to_numpy() >= 0) & transactions['datetime'].notna().to_numpy()
+    bucket_frames = []
+    for period, width in BUCKET_SECONDS.items():
+        bucket_frames.append(pd.DataFrame({
+            'customer_id': transactions['customer_id'].to_numpy()[directed],
+            'channel': transactions['channel'].to_numpy()[directed],
+            'direction': transactions['direction'].to_numpy()[directed],
+            'period': period,
+            'bucket': seconds[directed] // width,
+            'amount': transactions['amount'].to_numpy()[directed],
+        }))
+    bucketed = pd.concat(bucket_frames, ignore_index=True)
+    buckets = bucketed.groupby(STATE_KEYS['buckets'])['amount'].agg(count='size', sum='sum').reset_index()
+
+    return {'dates': dates, 'amounts': amounts, 'cash': cash, 'locations': locations, 'buckets': buckets}
+
+
+def merge_statistics(name, state, partial):
+    """
+    Fold a batch's statistics into the stored ones.
+
+    Counts and sums add up, first/final dates take the min/max, and the centered sum of
+    squares (m2) is combined with the parallel variance formula so the std stays accurate.
+    """
+    if state is None or len(state) == 0:
+        return partial
+    keys = STATE_KEYS[name]
+    combined = pd.concat([state, partial], ignore_index=True)
+
+    if name == 'dates':
+        return combined.groupby(keys, as_index=False).agg(first_date=('first_date', 'min'),
+                                                          final_date=('final_date', 'max'))
+    if name != 'amounts':
+        return combined.groupby(keys, as_index=False).sum()
+
+    grouped = combined.groupby(keys)
+    total_count = grouped['count'].transform('sum')
+    total_mean = grouped['sum'].transform('sum') / total_count
+    part_mean = combined['sum'] / combined['count']
+    combined['m2'] = combined['m2'] + combined['count'] * (part_mean - total_mean) ** 2
+    return combined.groupby(keys, as_index=False)[['count', 'sum', 'abs_sum', 'm2']].sum()
+
+
+class IncrementalFeatureStore:
+    def __init__(self, state_dir):
+        """
+        Per-customer sufficient statistics that new transaction batches are folded into.
+
+        Parameters:
+        state_dir (str): Folder holding one Parquet file per STATE_KEYS table
+        """
+        self.state_dir = Path(state_dir)
+        self.state = {}
+        for name in STATE_KEYS.keys():
+            path = self.state_dir / f'{name}.parquet'
+            self.state[name] = pd.read_parquet(path) if path.exists() else None
+
+    def save(self):
+        """Write the statistics back to state_dir"""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        for name, table in self.state.items():
+            if table is not None:
+                table.to_parquet(self.state_dir / f'{name}.parquet', index=False)
+
+    def update(self, batch):
+        """
+        Fold a batch of new transactions into the state.
+
+        Args:
+            batch (dict): Channel name mapped to the new transactions of that channel
+
+        Returns:
+            pd.DataFrame: Feature rows of the customers touched by the batch
+        """
+        transactions = stack_batch(batch)
+        partial = batch_statistics(transactions)
+        for name in STATE_KEYS.keys():
+            self.state[name] = merge_statistics(name, self.state[name], partial[name])
+        return self.features(np.sort(transactions['customer_id'].dropna().unique()))
+
+    def features(self, customer_ids=None):
+        """
+        Feature rows computed from the stored statistics.
+
+        The columns are the transaction volume/frequency, debit/credit ratio, cash
+        indicator ratio, geographical entropy and hourly/daily burst features, with the
+        same values a full rebuild over all batches gives.
+
+        Args:
+            customer_ids (np.ndarray): Customers to emit, all known customers when None
+
+        Returns:
+            pd.DataFrame: One row per customer, sorted by customer_id
+        """
+        if customer_ids is None:
+            customer_ids = np.sort(self.state['dates']['customer_id'].to_numpy())
+        customer_ids = np.asarray(customer_ids, dtype=object)
+        n = len(customer_ids)
+
+        def rows_of(table):
+            # Keep the rows of the requested customers and map them to their row number
+            table = table[table['customer_id'].isin(customer_ids)]
+            return table, np.searchsorted(customer_ids, table['customer_id'].to_numpy())
+
+        dates, rows = rows_of(self.state['dates'])
+        num_days = np.zeros(n, dtype=np.int64)
+        num_days[rows] = (dates['final_date'] - dates['first_date']).dt.days.to_numpy()
+
+        amounts, amount_rows = rows_of(self.state['amounts'])
+        channel_idx = amounts['channel'].map({channel: i for i, channel in enumerate(CHANNELS)}).to_numpy()
+        direction = amounts['direction'].to_numpy()
+        count = amounts['count'].to_numpy(dtype=np.float64)
+        counts = np.zeros((n, len(CHANNELS)))
+        abs_sums = np.zeros((n, len(CHANNELS), 2))
+        average = np.zeros((n, len(CHANNELS), 2))
+        std = np.zeros((n, len(CHANNELS), 2))
+        np.add.at(counts, (amount_rows, channel_idx), count)
+        known = direction >= 0
+        idx = (amount_rows[known], channel_idx[known], direction[known])
+        abs_sums[idx] = amounts['abs_sum'].to_numpy()[known]
+        average[idx] = amounts['sum'].to_numpy()[known] / count[known]
+        std[idx] = np.sqrt(amounts['m2'].to_numpy()[known] / count[known])
+
+        features = assemble_features(customer_ids, num_days, counts, average, std)
+        features = features.rename(columns={'customer ID': 'customer_id'})
+
+        # Debit/credit share of the total amount
+        total_debit = abs_sums[:, :, 0].sum(axis=1)
+        total_credit = abs_sums[:, :, 1].sum(axis=1)
+        total = total_debit + total_credit
+        features['credit_total_amount_ratio'] = np.where(total == 0, 0, total_credit / np.where(total == 0, 1, total))
+        features['debit_total_amount_ratio'] = np.where(total == 0, 0, total_debit / np.where(total == 0, 1, total))
+
+        # ABM share, where the totals include the ABM cash columns like compute_abm_ratios does
+        cash, rows = rows_of(self.state['cash'])
+        cash_count = np.zeros(n)
+        cash_amount = np.zeros(n)
+        cash_count[rows] = cash['count'].to_numpy()
+        cash_amount[rows] = cash['abs_sum'].to_numpy()
+        channel_amounts = np.zeros((n, len(CHANNELS)))
+        np.add.at(channel_amounts, (amount_rows, channel_idx), amounts['abs_sum'].to_numpy())
+        abm = CHANNELS.index('abm')
+        total_count = counts.sum(axis=1) + cash_count
+        total_amount = channel_amounts.sum(axis=1) + cash_amount
+        features['abm_count_ratio'] = np.where(total_count == 0, 0, counts[:, abm] / np.where(total_count == 0, 1, total_count))
+        features['abm_amount_ratio'] = np.where(total_amount == 0, 0, channel_amounts[:, abm] / np.where(total_amount == 0, 1, total_amount))
+
+        # Geographical entropy over country/province/city locations
+        locations, rows = rows_of(self.state['locations'])
+        location_count = locations['count'].to_numpy(dtype=np.float64)
+        totals = np.bincount(rows, weights=location_count, minlength=n)
+        proportion = location_count / totals[rows]
+        features['geographical_entropy'] = np.bincount(rows, weights=-proportion * np.log2(proportion), minlength=n)
+
+        # Busiest hour and day per channel and direction
+        buckets, rows = rows_of(self.state['buckets'])
+        peaks = {}
+        for channel in CHANNELS:
+            for period in BUCKET_SECONDS.keys():
+                for side, side_idx in [('credit', 1), ('debit', 0)]:
+                    mask = ((buckets['channel'] == channel) & (buckets['period'] == period) &
+                            (buckets['direction'] == side_idx)).to_numpy()
+                    max_count, avg_amount = peak_buckets(rows[mask], buckets['bucket'].to_numpy()[mask],
+                                                         buckets['count'].to_numpy()[mask],
+                                                         buckets['sum'].to_numpy()[mask], n)
+                    peaks[f'{channel}_max_{side}_{period}_trx'] = max_count
+                    peaks[f'{channel}_max_{side}_{period}_trx_avg_val'] = avg_amount
+        burst = [col for channel in CHANNELS for col in burst_columns(channel)]
+        return pd.concat([features, pd.DataFrame(peaks)[burst]], axis=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fold a batch of channel CSVs into the incremental feature state')
+    parser.add_argument('batch_dir', help='Folder with the new abm/card/cheque/eft/emt/wire CSVs')
+    parser.add_argument('--state-dir', default='feature_state')
+    parser.add_argument('--output', default='updated_customer_features.csv',
+                        help='Where to write the feature rows of the touched customers')
+    args = parser.parse_args()
+
+    store = IncrementalFeatureStore(args.state_dir)
+    touched = store.update(load_channels(CHANNELS, args.batch_dir))
+    store.save()
+    touched.to_csv(args.output, index=False)
+    print(f"Updated {len(touched)} customers, rows saved to {args.output}")
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Transaction channels of the competition dataset, in the order used across the repo
+CHANNELS = ['abm', 'card', 'cheque', 'eft', 'emt', 'wire']
+
+# Low-cardinality string columns stored as Arrow dictionaries / pandas categoricals
+CATEGORICAL_COLUMNS = ['customer_id', 'debit_credit', 'country', 'province', 'city',
+                       'merchant_category', 'currency']
+
+CACHE_DIR_NAME = '.parquet_cache'
+
+# Bump when the on-disk layout changes so that old cache files are rebuilt
+CACHE_VERSION = 2
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hash a file in blocks so that large CSVs are never held in memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def combine_date_and_time(df):
+    """
+    Build a single transaction_datetime column from transaction_date and, when the
+    channel has one, transaction_time.
+
+    Channels without a time column (cheque) are placed at midnight. A missing or
+    unparseable date or time gives NaT.
+    """
+    datetime = pd.to_datetime(df['transaction_date'], format='%Y-%m-%d', errors='coerce')
+    if 'transaction_time' in df.columns:
+        datetime = datetime + pd.to_timedelta(df['transaction_time'], errors='coerce')
+    return datetime
+
+
+def parse_csv(csv_path):
+    """
+    Parse a raw CSV into the typed frame stored in the cache.
+
+    Columns keep the types pd.read_csv infers, except that the CATEGORICAL_COLUMNS
+    become categoricals and transaction channels get a pre-combined transaction_datetime.
+    """
+    df = pd.read_csv(csv_path, low_memory=False)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype('category')
+    if 'transaction_date' in df.columns:
+        df['transaction_datetime'] = combine_date_and_time(df)
+    return df
+
+
+def cache_paths(csv_path, cache_dir=None):
+    """Location of the Parquet file and its metadata for a source CSV"""
+    csv_path = Path(csv_path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else csv_path.parent / CACHE_DIR_NAME
+    return cache_dir / (csv_path.stem + '.parquet'), cache_dir / (csv_path.stem + '.json')
+
+
+def is_cache_valid(csv_path, meta_path, parquet_path):
+    """
+    Check whether the cached copy still matches the source CSV.
+
+    The mtime and size are compared first; only when they changed is the file hashed, so
+    a `touch` or a fresh checkout of identical data does not force a rebuild.
+    """
+    if not parquet_path.exists() or not meta_path.exists():
+        return False
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get('version') != CACHE_VERSION:
+        return False
+
+    stat = os.stat(csv_path)
+    if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        return True
+    if meta.get('size') != stat.st_size or meta.get('sha256') != file_sha256(csv_path):
+        return False
+
+    # Same content, new mtime: remember it so the next check is cheap again
+    meta['mtime_ns'] = stat.st_mtime_ns
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return True
+
+
+def build_cache(csv_path, parquet_path, meta_path):
+    """Parse a CSV and write it to a compressed Parquet file with its metadata"""
+    df = parse_csv(csv_path)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(parquet_path, engine='pyarrow', compression='zstd', index=False)
+
+    stat = os.stat(csv_path)
+    meta = {
+        'version': CACHE_VERSION,
+        'source': str(csv_path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': file_sha256(csv_path),
+        'rows': len(df),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return df
+
+
+def load_csv(csv_path, columns=None, categorical=False, cache_dir=None):
+    """
+    Load a raw CSV through the Parquet cache, parsing the CSV only when the cache is
+    missing or the source changed.
+
+    Args:
+        csv_path (str or Path): Path to the source CSV
+        columns (list): Optional subset of columns to read from the cache
+        categorical (bool): Keep customer_id, debit_credit, city, ... as categoricals.
+            When False they are returned as plain object columns, which matches what
+            pd.read_csv gives and keeps groupby/value_counts semantics unchanged.
+        cache_dir (str or Path): Cache directory, defaults to .parquet_cache next to the CSV
+
+    Returns:
+        pd.DataFrame: The typed data, with transaction_datetime for transaction channels
+    """
+    parquet_path, meta_path = cache_paths(csv_path, cache_dir)
+    if is_cache_valid(csv_path, meta_path, parquet_path):
+        df = pd.read_parquet(parquet_path, engine='pyarrow', columns=columns)
+    else:
+        print(f"Building Parquet cache for {csv_path}")
+        df = build_cache(csv_path, parquet_path, meta_path)
+        if columns is not None:
+            df = df[columns]
+
+    if not categorical:
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = np.asarray(df[col], dtype=object)
+    return df
+
+
+def load_channel(channel, data_dir='raw_data', **kwargs):
+    """Load raw_data/<channel>.csv through the cache, see load_csv for the options"""
+    return load_csv(Path(data_dir) / f'{channel}.csv', **kwargs)
+
+
+def load_channels(channels=CHANNELS, data_dir='raw_data', **kwargs):
+    """
+    Load several channels through the cache, skipping the ones without a CSV.
+
+    Returns:
+        dict: Channel name mapped to its DataFrame
+    """
+    dfs = {}
+    for channel in channels:
+        if not (Path(data_dir) / f'{channel}.csv').exists():
+            continue
+        dfs[channel] = load_channel(channel, data_dir, **kwargs)
+    return dfs
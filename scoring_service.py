@@ -0,0 +1,516 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+try:
+    import torch
+except ImportError:
+    # Only needed to score transaction sequences with an encoder
+    torch = None
+
+# Bump when the layout of the saved artifact changes, older files are then refitted
+ARTIFACT_VERSION = 2
+
+
+def feature_schema_hash(columns):
+    """SHA-256 of the ordered feature column list, changes whenever a feature is added, dropped or moved"""
+    return hashlib.sha256(json.dumps([str(col) for col in columns]).encode()).hexdigest()
+
+
+class AnomalyModel:
+    def __init__(self, scaler, pca, forest, columns, encoder=None, embedding_forest=None, sequence_dim=None,
+                 model_id=None):
+        """
+        The fitted StandardScaler -> PCA -> IsolationForest chain of feature_collection.ipynb.
+
+        Anomaly scores are the negated IsolationForest.score_samples, so higher is more
+        anomalous and the notebook's -1 predictions are the highest scores.
+
+        Parameters:
+        scaler (StandardScaler): Scaler fitted on the customer feature columns
+        pca (PCA): PCA fitted on the scaled features
+        forest (IsolationForest): Forest fitted on the PCA features
+        columns (list): Feature columns, in the order the scaler was fitted on
+        encoder (torch.nn.Module): Optional sequence encoder, called as encoder(x, mask) on
+            padded (batch, seq_len, dim) transactions and returning (batch, emb_dim)
+        embedding_forest (IsolationForest): Forest fitted on the encoder's embeddings,
+            needed to score sequences
+        sequence_dim (int): Values per transaction the encoder takes, None to not check
+        model_id (str): Identifier of the fit, a new one when None. Scores are only reused
+            by score_changed when they carry the same model_id
+        """
+        self.scaler = scaler
+        self.pca = pca
+        self.forest = forest
+        self.columns = list(columns)
+        self.schema_hash = feature_schema_hash(self.columns)
+        self.encoder = encoder
+        self.embedding_forest = embedding_forest
+        self.sequence_dim = sequence_dim
+        self.model_id = model_id if model_id is not None else uuid.uuid4().hex
+        if encoder is not None:
+            encoder.eval()
+
+    @classmethod
+    def fit(cls, df, n_components=50, random_state=0, id_column='customer_id'):
+        """Fit the chain on the customer-level training table, e.g. comp_cust_level_training_data.csv"""
+        from sklearn.decomposition import PCA
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import StandardScaler
+
+        features = df.drop(columns=[id_column], errors='ignore')
+        scaler = StandardScaler()
+        # Fitted on the bare matrix, requests are scored as matrices in self.columns order
+        scaled = scaler.fit_transform(features.to_numpy(dtype=np.float64))
+        pca = PCA(n_components=min(n_components, *scaled.shape), random_state=random_state)
+        pca_features = pca.fit_transform(scaled)
+        forest = IsolationForest(max_samples='auto', random_state=random_state).fit(pca_features)
+        return cls(scaler, pca, forest, features.columns)
+
+    def save(self, path):
+        """
+        Pickle the scaler, PCA and forests with the artifact version, feature schema hash and
+        model_id.
+
+        The encoder is saved on its own with torch.jit.
+        """
+        import sklearn
+
+        with open(path, 'wb') as f:
+            pickle.dump({'version': ARTIFACT_VERSION,
+                         'schema_hash': self.schema_hash,
+                         'model_id': self.model_id,
+                         'sklearn_version': sklearn.__version__,
+                         'scaler': self.scaler, 'pca': self.pca, 'forest': self.forest, 'columns': self.columns,
+                         'embedding_forest': self.embedding_forest, 'sequence_dim': self.sequence_dim}, f)
+
+    @classmethod
+    def load(cls, path, encoder_path=None):
+        """
+        Load a model written by save.
+
+        Args:
+            path (str or Path): Pickle written by save
+            encoder_path (str or Path): TorchScript encoder (torch.jit.save), None for
+                feature scoring only
+
+        Raises:
+            ValueError: If the artifact version or the scikit-learn version it was saved with
+                differ from the current ones, as pickled estimators are not portable across
+                scikit-learn versions
+        """
+        import sklearn
+
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported model artifact version {state.get('version')} in {path}")
+        if state.get('sklearn_version') != sklearn.__version__:
+            raise ValueError(f"{path} was saved with scikit-learn {state.get('sklearn_version')}, "
+                             f"running {sklearn.__version__}")
+        encoder = None
+        if encoder_path is not None:
+            if torch is None:
+                raise ImportError("Loading an encoder needs torch, install it with pip install torch")
+            encoder = torch.jit.load(encoder_path, map_location='cpu')
+        return cls(state['scaler'], state['pca'], state['forest'], state['columns'], encoder,
+                   state.get('embedding_forest'), state.get('sequence_dim'), state['model_id'])
+
+    @classmethod
+    def load_or_fit(cls, path, df, n_components=50, random_state=0, id_column='customer_id'):
+        """
+        Load the artifact at path when it was fitted on the same feature columns with the
+        installed scikit-learn, otherwise fit on df and save it there.
+
+        Reruns over an unchanged feature table then only pay for transform calls.
+
+        Returns:
+            AnomalyModel: The loaded or freshly fitted model
+        """
+        columns = df.columns.drop(id_column, errors='ignore')
+        try:
+            model = cls.load(path)
+            if model.schema_hash == feature_schema_hash(columns):
+                return model
+            print(f"Feature columns changed since {path} was fitted, refitting")
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            print(f"{e}, refitting")
+        model = cls.fit(df, n_components, random_state, id_column)
+        model.save(path)
+        return model
+
+    def feature_matrix(self, rows):
+        """Rows as a float64 matrix in self.columns order, from a DataFrame, dicts or a 2D array"""
+        if isinstance(rows, pd.DataFrame):
+            return rows[self.columns].to_numpy(dtype=np.float64)
+        if len(rows) and isinstance(rows[0], dict):
+            return pd.DataFrame(list(rows))[self.columns].to_numpy(dtype=np.float64)
+        matrix = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        if matrix.ndim != 2 or matrix.shape[1] != len(self.columns):
+            raise ValueError(f"Expected rows of {len(self.columns)} feature values, got shape {matrix.shape}")
+        return matrix
+
+    def transform(self, rows):
+        """PCA features of customer feature rows, with transform calls only"""
+        matrix = self.feature_matrix(rows)
+        if hasattr(self.scaler, 'feature_names_in_'):
+            # A scaler fitted on a DataFrame, as in the notebooks, expects the column names
+            matrix = pd.DataFrame(matrix, columns=self.scaler.feature_names_in_)
+        return self.pca.transform(self.scaler.transform(matrix))
+
+    def score_features(self, rows):
+        """Anomaly score of every customer feature row"""
+        return -self.forest.score_samples(self.transform(rows))
+
+    def predict(self, rows):
+        """IsolationForest labels, -1 for anomalies and 1 otherwise, like clf.fit_predict in the notebooks"""
+        return self.forest.predict(self.transform(rows))
+
+    def score_changed(self, df, previous=None, id_column='customer_id'):
+        """
+        Anomaly scores of a feature table, reusing previous scores of unchanged customers.
+
+        Every row is fingerprinted with a hash of its feature values. Only customers that
+        are new, whose row hash changed, or that were scored by another fit of the model
+        (another model_id, e.g. after load_or_fit refitted it) are scored again.
+
+        Args:
+            df (pd.DataFrame): Feature table with id_column and self.columns
+            previous (pd.DataFrame): An earlier result of score_changed, None to score all
+
+        Returns:
+            pd.DataFrame: id_column, row_hash, schema_hash, model_id and anomaly_score of
+                every customer of df, in df order
+        """
+        row_hash = pd.util.hash_pandas_object(df[self.columns], index=False).to_numpy()
+        scores = pd.DataFrame({id_column: df[id_column].to_numpy(), 'row_hash': row_hash,
+                               'schema_hash': self.schema_hash, 'model_id': self.model_id,
+                               'anomaly_score': np.nan})
+        if previous is not None and 'model_id' in previous.columns:
+            previous = previous[previous['model_id'] == self.model_id]
+            known = scores[[id_column, 'row_hash']].merge(
+                previous[[id_column, 'row_hash', 'anomaly_score']].astype({'row_hash': np.uint64}),
+                on=[id_column, 'row_hash'], how='left')
+            scores['anomaly_score'] = known['anomaly_score'].to_numpy()
+
+        stale = scores['anomaly_score'].isna().to_numpy()
+        if stale.any():
+            scores.loc[stale, 'anomaly_score'] = self.score_features(df.loc[stale])
+        return scores
+
+    def embed(self, x, mask):
+        """
+        Customer embeddings of padded transaction sequences, in torch inference mode.
+
+        Args:
+            x (np.ndarray): (batch, seq_len, dim) float32 transactions
+            mask (np.ndarray): (batch, seq_len), 1 for transactions and 0 for padding
+
+        Returns:
+            np.ndarray: (batch, emb_dim) embeddings
+        """
+        if self.encoder is None:
+            raise ValueError("The model was loaded without an encoder")
+        with torch.inference_mode():
+            return self.encoder(torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32)),
+                                torch.from_numpy(np.ascontiguousarray(mask, dtype=np.float32))).numpy()
+
+    def score_sequences(self, x, mask):
+        """Anomaly score of every padded sequence, from the forest fitted on the embeddings"""
+        if self.embedding_forest is None:
+            raise ValueError("Scoring sequences needs an embedding_forest fitted on encoder embeddings")
+        return -self.embedding_forest.score_samples(self.embed(x, mask))
+
+
+def pad_sequences(sequences):
+    """Zero-pad (seq_len, dim) arrays into a (batch, max_len, dim) batch and its 1/0 mask"""
+    lengths = np.array([len(sequence) for sequence in sequences])
+    dim = np.asarray(sequences[0]).shape[1]
+    x = np.zeros((len(sequences), lengths.max(), dim), dtype=np.float32)
+    for row, sequence in enumerate(sequences):
+        x[row, :lengths[row]] = sequence
+    mask = (np.arange(lengths.max()) < lengths[:, None]).astype(np.float32)
+    return x, mask
+
+
+class DynamicBatcher:
+    def __init__(self, score_batch, max_batch_size=256, max_wait_ms=5, max_queue=10_000):
+        """
+        Groups concurrent requests into micro-batches scored by one background thread.
+
+        A batch is scored as soon as it holds max_batch_size items or max_wait_ms after
+        its first request arrived, whichever comes first, so a request waits at most
+        max_wait_ms plus the scoring time of one batch. When max_queue requests are
+        already waiting new ones are rejected instead of piling up latency.
+
+        Parameters:
+        score_batch (callable): Takes the list of request payloads of a batch and returns
+            the list of their results, in the same order
+        max_batch_size (int): Items per batch, counted with the size given to submit
+        max_wait_ms (float): Longest wait for more requests once a batch is started
+        max_queue (int): Requests allowed to wait
+        """
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = {'requests': 0, 'items': 0, 'batches': 0}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, payload, size=1):
+        """
+        Queue a request.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the request's result
+
+        Raises:
+            RuntimeError: If the queue is full
+        """
+        future = Future()
+        try:
+            self.queue.put_nowait((payload, size, future))
+        except queue.Full:
+            raise RuntimeError("Scoring queue is full, try again later")
+        return future
+
+    def next_batch(self):
+        """Block for a first request, then collect more until the batch is full or the wait is over"""
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        size = first[1]
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Score what was collected, then stop
+                self.queue.put(None)
+                break
+            batch.append(item)
+            size += item[1]
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            self.score(batch)
+            self.stats['requests'] += len(batch)
+            self.stats['items'] += sum(size for _, size, _ in batch)
+            self.stats['batches'] += 1
+
+    def score(self, batch):
+        """
+        Score a batch and resolve its futures.
+
+        When the batch call fails its requests are retried one by one, so only the
+        request that caused the error gets it.
+        """
+        try:
+            results = self.score_batch([payload for payload, _, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+                return
+            for item in batch:
+                self.score([item])
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class ScoringService:
+    def __init__(self, model, max_batch_size=256, max_wait_ms=5, max_queue=10_000, num_threads=1):
+        """
+        Dynamic-batching front of an AnomalyModel, safe to call from many threads.
+
+        Feature rows and transaction sequences have their own batchers. num_threads
+        sets the torch CPU threads of the encoder, the scaler, PCA and forest run in the
+        batcher threads.
+
+        Parameters:
+        model (AnomalyModel): The loaded model
+        max_batch_size (int): Feature rows or sequences per batch
+        max_wait_ms (float): Longest wait for more requests, see DynamicBatcher
+        max_queue (int): Requests allowed to wait per batcher
+        num_threads (int): torch intra-op threads
+        """
+        self.model = model
+        if torch is not None:
+            torch.set_num_threads(num_threads)
+        self.feature_batcher = DynamicBatcher(self.score_feature_batch, max_batch_size, max_wait_ms, max_queue)
+        self.sequence_batcher = None
+        if model.encoder is not None:
+            self.sequence_batcher = DynamicBatcher(self.score_sequence_batch, max_batch_size, max_wait_ms, max_queue)
+
+    def score_feature_batch(self, payloads):
+        """One model call for the rows of every request, split back per request"""
+        scores = self.model.score_features(np.concatenate(payloads))
+        return np.split(scores, np.cumsum([len(payload) for payload in payloads])[:-1])
+
+    def score_sequence_batch(self, payloads):
+        return list(self.model.score_sequences(*pad_sequences(payloads)))
+
+    def score_features(self, rows, timeout=None):
+        """
+        Anomaly scores of some customer feature rows, see AnomalyModel.feature_matrix.
+
+        Raises:
+            ValueError: If the rows are empty, have the wrong width or hold NaN or
+                infinite values, checked before the request joins a batch
+            concurrent.futures.TimeoutError: If the scores are not ready within timeout
+        """
+        matrix = self.model.feature_matrix(rows)
+        if len(matrix) == 0:
+            raise ValueError("No feature rows to score")
+        if not np.isfinite(matrix).all():
+            raise ValueError("Feature rows must not contain NaN or infinite values")
+        return self.feature_batcher.submit(matrix, len(matrix)).result(timeout)
+
+    def score_sequence(self, sequence, timeout=None):
+        """Anomaly score of one customer's (seq_len, dim) transactions, validated like score_features"""
+        if self.sequence_batcher is None:
+            raise ValueError("The model was loaded without an encoder")
+        sequence = np.asarray(sequence, dtype=np.float32)
+        if sequence.ndim != 2 or len(sequence) == 0:
+            raise ValueError(f"Expected a non-empty (seq_len, dim) sequence, got shape {sequence.shape}")
+        if self.model.sequence_dim is not None and sequence.shape[1] != self.model.sequence_dim:
+            raise ValueError(f"Expected transactions of {self.model.sequence_dim} values, got {sequence.shape[1]}")
+        if not np.isfinite(sequence).all():
+            raise ValueError("Sequences must not contain NaN or infinite values")
+        return float(self.sequence_batcher.submit(sequence).result(timeout))
+
+    def stats(self):
+        return {'features': dict(self.feature_batcher.stats),
+                'sequences': dict(self.sequence_batcher.stats) if self.sequence_batcher is not None else None}
+
+    def close(self):
+        self.feature_batcher.close()
+        if self.sequence_batcher is not None:
+            self.sequence_batcher.close()
+
+
+def make_handler(service, timeout=10):
+    """
+    HTTP handler of a ScoringService.
+
+    POST /score takes {"rows": [...]} (lists of feature values or dicts by column) or
+    {"sequence": [[...], ...]} and answers {"scores": [...]}. GET /health answers the
+    batching statistics.
+    """
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != '/health':
+                return self.reply(404, {'error': 'not found'})
+            self.reply(200, {'status': 'ok', **service.stats()})
+
+        def do_POST(self):
+            if self.path != '/score':
+                return self.reply(404, {'error': 'not found'})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if 'sequence' in request:
+                    scores = [service.score_sequence(request['sequence'], timeout)]
+                else:
+                    scores = service.score_features(request['rows'], timeout).tolist()
+            except FutureTimeoutError:
+                # Before the RuntimeError and ValueError cases, it is an OSError from 3.11 on
+                return self.reply(504, {'error': f"Scoring took longer than {timeout} s"})
+            except RuntimeError as e:
+                return self.reply(503, {'error': str(e)})
+            except (KeyError, ValueError, TypeError) as e:
+                return self.reply(400, {'error': str(e)})
+            except Exception as e:
+                return self.reply(500, {'error': str(e)})
+            self.reply(200, {'scores': scores})
+
+        def log_message(self, format, *args):
+            # One line per request would dominate the latency under load
+            pass
+
+    return ScoringHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score customers with the fitted anomaly model')
+    parser.add_argument('--model', default='comp_anomaly_model.pkl', help='Pickle written by AnomalyModel.save')
+    parser.add_argument('--encoder', default=None, help='TorchScript sequence encoder')
+    parser.add_argument('--input', default=None, help='Score this customer feature CSV and exit instead of serving')
+    parser.add_argument('--output', default='anomaly_scores.csv',
+                        help='Scores of --input, customers unchanged since the last run keep their score')
+    parser.add_argument('--fit', action='store_true',
+                        help='With --input, fit and save the model when it is missing or its feature schema changed')
+    parser.add_argument('--n-components', type=int, default=50, help='PCA components when fitting')
+    parser.add_argument('--rescore-all', action='store_true', help='Ignore the previous scores in --output')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=1, help='torch CPU threads')
+    args = parser.parse_args()
+
+    if args.input:
+        df = pd.read_csv(args.input)
+        if args.fit:
+            model = AnomalyModel.load_or_fit(args.model, df, args.n_components)
+        else:
+            model = AnomalyModel.load(args.model)
+        previous = None
+        if os.path.exists(args.output) and not args.rescore_all:
+            previous = pd.read_csv(args.output, dtype={'row_hash': np.uint64})
+        scores = model.score_changed(df, previous)
+        scores.to_csv(args.output, index=False)
+        print(f"Scores of {len(scores)} customers saved to {args.output}")
+        return
+
+    model = AnomalyModel.load(args.model, args.encoder)
+
+    service = ScoringService(model, args.max_batch_size, args.max_wait_ms, num_threads=args.threads)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Scoring on http://{args.host}:{args.port}/score")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
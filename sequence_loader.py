@@ -0,0 +1,288 @@
+import argparse
+import time
+
+import numpy as np
+
+from sequence_store import SequenceStore
+
+try:
+    import torch
+    from torch.utils.data import DataLoader
+except ImportError:
+    # Only the DataLoader and tensor output need torch, the sampling and padding do not
+    torch = None
+
+
+def sequence_windows(indptr, max_seq_len=None, long_sequences='truncate', stride=None):
+    """
+    Row ranges of the training sequences of every customer.
+
+    Args:
+        indptr (np.ndarray): CustomerIndex offsets of the transactions
+        max_seq_len (int): Length cap, None to keep whole histories
+        long_sequences (str): 'truncate' keeps the last max_seq_len transactions of longer
+            histories, 'window' splits them into windows of max_seq_len transactions
+        stride (int): Start-to-start distance of the windows, default max_seq_len
+
+    Returns:
+        tuple: (customers, starts, lengths) int64 arrays, one entry per sequence
+    """
+    starts, stops = indptr[:-1].astype(np.int64), indptr[1:].astype(np.int64)
+    customers = np.arange(len(starts))
+    if max_seq_len is None:
+        return customers, starts, stops - starts
+    if long_sequences == 'truncate':
+        starts = np.maximum(starts, stops - max_seq_len)
+        return customers, starts, stops - starts
+    if long_sequences != 'window':
+        raise ValueError(f"long_sequences must be 'truncate' or 'window', got {long_sequences!r}")
+
+    stride = stride or max_seq_len
+    lengths = stops - starts
+    # Windows until the one reaching the end of the history, at least one per customer
+    n_windows = np.maximum(1, -(-np.maximum(lengths - max_seq_len, 0) // stride) + 1)
+    customers = np.repeat(customers, n_windows)
+    offsets = np.arange(n_windows.sum()) - np.repeat(np.cumsum(n_windows) - n_windows, n_windows)
+    window_starts = starts[customers] + offsets * stride
+    return customers, window_starts, np.minimum(stops[customers] - window_starts, max_seq_len)
+
+
+class LengthBucketSampler:
+    def __init__(self, lengths, batch_size=32, bucket_size=None, shuffle=True, seed=None, drop_last=False):
+        """
+        Batch sampler grouping sequences of similar length to keep padding low.
+
+        Without shuffling the sequences are batched in order of length. With shuffling the
+        sequences are cut into random buckets of bucket_size, every bucket is sorted by
+        length and batched, and the batches are served in random order, so the batches
+        differ between epochs while their lengths stay close.
+
+        Parameters:
+        lengths (np.ndarray): Length of every sequence
+        batch_size (int): Sequences per batch
+        bucket_size (int): Sequences sorted together, default 50 batches
+        shuffle (bool): Draw new buckets and batch order every epoch
+        seed (int): Seed of the shuffling
+        drop_last (bool): Leave out the batches smaller than batch_size
+        """
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.bucket_size = bucket_size or 50 * batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.drop_last = drop_last
+
+    def batches(self):
+        """Positions of the sequences of every batch of one epoch"""
+        if not self.shuffle:
+            order = np.argsort(self.lengths, kind='stable')
+            buckets = [order]
+        else:
+            order = self.rng.permutation(len(self.lengths))
+            buckets = [bucket[np.argsort(self.lengths[bucket], kind='stable')]
+                       for bucket in np.split(order, range(self.bucket_size, len(order), self.bucket_size))]
+
+        batches = [bucket[start:start + self.batch_size]
+                   for bucket in buckets for start in range(0, len(bucket), self.batch_size)]
+        if self.drop_last:
+            batches = [batch for batch in batches if len(batch) == self.batch_size]
+        if self.shuffle:
+            batches = [batches[i] for i in self.rng.permutation(len(batches))]
+        return batches
+
+    def __iter__(self):
+        return (batch.tolist() for batch in self.batches())
+
+    def __len__(self):
+        n = len(self.lengths)
+        sizes = [n] if not self.shuffle else [self.bucket_size] * (n // self.bucket_size) + [n % self.bucket_size]
+        if self.drop_last:
+            return sum(size // self.batch_size for size in sizes)
+        return sum(-(-size // self.batch_size) for size in sizes)
+
+
+class RandomBatchSampler:
+    def __init__(self, n, batch_size=32, shuffle=True, seed=None, drop_last=False):
+        """
+        Batch sampler over the sequences in store order or, with shuffling, in a new random
+        order every epoch.
+
+        Parameters:
+        n (int): Number of sequences
+        batch_size (int): Sequences per batch
+        shuffle (bool): Draw a new order every epoch
+        seed (int): Seed of the shuffling
+        drop_last (bool): Leave out the last batch when it is smaller than batch_size
+        """
+        self.n = n
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.drop_last = drop_last
+
+    def batches(self):
+        """Positions of the sequences of every batch of one epoch"""
+        order = self.rng.permutation(self.n) if self.shuffle else np.arange(self.n)
+        stop = self.n - self.n % self.batch_size if self.drop_last else self.n
+        return [order[start:start + self.batch_size] for start in range(0, stop, self.batch_size)]
+
+    def __iter__(self):
+        return (batch.tolist() for batch in self.batches())
+
+    def __len__(self):
+        return self.n // self.batch_size if self.drop_last else -(-self.n // self.batch_size)
+
+
+class CustomerSequenceDataset:
+    def __init__(self, store_dir, max_seq_len=512, long_sequences='truncate', stride=None, one_hot=True):
+        """
+        Map-style dataset of customer transaction sequences from a sequence store.
+
+        Items are row ranges of the store, one per customer or, with windowing, one per
+        window. The collate function reads a whole batch of ranges from the memory-mapped
+        store and pads it, so it can run in DataLoader workers. The store is reopened in
+        every worker instead of being pickled with the dataset.
+
+        Parameters:
+        store_dir (str or Path): Folder written by sequence_store.write_sequence_store
+        max_seq_len (int): Length cap of the sequences, None for whole histories
+        long_sequences (str): 'truncate' or 'window', see sequence_windows
+        stride (int): Start-to-start distance of the windows, default max_seq_len
+        one_hot (bool): Append the one-hot expansion of the categorical codes, see
+            SequenceStore.pad_batch
+        """
+        self.store_dir = store_dir
+        self.one_hot = one_hot
+        self._store = None
+        self.customers, self.starts, self.lengths = sequence_windows(
+            self.store.index.indptr, max_seq_len, long_sequences, stride)
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = SequenceStore(self.store_dir)
+        return self._store
+
+    def __getstate__(self):
+        # Memory maps would be copied in full when pickled to a worker
+        return {**self.__dict__, '_store': None}
+
+    def __len__(self):
+        return len(self.customers)
+
+    def __getitem__(self, i):
+        """Only the position, the rows are read per batch in collate"""
+        return i
+
+    def pad(self, items):
+        """
+        Padded arrays of some sequences.
+
+        Returns:
+            dict: 'x' (batch, seq_len, dim) float32, 'mask' (batch, seq_len) float32 with 1
+                for transactions, 'src_key_padding_mask' (batch, seq_len) bool with True for
+                padding as nn.TransformerEncoder expects, 'lengths' and 'customer_ids'
+        """
+        items = np.asarray(items, dtype=np.int64)
+        starts, lengths = self.starts[items], self.lengths[items]
+        seq_len = int(lengths.max()) if len(items) else 0
+        x = SequenceStore.pad_rows(self.store.features, starts, lengths, seq_len, 0, np.float32)
+        if self.one_hot and self.store.codes is not None:
+            codes = SequenceStore.pad_rows(self.store.codes, starts, lengths, seq_len, -1, np.int32)
+            x = np.concatenate([x, self.store.encoder.to_dense(codes)], axis=-1)
+        padding = np.arange(seq_len) >= lengths[:, None]
+        return {'x': x,
+                'mask': (~padding).astype(np.float32),
+                'src_key_padding_mask': padding,
+                'lengths': lengths,
+                'customer_ids': self.store.customers[self.customers[items]]}
+
+    def collate(self, items):
+        """pad as torch tensors, customer_ids stay a NumPy array"""
+        batch = self.pad(items)
+        for key in ['x', 'mask', 'src_key_padding_mask', 'lengths']:
+            batch[key] = torch.from_numpy(batch[key])
+        return batch
+
+
+def make_loader(store_dir, batch_size=32, max_seq_len=512, long_sequences='truncate', stride=None, bucket=True,
+                shuffle=True, seed=None, num_workers=0, prefetch_factor=2, one_hot=True, pin_memory=False):
+    """
+    DataLoader of padded, length-bucketed customer sequence batches.
+
+    Args:
+        store_dir (str or Path): Folder written by sequence_store.write_sequence_store
+        batch_size (int): Sequences per batch
+        max_seq_len (int): Length cap, see CustomerSequenceDataset
+        long_sequences (str): 'truncate' or 'window', see sequence_windows
+        stride (int): Start-to-start distance of the windows
+        bucket (bool): Batch sequences of similar length, see LengthBucketSampler,
+            otherwise batches are drawn in (shuffled) store order, see RandomBatchSampler
+        shuffle (bool): New batches every epoch
+        seed (int): Seed of the shuffling
+        num_workers (int): Worker processes building batches ahead of the training loop
+        prefetch_factor (int): Batches prepared ahead by every worker
+        one_hot (bool): Append the one-hot categorical columns to x
+        pin_memory (bool): Pin the batches for faster copies to the GPU
+
+    Returns:
+        torch.utils.data.DataLoader: Batches as returned by CustomerSequenceDataset.collate
+    """
+    if torch is None:
+        raise ImportError("make_loader needs torch, install it with pip install torch")
+    dataset = CustomerSequenceDataset(store_dir, max_seq_len, long_sequences, stride, one_hot)
+    if bucket:
+        sampler = LengthBucketSampler(dataset.lengths, batch_size, shuffle=shuffle, seed=seed)
+    else:
+        sampler = RandomBatchSampler(len(dataset), batch_size, shuffle=shuffle, seed=seed)
+    return DataLoader(dataset, batch_sampler=sampler, collate_fn=dataset.collate, num_workers=num_workers,
+                      prefetch_factor=prefetch_factor if num_workers > 0 else None,
+                      persistent_workers=num_workers > 0, pin_memory=pin_memory)
+
+
+def loader_stats(loader, max_batches=None):
+    """
+    Padding efficiency and throughput of one pass over a loader.
+
+    Returns:
+        dict: 'batches', 'sequences', 'transactions' (real positions), 'padded_positions'
+            (batch size times padded length, summed), 'padding_efficiency' (their ratio),
+            'seconds' and 'sequences_per_second'
+    """
+    stats = {'batches': 0, 'sequences': 0, 'transactions': 0, 'padded_positions': 0}
+    start = time.perf_counter()
+    for batch in loader:
+        mask = batch['src_key_padding_mask']
+        stats['batches'] += 1
+        stats['sequences'] += mask.shape[0]
+        stats['transactions'] += int((~mask).sum())
+        stats['padded_positions'] += mask.shape[0] * mask.shape[1]
+        if max_batches is not None and stats['batches'] >= max_batches:
+            break
+    stats['seconds'] = time.perf_counter() - start
+    stats['padding_efficiency'] = stats['transactions'] / max(stats['padded_positions'], 1)
+    stats['sequences_per_second'] = stats['sequences'] / max(stats['seconds'], 1e-9)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Padding efficiency and throughput of the sequence DataLoader')
+    parser.add_argument('store_dir', help='Folder written by write_sequence_store')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-seq-len', type=int, default=512)
+    parser.add_argument('--long-sequences', choices=['truncate', 'window'], default='truncate')
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--max-batches', type=int, default=None)
+    args = parser.parse_args()
+
+    for bucket in [False, True]:
+        loader = make_loader(args.store_dir, args.batch_size, args.max_seq_len, args.long_sequences,
+                             bucket=bucket, seed=0, num_workers=args.workers)
+        stats = loader_stats(loader, args.max_batches)
+        print(f"{'bucketed' if bucket else 'random':<9} {stats['batches']} batches, "
+              f"padding efficiency {stats['padding_efficiency']:.1%}, "
+              f"{stats['sequences_per_second']:.0f} sequences/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from customer_index import CustomerIndex
+from trx_encoding import CategoricalEncoder
+
+
+# Bump when the on-disk layout changes
+STORE_VERSION = 1
+
+FEATURES_FILE = 'features.npy'
+OFFSETS_FILE = 'offsets.npy'
+CUSTOMERS_FILE = 'customers.npy'
+CODES_FILE = 'codes.npy'
+VOCAB_FILE = 'vocab.json'
+MANIFEST_FILE = 'manifest.json'
+
+
+def write_sequence_store(df, store_dir, customer_column='customer_id', dtype='float32', chunk_rows=100_000,
+                         encoder=None):
+    """
+    Write encoded transactions as one contiguous feature matrix plus a customer offsets index.
+
+    Layout of store_dir:
+        features.npy   (n_transactions, dim) matrix of every feature column
+        offsets.npy    n_customers + 1 row offsets, see CustomerIndex
+        customers.npy  sorted customer IDs
+        manifest.json  column names, dtype and sizes
+        codes.npy      (n_transactions, n_fields) int32 categorical codes, with an encoder
+        vocab.json     the encoder's vocabulary, with an encoder
+
+    Args:
+        df (pd.DataFrame): Encoded transactions, every column except customer_column numeric
+            or boolean
+        store_dir (str or Path): Output folder
+        customer_column (str): Column holding the customer ID
+        dtype (str): Storage type, 'float32' or 'float16'
+        chunk_rows (int): Rows converted to dtype at a time, bounds the memory of the
+            conversion on top of the customer-sorted copy of df
+        encoder (CategoricalEncoder): When given, its fields hold codes from encode_frame and
+            are stored in codes.npy, to be one-hot expanded only when batches are built
+
+    Returns:
+        Path: The store folder
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    fields = encoder.fields if encoder is not None else []
+    columns = [col for col in df.columns if col != customer_column and col not in fields]
+    non_numeric = [col for col in columns if df[col].dtype == object]
+    if non_numeric:
+        raise ValueError(f"Columns must be numeric or boolean, got object columns {non_numeric}")
+
+    # Stable sort keeps every customer's transactions in their original order
+    df = df.sort_values(by=customer_column, kind='stable', ignore_index=True)
+    index = CustomerIndex.from_sorted(df[customer_column].to_numpy())
+
+    features = np.lib.format.open_memmap(store_dir / FEATURES_FILE, mode='w+', dtype=dtype,
+                                         shape=(len(df), len(columns)))
+    for start in range(0, len(df), chunk_rows):
+        # Rows are sliced before the columns, so every chunk only copies its own rows
+        features[start:start + chunk_rows] = df.iloc[start:start + chunk_rows][columns].to_numpy(dtype=dtype)
+    features.flush()
+    del features
+
+    if encoder is not None:
+        np.save(store_dir / CODES_FILE, df[fields].to_numpy(dtype=np.int32))
+        encoder.save(store_dir / VOCAB_FILE)
+
+    np.save(store_dir / OFFSETS_FILE, index.indptr)
+    np.save(store_dir / CUSTOMERS_FILE, index.customers.astype(str))
+    manifest = {
+        'version': STORE_VERSION,
+        'columns': columns,
+        'categorical_fields': fields,
+        'dtype': str(np.dtype(dtype)),
+        'n_transactions': len(df),
+        'n_customers': len(index),
+    }
+    with open(store_dir / MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return store_dir
+
+
+class SequenceStore:
+    def __init__(self, store_dir):
+        """
+        Read-only view of a store written by write_sequence_store.
+
+        The feature matrix is memory-mapped, so opening a store is instant and only the
+        rows of the batches being built are read from disk.
+
+        Parameters:
+        store_dir (str or Path): Folder written by write_sequence_store
+        """
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / MANIFEST_FILE) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported sequence store version {self.manifest.get('version')}")
+
+        self.columns = self.manifest['columns']
+        self.features = np.load(self.store_dir / FEATURES_FILE, mmap_mode='r')
+        self.index = CustomerIndex(np.load(self.store_dir / CUSTOMERS_FILE), np.load(self.store_dir / OFFSETS_FILE))
+        self.customers = self.index.customers
+
+        self.codes = None
+        self.encoder = None
+        if self.manifest.get('categorical_fields'):
+            self.codes = np.load(self.store_dir / CODES_FILE, mmap_mode='r')
+            self.encoder = CategoricalEncoder.load(self.store_dir / VOCAB_FILE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def lengths(self):
+        """Number of transactions of every customer"""
+        return self.index.lengths()
+
+    def sequence(self, i):
+        """(seq_len, dim) transactions of the i-th customer, as a memory-mapped view"""
+        return self.features[self.index.indptr[i]:self.index.indptr[i + 1]]
+
+    def customer_sequence(self, customer_id):
+        """(seq_len, dim) transactions of a customer, looked up by ID"""
+        i = np.searchsorted(self.customers, customer_id)
+        if i == len(self.customers) or self.customers[i] != customer_id:
+            raise KeyError(customer_id)
+        return self.sequence(i)
+
+    def batch_rows(self, positions, max_seq_len=None):
+        """
+        Row ranges of some customers' sequences, capped to max_seq_len.
+
+        Sequences longer than max_seq_len keep their last max_seq_len transactions.
+
+        Returns:
+            tuple: (starts, lengths, seq_len) where seq_len is the padded length of the batch
+        """
+        positions = np.asarray(positions)
+        starts = self.index.indptr[positions]
+        stops = self.index.indptr[positions + 1]
+        seq_len = int((stops - starts).max()) if len(positions) else 0
+        if max_seq_len is not None:
+            seq_len = min(seq_len, max_seq_len)
+            starts = np.maximum(starts, stops - seq_len)
+        return starts, stops - starts, seq_len
+
+    @staticmethod
+    def pad_rows(array, starts, lengths, seq_len, fill, dtype):
+        """Copy row ranges of a (memory-mapped) array into a (batch, seq_len, width) array"""
+        padded = np.full((len(starts), seq_len, array.shape[1]), fill, dtype=dtype)
+        for row, (start, length) in enumerate(zip(starts, lengths)):
+            padded[row, :length] = array[start:start + length]
+        return padded
+
+    def pad_codes(self, positions, max_seq_len=None):
+        """
+        Categorical codes of some customers, padded with -1 (no one-hot entry).
+
+        Returns:
+            np.ndarray: (len(positions), seq_len, n_fields) int32 codes
+        """
+        starts, lengths, seq_len = self.batch_rows(positions, max_seq_len)
+        return self.pad_rows(self.codes, starts, lengths, seq_len, -1, np.int32)
+
+    def pad_batch(self, positions, max_seq_len=None, one_hot=True):
+        """
+        Copy the sequences of some customers into one zero-padded array.
+
+        Args:
+            positions (np.ndarray): Positions of the customers in self.customers
+            max_seq_len (int): Length cap, defaults to the longest sequence in the batch
+            one_hot (bool): Append the one-hot expansion of the categorical codes, when the
+                store has some. Use pad_codes for embedding lookups instead.
+
+        Returns:
+            tuple: (batch, mask) with batch of shape (len(positions), seq_len, dim) and
+                mask of shape (len(positions), seq_len), 1 for transactions and 0 for padding
+        """
+        starts, lengths, seq_len = self.batch_rows(positions, max_seq_len)
+        batch = self.pad_rows(self.features, starts, lengths, seq_len, 0, np.float32)
+        if one_hot and self.codes is not None:
+            codes = self.pad_rows(self.codes, starts, lengths, seq_len, -1, np.int32)
+            batch = np.concatenate([batch, self.encoder.to_dense(codes)], axis=-1)
+
+        mask = (np.arange(seq_len) < lengths[:, None]).astype(np.float32)
+        return batch, mask
+
+    def batches(self, batch_size=32, max_seq_len=None, shuffle=False, seed=None, one_hot=True):
+        """
+        Iterate over every customer in padded batches.
+
+        Args:
+            batch_size (int): Customers per batch
+            max_seq_len (int): Length cap, see pad_batch
+            shuffle (bool): Visit customers in a random order
+            seed (int): Seed of the shuffle
+            one_hot (bool): See pad_batch
+
+        Yields:
+            tuple: (batch, mask, customer_ids), see pad_batch. The arrays are float32 and
+                can be wrapped with torch.from_numpy without a copy.
+        """
+        positions = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(positions)
+        for start in range(0, len(positions), batch_size):
+            chunk = positions[start:start + batch_size]
+            batch, mask = self.pad_batch(chunk, max_seq_len, one_hot)
+            yield batch, mask, self.customers[chunk]
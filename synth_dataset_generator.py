@@ -0,0 +1,158 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Percentage of debit transactions per payment format in the competition dataset, the
+# same proportion is used to make the bidirectional IBM transactions unidirectional
+DEBIT_PERCENT = {
+    'Cheque': 58.26,
+    'ACH': 50.0,
+    'Credit Card': 97.56,
+    'Wire': 55.63,
+}
+
+# Exchange rates to CAD as of 2025-01-31
+EXCHANGE_RATES = {'US Dollar': 1.4451,
+                  'Swiss Franc': 1.5898,
+                  'Saudi Riyal': 0.3846,
+                  'Euro': 1.5038,
+                  'Canadian Dollar': 1.0,
+                  'Rupee': 0.0167,
+                  'Australian Dollar': 0.9009,
+                  'Yuan': 0.1988,
+                  'Ruble': 0.0147,
+                  'Mexican Peso': 0.0701,
+                  'Shekel': 0.4032,
+                  'Brazil Real': 0.2457,
+                  'UK Pound': 1.7953,
+                  'Yen': 0.0094,
+                  'Bitcoin': 148034.33
+                  }
+
+# Output file of every payment format kept from the IBM dataset
+PAYMENT_FORMAT_FILES = {
+    'ACH': 'ach_s.csv',
+    'Cheque': 'cheque_s.csv',
+    'Credit Card': 'card_s.csv',
+    'Wire': 'wire_s.csv',
+}
+
+OUTPUT_COLUMNS = ['transaction_date', 'transaction_time', 'city', 'currency', 'customer_id', 'amount_cad',
+                  'debit_credit', 'trx_type', 'Is Laundering']
+
+
+def lookup(values, table):
+    """Map a column through a dict with one factorize instead of a Python call per row, NaN when missing"""
+    codes, uniques = pd.factorize(values)
+    mapped = np.array([table.get(value, np.nan) for value in uniques] + [np.nan], dtype=np.float64)
+    return mapped[codes]
+
+
+def convert_transactions(ibm, rng, debit_percent=DEBIT_PERCENT, exchange_rates=EXCHANGE_RATES):
+    """
+    Turn IBM transactions into one-sided customer transactions in the competition layout.
+
+    Every transaction is kept from one side only: with the debit percentage of its payment
+    format it becomes a debit of the sending account (money paid, to the receiving bank),
+    otherwise a credit of the receiving account (money received, from the sending bank).
+
+    Args:
+        ibm (pd.DataFrame): IBM transactions with the payment formats of PAYMENT_FORMAT_FILES
+        rng (np.random.Generator): Source of the debit/credit draws, one per row
+        debit_percent (dict): Percentage of debits per payment format
+        exchange_rates (dict): CAD value of one unit of every currency
+
+    Returns:
+        pd.DataFrame: The OUTPUT_COLUMNS, one row per IBM transaction
+    """
+    is_debit = rng.random(len(ibm)) < lookup(ibm['Payment Format'], debit_percent) / 100
+
+    # IBM timestamps are to the minute, so many rows share one: every distinct timestamp
+    # is parsed and formatted once and the rows pick theirs by code
+    codes, timestamps = pd.factorize(ibm['Timestamp'])
+    timestamps = pd.DatetimeIndex(pd.to_datetime(timestamps))
+
+    # Debits are paid by the sending account, credits received by the other one
+    paid_cad = ibm['Amount Paid'].to_numpy() * lookup(ibm['Payment Currency'], exchange_rates)
+    received_cad = ibm['Amount Received'].to_numpy() * lookup(ibm['Receiving Currency'], exchange_rates)
+    return pd.DataFrame({
+        'transaction_date': np.asarray(timestamps.strftime('%Y-%m-%d'), dtype=object)[codes],
+        'transaction_time': np.asarray(timestamps.strftime('%H:%M:%S'), dtype=object)[codes],
+        # The bank on the other end of the transaction
+        'city': np.where(is_debit, ibm['To Bank'], ibm['From Bank']),
+        # The currency used on the other end of the transaction
+        'currency': np.where(is_debit, ibm['Receiving Currency'], ibm['Payment Currency']),
+        'customer_id': np.where(is_debit, ibm['Account'], ibm['Account.1']),
+        'amount_cad': np.where(is_debit, paid_cad, received_cad),
+        'debit_credit': np.where(is_debit, 'debit', 'credit'),
+        'trx_type': ibm['Payment Format'].to_numpy(),
+        'Is Laundering': ibm['Is Laundering'].to_numpy(),
+    }, columns=OUTPUT_COLUMNS)
+
+
+def generate_synthetic_dataset(ibm_path, output_dir='processed_synth_dataset', combined_path=None,
+                               chunksize=1_000_000, frac=1, seed=0,
+                               debit_percent=DEBIT_PERCENT, exchange_rates=EXCHANGE_RATES):
+    """
+    Convert the IBM transactions file into one CSV per payment format, chunk by chunk.
+
+    The IBM file is read in chunks, converted with convert_transactions and appended to
+    the per-format files, so memory stays bounded by the chunk size however large the file
+    is. With frac below 1 every chunk is sampled, and the rows of every chunk are shuffled
+    like the whole-file sample the notebook used to take.
+
+    Args:
+        ibm_path (str or Path): IBM transactions CSV, e.g. synth_datasets/LI-Small_Trans.csv
+        output_dir (str or Path): Folder of the per-format files of PAYMENT_FORMAT_FILES
+        combined_path (str or Path): Also write every converted row to this CSV, None to skip
+        chunksize (int): IBM rows converted at a time
+        frac (float): Fraction of the IBM transactions to keep
+        seed (int): Seed of the sampling and of the debit/credit draws
+        debit_percent (dict): Percentage of debits per payment format
+        exchange_rates (dict): CAD value of one unit of every currency
+
+    Returns:
+        dict: Number of rows written to every output file
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    rows = {}
+
+    def append(df, path):
+        df.to_csv(path, mode='a' if path in rows else 'w', header=path not in rows, index=False)
+        rows[path] = rows.get(path, 0) + len(df)
+
+    for chunk in pd.read_csv(ibm_path, chunksize=chunksize):
+        chunk = chunk[chunk['Payment Format'].isin(list(PAYMENT_FORMAT_FILES))]
+        chunk = chunk.sample(frac=frac, random_state=rng)
+        converted = convert_transactions(chunk, rng, debit_percent, exchange_rates)
+
+        if combined_path is not None:
+            append(converted, Path(combined_path))
+        for payment_format, trx in converted.groupby('trx_type', sort=False):
+            append(trx.drop(columns=['trx_type']), output_dir / PAYMENT_FORMAT_FILES[payment_format])
+    return {str(path): count for path, count in rows.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the IBM AML transactions into the synthetic dataset')
+    parser.add_argument('--ibm-path', default='synth_datasets/LI-Small_Trans.csv')
+    parser.add_argument('--output-dir', default='processed_synth_dataset')
+    parser.add_argument('--combined-path', default=None, help='Also write every row to this CSV')
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    parser.add_argument('--frac', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = generate_synthetic_dataset(args.ibm_path, args.output_dir, args.combined_path,
+                                      args.chunksize, args.frac, args.seed)
+    for path, count in rows.items():
+        print(f"{count} rows written to {path}")
+
+
+if __name__ == "__main__":
+    main()
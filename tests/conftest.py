@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The modules live in the repo root and the feature folders, not in a package
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'features' / 'section_4_5'))
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from incremental_features import IncrementalFeatureStore
+from raw_data_cache import combine_date_and_time
+from transaction_volume_and_frequency import transaction_features
+
+
+def channel(n, seed, with_time=True):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'customer_id': rng.choice([f'SYNCID{i:010d}' for i in range(12)], n),
+        'amount_cad': rng.lognormal(4, 1, n).round(2),
+        'debit_credit': rng.choice(['credit', 'debit'], n),
+        'transaction_date': (pd.Timestamp('2022-11-01') + pd.to_timedelta(rng.integers(0, 120, n), unit='D'))
+        .strftime('%Y-%m-%d'),
+    })
+    if with_time:
+        df['transaction_time'] = (pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 86400, n), unit='s'))
+        df['transaction_time'] = df['transaction_time'].dt.strftime('%H:%M:%S')
+    return df
+
+
+def test_incremental_matches_full_rebuild_with_invalid_times(tmp_path):
+    dfs = {'abm': channel(200, 0), 'cheque': channel(100, 1, with_time=False), 'wire': channel(150, 2)}
+    # A wire-only customer whose transactions all have an unparseable time, and so a NaT datetime
+    invalid = np.arange(len(dfs['wire'])) % 15 == 0
+    dfs['wire'].loc[invalid, ['customer_id', 'transaction_time']] = ['SYNCID0000000099', 'not a time']
+    dfs = {name: df.assign(transaction_datetime=combine_date_and_time(df)) for name, df in dfs.items()}
+    assert dfs['wire']['transaction_datetime'].isna().sum() == invalid.sum() > 0
+
+    store = IncrementalFeatureStore(tmp_path / 'state')
+    for half in [slice(None, 60), slice(60, None)]:
+        store.update({name: df.iloc[half] for name, df in dfs.items()})
+    incremental = store.features()
+
+    full = transaction_features(dfs).rename(columns={'customer ID': 'customer_id'})
+    assert list(incremental['customer_id']) == list(full['customer_id'])
+    pd.testing.assert_frame_equal(incremental[full.columns], full, check_dtype=False, rtol=1e-9, atol=1e-12)
@@ -0,0 +1,94 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from period_features import compute_period_features, period_columns
+
+
+def baseline_period_features(df, df_key):
+    """
+    The per-customer loop of features_4_5.ipynb for one channel, with the weekly average
+    stored from the variable it computes (the notebook wrote a misspelled one, always 0).
+    """
+    df = df.copy()
+    df['transaction_date'] = pd.to_datetime(df['transaction_date']).dt.date
+    start_date, end_date = pd.to_datetime(df['transaction_date'].min()), pd.to_datetime(df['transaction_date'].max())
+    week_starts = pd.date_range(start_date - pd.Timedelta(days=start_date.weekday()),
+                                end_date + pd.Timedelta(days=6 - end_date.weekday()), freq='W-MON')
+    weekly_ranges = [(start, start + pd.Timedelta(days=6)) for start in week_starts]
+    monthly_ranges = [(start, (start + pd.offsets.MonthEnd(1)).normalize())
+                      for start in pd.date_range(start_date.replace(day=1), end_date, freq='MS')]
+    merchant = 'merchant_category' in df.columns
+    industry_codes = {code: i for i, code in enumerate(np.unique(df['merchant_category']))} if merchant else {}
+
+    rows = {}
+    for customer in sorted(df['customer_id'].unique()):
+        customer_df = df[df['customer_id'] == customer]
+        row = {}
+        merchant_vecs = np.zeros((len(weekly_ranges), len(industry_codes)))
+        for period, ranges in [('weekly', weekly_ranges), ('monthly', monthly_ranges)]:
+            spelling = 'weekely' if period == 'weekly' else period
+            for side in ['credit', 'debit']:
+                row[f'{df_key}_max_{side}_{period}_trx'] = 0
+                row[f'{df_key}_max_{side}_{spelling}_trx_avg_val'] = 0
+            for i, (start, end) in enumerate(ranges):
+                period_df = customer_df[(customer_df['transaction_date'] >= start.date())
+                                        & (customer_df['transaction_date'] <= end.date())]
+                for side in ['credit', 'debit']:
+                    side_df = period_df[period_df['debit_credit'] == side]
+                    if len(side_df) > row[f'{df_key}_max_{side}_{period}_trx']:
+                        row[f'{df_key}_max_{side}_{period}_trx'] = len(side_df)
+                        row[f'{df_key}_max_{side}_{spelling}_trx_avg_val'] = side_df['amount_cad'].mean()
+                if period == 'weekly' and merchant:
+                    for category, count in Counter(period_df['merchant_category']).items():
+                        merchant_vecs[i, industry_codes[category]] = count
+        if 'ecommerce_ind' in df.columns:
+            row[f'{df_key}_ecommerce_activity'] = Counter(customer_df['ecommerce_ind'])[True] / len(customer_df)
+        if 'cash_indicator' in df.columns:
+            row[f'{df_key}_cash_activity'] = Counter(customer_df['cash_indicator'])[True] / len(customer_df)
+        if merchant:
+            row[f'{df_key}_merchant_categories'] = len(Counter(customer_df['merchant_category']))
+            non_zero = merchant_vecs[merchant_vecs.sum(axis=1) > 0]
+            dissimilarity = np.linalg.norm(np.diff(non_zero, axis=0), axis=1)
+            row[f'{df_key}_merchant_category_dissimilarity'] = dissimilarity.mean() if len(dissimilarity) else 0
+            row[f'{df_key}_merchant_category_dissimilarity_std'] = dissimilarity.std() if len(dissimilarity) else 0
+        rows[customer] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def random_channel(n=600, n_customers=15, merchant=True, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'customer_id': rng.choice([f'SYNCID{i:010d}' for i in range(n_customers)], n),
+        'amount_cad': rng.lognormal(4, 1, n).round(2),
+        'debit_credit': rng.choice(['credit', 'debit'], n),
+        'transaction_date': (pd.Timestamp('2022-11-01') + pd.to_timedelta(rng.integers(0, 150, n), unit='D'))
+        .strftime('%Y-%m-%d'),
+    })
+    if merchant:
+        df['merchant_category'] = rng.choice(['4111', '5411', '5812', 'other'], n, p=[0.4, 0.3, 0.2, 0.1])
+        df['ecommerce_ind'] = rng.random(n) < 0.3
+    else:
+        df['cash_indicator'] = rng.random(n) < 0.5
+    return df
+
+
+@pytest.mark.parametrize('merchant', [True, False])
+def test_period_features_match_notebook(merchant):
+    df = random_channel(merchant=merchant)
+    features = compute_period_features(df, 'card')
+    expected = baseline_period_features(df, 'card')
+
+    assert list(features.columns) == period_columns('card', ecommerce=merchant, cash=not merchant,
+                                                    merchant=merchant)
+    assert list(features.index) == list(expected.index)
+    pd.testing.assert_frame_equal(features, expected[features.columns].astype(np.float64),
+                                  check_exact=False, rtol=1e-9, atol=1e-9)
+
+
+def test_period_features_accept_short_debit_credit_codes():
+    df = random_channel(merchant=False)
+    coded = df.assign(debit_credit=df['debit_credit'].map({'credit': 'C', 'debit': 'D'}))
+    pd.testing.assert_frame_equal(compute_period_features(coded, 'emt'), compute_period_features(df, 'emt'))
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scoring_service import AnomalyModel
+
+COLUMNS = [f'feature_{i}' for i in range(6)]
+
+
+def feature_table(seed, scale=1.0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.lognormal(0, scale, (300, len(COLUMNS))), columns=COLUMNS)
+    return df.assign(customer_id=[f'SYNCID{i:010d}' for i in range(len(df))])
+
+
+@pytest.fixture
+def previous_scores(tmp_path):
+    model = AnomalyModel.load_or_fit(tmp_path / 'model.pkl', feature_table(0), n_components=3)
+    model.score_changed(feature_table(0)).to_csv(tmp_path / 'scores.csv', index=False)
+    return pd.read_csv(tmp_path / 'scores.csv', dtype={'row_hash': np.uint64})
+
+
+def test_reloaded_model_reuses_scores(tmp_path, previous_scores):
+    model = AnomalyModel.load_or_fit(tmp_path / 'model.pkl', feature_table(0), n_components=3)
+    scores = model.score_changed(feature_table(0), previous_scores)
+    assert (scores['model_id'] == previous_scores['model_id']).all()
+    np.testing.assert_array_equal(scores['anomaly_score'], previous_scores['anomaly_score'])
+
+
+def test_refitted_model_rescores_everything(tmp_path, previous_scores):
+    (tmp_path / 'model.pkl').unlink()
+    # Same columns, different data, so only the fit tells the two models apart
+    model = AnomalyModel.load_or_fit(tmp_path / 'model.pkl', feature_table(1, scale=2.0), n_components=3)
+    scores = model.score_changed(feature_table(0), previous_scores)
+    assert (scores['model_id'] != previous_scores['model_id']).all()
+    np.testing.assert_allclose(scores['anomaly_score'], model.score_features(feature_table(0)))
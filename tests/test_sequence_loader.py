@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sequence_loader import (CustomerSequenceDataset, LengthBucketSampler, RandomBatchSampler, make_loader,
+                             sequence_windows)
+from sequence_store import write_sequence_store
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    customers = np.repeat([f'SYNCID{i:010d}' for i in range(40)], rng.integers(1, 30, 40))
+    df = pd.DataFrame({'customer_id': customers,
+                       'amount': rng.lognormal(4, 1, len(customers)),
+                       'is_debit': rng.random(len(customers)) < 0.5})
+    return write_sequence_store(df, tmp_path / 'store')
+
+
+def epoch_positions(sampler):
+    return sorted(position for batch in sampler for position in batch)
+
+
+def test_sequence_windows_truncate_and_window():
+    indptr = np.array([0, 3, 13])
+    customers, starts, lengths = sequence_windows(indptr, 4, 'truncate')
+    assert customers.tolist() == [0, 1]
+    assert starts.tolist() == [0, 9]
+    assert lengths.tolist() == [3, 4]
+
+    customers, starts, lengths = sequence_windows(indptr, 4, 'window', stride=3)
+    assert customers.tolist() == [0, 1, 1, 1]
+    assert starts.tolist() == [0, 3, 6, 9]
+    assert lengths.tolist() == [3, 4, 4, 4]
+
+
+@pytest.mark.parametrize('sampler', [
+    LengthBucketSampler(np.arange(103) % 17, batch_size=8, bucket_size=24, seed=0),
+    RandomBatchSampler(103, batch_size=8, seed=0),
+])
+def test_samplers_reshuffle_every_epoch(sampler):
+    first, second = [list(sampler) for _ in range(2)]
+    assert epoch_positions(first) == epoch_positions(second) == list(range(103))
+    assert len(first) == len(sampler)
+    assert first != second
+
+
+def test_random_batch_sampler_without_shuffle_keeps_store_order():
+    sampler = RandomBatchSampler(10, batch_size=4, shuffle=False, drop_last=True)
+    assert list(sampler) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert len(sampler) == 2
+
+
+def test_pad_masks_padding(store_dir):
+    dataset = CustomerSequenceDataset(store_dir, max_seq_len=10)
+    batch = dataset.pad([0, 1, 2])
+    seq_len = int(batch['lengths'].max())
+    assert batch['x'].shape == (3, seq_len, 2)
+    assert (batch['mask'].sum(axis=1) == batch['lengths']).all()
+    assert (batch['src_key_padding_mask'] == (batch['mask'] == 0)).all()
+    assert (batch['x'][batch['src_key_padding_mask']] == 0).all()
+
+
+def test_collate_returns_tensors(store_dir):
+    torch = pytest.importorskip('torch')
+    dataset = CustomerSequenceDataset(store_dir, max_seq_len=10)
+    batch = dataset.collate([0, 1, 2])
+    expected = dataset.pad([0, 1, 2])
+    for key in ['x', 'mask', 'src_key_padding_mask', 'lengths']:
+        assert isinstance(batch[key], torch.Tensor)
+        np.testing.assert_array_equal(batch[key].numpy(), expected[key])
+    assert batch['src_key_padding_mask'].dtype == torch.bool
+    np.testing.assert_array_equal(batch['customer_ids'], expected['customer_ids'])
+
+
+@pytest.mark.parametrize('bucket', [True, False])
+def test_loader_serves_every_sequence_once_per_epoch(store_dir, bucket):
+    pytest.importorskip('torch')
+    loader = make_loader(store_dir, batch_size=8, max_seq_len=10, bucket=bucket, seed=0)
+    epochs = [[batch['customer_ids'].tolist() for batch in loader] for _ in range(2)]
+    for epoch in epochs:
+        assert len(epoch) == len(loader)
+        assert sorted(customer for batch in epoch for customer in batch) == sorted(loader.dataset.store.customers)
+    assert epochs[0] != epochs[1]
@@ -0,0 +1,146 @@
+import datetime
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from transaction_volume_and_frequency import (Customer, customer_model_features, get_header,
+                                              load_transaction_files, transaction_features)
+
+RAW_DATA = Path(__file__).resolve().parents[1] / 'raw_data'
+TYPES = ['abm', 'card', 'cheque', 'eft', 'emt', 'wire']
+
+
+class BaselineCustomer:
+    """The original per-transaction Customer class, kept unchanged as the reference output"""
+
+    def __init__(self, ID):
+        self.ID = ID
+        self.transactions = dict()
+        self.transactions_frequency = np.zeros((6, 3))
+        self.avg_transaction_amount = np.zeros((6, 2))
+        self.transaction_amount_std = np.zeros((6, 2))
+        self.first_date = datetime.datetime(9999, 1, 1)
+        self.final_date = datetime.datetime(1, 1, 1)
+
+    def transaction_freq(self):
+        num_days = self.final_date - self.first_date
+        num_weeks = num_days.days // 7
+        num_months = num_days.days // 30
+        for i, type in enumerate(TYPES):
+            if type in self.transactions.keys():
+                transaction_count = len(self.transactions[type])
+                if num_days.days == 0:
+                    self.transactions_frequency[i, 0] = transaction_count
+                else:
+                    self.transactions_frequency[i, 0] = transaction_count / num_days.days
+                if num_weeks == 0:
+                    self.transactions_frequency[i, 1] = transaction_count
+                else:
+                    self.transactions_frequency[i, 1] = transaction_count / num_weeks
+                if num_months == 0:
+                    self.transactions_frequency[i, 2] = transaction_count
+                else:
+                    self.transactions_frequency[i, 2] = transaction_count / num_months
+
+    def transaction_amounts(self):
+        for i, type in enumerate(TYPES):
+            if type not in self.transactions.keys():
+                continue
+            total_credited = []
+            total_debited = []
+            for transaction in self.transactions[type]:
+                if transaction[3] in ['credit', 'C']:
+                    total_credited.append(transaction[2])
+                if transaction[3] in ['debit', 'D']:
+                    total_debited.append(transaction[2])
+            if len(total_credited) != 0:
+                self.avg_transaction_amount[i, 1] = sum(total_credited) / len(total_credited)
+                self.transaction_amount_std[i, 1] = np.std(total_credited)
+            if len(total_debited) != 0:
+                self.avg_transaction_amount[i, 0] = sum(total_debited) / len(total_debited)
+                self.transaction_amount_std[i, 0] = np.std(total_debited)
+
+    def add_transaction(self, type, transaction):
+        self.transactions.setdefault(type, []).append(transaction)
+        date_col = -1 if type == 'cheque' else -2
+        date = datetime.datetime(*[int(part) for part in transaction[date_col].split('-')])
+        self.first_date = min(self.first_date, date)
+        self.final_date = max(self.final_date, date)
+
+    def get_feature_vector(self):
+        freq_data, avg_amount, transaction_var = [], [], []
+        for i in range(len(TYPES)):
+            freq_data += list(self.transactions_frequency[i])
+            avg_amount += list(self.avg_transaction_amount[i])
+            transaction_var += list(self.transaction_amount_std[i])
+        return [self.ID] + freq_data + avg_amount + transaction_var
+
+
+def baseline_features(folder):
+    """The original script's row-by-row loop over the channel CSVs"""
+    customers = dict()
+    for file in sorted(os.listdir(folder)):
+        if file not in [f'{type}.csv' for type in TYPES]:
+            continue
+        data = pd.read_csv(folder / file)
+        if file == 'card.csv':
+            data['amount_cad'] = data['amount_cad'].abs()
+        transaction_type = file.split('.')[0]
+        for _, transaction in data.iterrows():
+            transaction = transaction.values
+            customers.setdefault(transaction[1], BaselineCustomer(transaction[1])).add_transaction(
+                transaction_type, transaction)
+
+    customer_data = []
+    for customer in customers.values():
+        customer.transaction_freq()
+        customer.transaction_amounts()
+        customer_data.append(customer.get_feature_vector())
+    df = pd.DataFrame(customer_data, columns=get_header())
+    return df.sort_values('customer ID').reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def expected():
+    return baseline_features(RAW_DATA)
+
+
+@pytest.fixture(scope='module')
+def dfs():
+    return load_transaction_files(RAW_DATA)
+
+
+def assert_matches_baseline(actual, expected):
+    actual = actual.sort_values('customer ID').reset_index(drop=True)
+    assert list(actual.columns) == list(expected.columns)
+    np.testing.assert_array_equal(actual['customer ID'].to_numpy(), expected['customer ID'].to_numpy())
+    np.testing.assert_allclose(actual.drop(columns='customer ID').to_numpy(dtype=np.float64),
+                               expected.drop(columns='customer ID').to_numpy(dtype=np.float64),
+                               rtol=1e-9, atol=1e-9)
+
+
+def test_transaction_features_match_baseline(dfs, expected):
+    assert_matches_baseline(transaction_features(dfs), expected)
+
+
+def test_customer_model_features_match_baseline(dfs, expected):
+    assert_matches_baseline(customer_model_features(dfs), expected)
+
+
+def test_single_customer_matches_baseline():
+    rows = [('wire', ['W1', 'x', 10.0, 'debit', '2023-01-01', '10:00:00']),
+            ('wire', ['W2', 'x', 20.0, 'debit', '2023-01-11', '11:00:00']),
+            ('wire', ['W3', 'x', 7.5, 'credit', '2023-02-20', '11:00:00']),
+            ('cheque', ['C1', 'x', 5.0, 'credit', '2023-01-05'])]
+    customer, baseline = Customer('x'), BaselineCustomer('x')
+    for type, row in rows:
+        customer.add_transaction(type, row)
+        baseline.add_transaction(type, row)
+    for model in [customer, baseline]:
+        model.transaction_freq()
+        model.transaction_amounts()
+    assert customer.get_feature_vector()[0] == 'x'
+    np.testing.assert_allclose(customer.get_feature_vector()[1:], baseline.get_feature_vector()[1:], rtol=1e-12)
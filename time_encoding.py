@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+
+# Missing timestamps, the int64 value of NaT
+MISSING_SECONDS = np.iinfo(np.int64).min
+
+# Period of every cyclic encoding, in units of its field
+CYCLE_PERIODS = {'minutes': 60, 'hours': 24, 'days': 31, 'weekday': 7}
+
+# Encodings of trx_level_features.ipynb and synth_trx_level_features.ipynb, in column order
+TIME_ENCODINGS = {
+    'competition': ['abs', 'hours', 'days', 'weekday'],
+    'synthetic': ['abs', 'minutes', 'hours', 'weekday'],
+}
+
+
+def parse_unique(values, parse):
+    """Parse a column through its distinct values only, as int64 seconds, MISSING_SECONDS when unparseable"""
+    codes, uniques = pd.factorize(values)
+    parsed = np.full(len(uniques) + 1, MISSING_SECONDS, dtype=np.int64)
+    if len(uniques):
+        # Strings, datetime.date/time objects (pyarrow engine) and Timestamps all go through str
+        parsed[:-1] = parse(pd.Index(uniques).astype(str)).astype(np.int64)
+    return parsed[codes]
+
+
+def epoch_seconds(dates, times=None):
+    """
+    Seconds since 1970-01-01 of every transaction, from its date and time columns.
+
+    Dates repeat across thousands of rows and times across hundreds, so every distinct
+    value is parsed once instead of concatenating and re-parsing one string per row.
+
+    Args:
+        dates (array-like): transaction_date, 'YYYY-MM-DD' strings, dates or datetime64
+        times (array-like): transaction_time, 'HH:MM:SS' strings or times, None for
+            channels without one (cheque), which count as midnight
+
+    Returns:
+        np.ndarray: int64 seconds, MISSING_SECONDS where the date or time is missing or
+            invalid, like raw_data_cache.combine_date_and_time
+    """
+    dates = pd.Series(dates) if not isinstance(dates, pd.Series) else dates
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        seconds = dates.to_numpy().astype('datetime64[s]').astype(np.int64)
+    else:
+        seconds = parse_unique(dates, lambda values: pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+                               .to_numpy().astype('datetime64[s]'))
+    if times is None:
+        return seconds
+
+    time_seconds = parse_unique(times, lambda values: pd.to_timedelta(values, errors='coerce')
+                                .to_numpy().astype('timedelta64[s]'))
+    missing = (seconds == MISSING_SECONDS) | (time_seconds == MISSING_SECONDS)
+    return np.where(missing, MISSING_SECONDS, seconds + time_seconds)
+
+
+def frame_seconds(df):
+    """epoch_seconds of a channel frame with transaction_date and, optionally, transaction_time"""
+    return epoch_seconds(df['transaction_date'], df['transaction_time'] if 'transaction_time' in df.columns else None)
+
+
+def time_fields(seconds):
+    """
+    Calendar fields of epoch seconds with integer arithmetic, no datetime objects.
+
+    Returns:
+        dict: int64 'minutes' (of the hour), 'hours' (of the day), 'days' (of the month,
+            from 1) and 'weekday' (Monday is 0) arrays
+    """
+    days = seconds // 86400
+    return {
+        'minutes': seconds // 60 % 60,
+        'hours': seconds // 3600 % 24,
+        'days': (days.astype('datetime64[D]') - days.astype('datetime64[D]').astype('datetime64[M]'))
+        .astype(np.int64) + 1,
+        # 1970-01-01 was a Thursday
+        'weekday': (days + 3) % 7,
+    }
+
+
+def time_encoding(seconds, encodings=TIME_ENCODINGS['competition'], start=None, end=None):
+    """
+    Absolute positional and cyclic sin/cos encodings of transaction times, as float32.
+
+    Args:
+        seconds (np.ndarray): int64 epoch seconds, see epoch_seconds
+        encodings (list): Names out of 'abs' and CYCLE_PERIODS, or a key of TIME_ENCODINGS
+        start (int): Seconds mapped to an absolute position of 0, default the earliest time
+        end (int): Seconds mapped to an absolute position of 1, default the latest time
+
+    Returns:
+        dict: Column name (abs_pos_encoding, cyc_enc_<field>_sin/cos) mapped to a float32
+            array, NaN where the time is missing
+    """
+    encodings = TIME_ENCODINGS[encodings] if isinstance(encodings, str) else encodings
+    seconds = np.asarray(seconds, dtype=np.int64)
+    missing = seconds == MISSING_SECONDS
+    valid_seconds = seconds[~missing]
+    start = int(valid_seconds.min()) if start is None and len(valid_seconds) else start or 0
+    end = int(valid_seconds.max()) if end is None and len(valid_seconds) else end or 0
+    seconds = np.where(missing, start, seconds)
+
+    columns = {}
+    fields = time_fields(seconds)
+    for name in encodings:
+        if name == 'abs':
+            # Offsets are exact in int64 and only the ratio is rounded to float32
+            columns['abs_pos_encoding'] = ((seconds - start) / max(end - start, 1)).astype(np.float32)
+            continue
+        angle = fields[name].astype(np.float32) * np.float32(2 * np.pi / CYCLE_PERIODS[name])
+        columns[f'cyc_enc_{name}_sin'] = np.sin(angle)
+        columns[f'cyc_enc_{name}_cos'] = np.cos(angle)
+    for values in columns.values():
+        values[missing] = np.nan
+    return columns
+
+
+def add_time_encoding(df, encodings='competition', seconds_column='transaction_seconds', start=None, end=None):
+    """
+    Append the time encodings to a frame and drop its seconds column.
+
+    Returns:
+        pd.DataFrame: df without seconds_column, with the time_encoding columns at the end
+    """
+    columns = time_encoding(df[seconds_column].to_numpy(), encodings, start, end)
+    return df.drop(columns=seconds_column).assign(**columns)
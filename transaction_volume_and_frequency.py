@@ -1,13 +1,245 @@
 import pandas as pd
 import numpy as np
 import os
-import datetime
+import sys
+
+from raw_data_cache import load_csv
+
+TRANSACTION_TYPES = ['abm', 'card', 'cheque', 'eft', 'emt', 'wire']
+
+# Sentinels of a customer without transactions, any real date replaces them
+FIRST_DATE_SENTINEL = np.datetime64('9999-01-01', 'D')
+FINAL_DATE_SENTINEL = np.datetime64('0001-01-01', 'D')
+
+
+def channel_dates(data):
+    """transaction_date of every row of a channel, parsed once as datetime64[D]"""
+    return pd.to_datetime(data['transaction_date'], format='%Y-%m-%d').to_numpy().astype('datetime64[D]')
+
+
+def period_spans(num_days):
+    """(num_days, num_weeks, num_months) whole periods of spans given in days"""
+    num_days = np.asarray(num_days, dtype=np.int64)
+    return num_days, num_days // 7, num_days // 30
+
+
+def date_spans(first_dates, final_dates):
+    """
+    Days, weeks and months between first and final dates, as whole periods.
+
+    Works on single datetime64 values as well as on arrays of them.
+
+    Returns:
+        tuple: (num_days, num_weeks, num_months) integer arrays
+    """
+    return period_spans((np.asarray(final_dates) - np.asarray(first_dates)) // np.timedelta64(1, 'D'))
+
+
+def frequency_from_counts(counts, num_days):
+    """
+    Transactions per day, week and month of every customer and type.
+
+    Args:
+        counts (np.ndarray): (n_customers, n_types) transaction counts
+        num_days (np.ndarray): Days between each customer's first and final transaction
+
+    Returns:
+        np.ndarray: (n_customers, n_types, 3) daily, weekly and monthly frequencies
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    frequency = np.zeros(counts.shape + (3,))
+    for i, span in enumerate(period_spans(num_days)):
+        # A zero span means the transactions all fall into one period
+        divisor = np.where(span == 0, 1, span)[:, None]
+        frequency[:, :, i] = counts / divisor
+    return frequency
+
+
+# Direction of every debit_credit value the Customer model recognizes, debit is 0 and credit 1
+DIRECTIONS = {'debit': 0, 'D': 0, 'credit': 1, 'C': 1}
+
+# Per-customer columns of a CustomerStore: (shape of one customer's entry, dtype, initial value)
+STORE_COLUMNS = {
+    # order of all transaction variables is ['abm', 'card', 'cheque', 'eft', 'emt', 'wire']
+    'transaction_count': ((6, 1), np.float64, 0),
+    'transactions_frequency': ((6, 3), np.float64, 0),
+    # Debit is column 0, Credit is column 1
+    'avg_transaction_amount': ((6, 2), np.float64, 0),
+    'transaction_amount_std': ((6, 2), np.float64, 0),
+    # Running count, mean and centered sum of squares of the amounts
+    'amount_count': ((6, 2), np.float64, 0),
+    'amount_mean': ((6, 2), np.float64, 0),
+    'amount_m2': ((6, 2), np.float64, 0),
+    'first_date': ((), 'datetime64[D]', FIRST_DATE_SENTINEL),
+    'final_date': ((), 'datetime64[D]', FINAL_DATE_SENTINEL),
+}
+
+
+class CustomerStore:
+    def __init__(self, capacity=0):
+        """
+        Statistics of many customers as contiguous struct-of-arrays columns.
+
+        Every column of STORE_COLUMNS is one array whose first axis is the customer code,
+        the position of the customer in self.customer_ids. Transactions are folded into
+        running counts, means and sums of squares as they are added, so no transaction
+        rows are kept, and Customer objects are only views over one code.
+
+        Parameters:
+        capacity (int): Number of customers to allocate room for up front
+        """
+        self.customer_ids = []
+        self.codes = {}
+        self.capacity = capacity
+        for name, (shape, dtype, fill) in STORE_COLUMNS.items():
+            setattr(self, name, np.full((capacity,) + shape, fill, dtype=dtype))
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+    def __iter__(self):
+        """Yield a Customer view of every customer, in code order"""
+        return (Customer.view(self, code) for code in range(len(self)))
+
+    def __getitem__(self, customer_id):
+        code = self.codes.get(customer_id)
+        return Customer.view(self, code) if code is not None else None
+
+    def grow(self, size):
+        """Make room for at least size customers, doubling the capacity"""
+        if size <= self.capacity:
+            return
+        capacity = max(size, 2 * self.capacity)
+        for name, (shape, dtype, fill) in STORE_COLUMNS.items():
+            column = np.full((capacity,) + shape, fill, dtype=dtype)
+            column[:len(self)] = getattr(self, name)[:len(self)]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def encode(self, customer_ids):
+        """Codes of customer IDs, new customers are added to the store"""
+        row_codes, uniques = pd.factorize(np.asarray(customer_ids, dtype=object))
+        new = [customer_id for customer_id in uniques if customer_id not in self.codes]
+        self.grow(len(self) + len(new))
+        for customer_id in new:
+            self.codes[customer_id] = len(self.customer_ids)
+            self.customer_ids.append(customer_id)
+        return np.array([self.codes[customer_id] for customer_id in uniques], dtype=np.int64)[row_codes]
+
+    def add_transactions(self, transaction_type, customer_ids, amounts, debit_credit, dates):
+        """
+        Fold a batch of transactions of one type into the customers' statistics.
+
+        Args:
+            transaction_type (str): One of TRANSACTION_TYPES, 'ach' only updates the dates
+            customer_ids (array-like): Customer of every transaction
+            amounts (array-like): amount_cad of every transaction
+            debit_credit (array-like): Raw debit_credit values, see DIRECTIONS
+            dates (np.ndarray): transaction_date of every transaction as datetime64[D]
+
+        Returns:
+            np.ndarray: Code of every transaction's customer
+        """
+        codes = self.encode(customer_ids)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        np.minimum.at(self.first_date, codes, dates)
+        np.maximum.at(self.final_date, codes, dates)
+        if transaction_type not in TRANSACTION_TYPES:
+            return codes
+
+        type_index = TRANSACTION_TYPES.index(transaction_type)
+        np.add.at(self.transaction_count[:, type_index, 0], codes, 1)
+
+        direction = pd.Series(np.asarray(debit_credit, dtype=object)).map(DIRECTIONS).to_numpy()
+        known = ~np.isnan(direction)
+        amounts = pd.Series(np.asarray(amounts, dtype=np.float64)[known])
+        grouped = amounts.groupby([codes[known], direction[known].astype(np.int64)])
+        batch = pd.DataFrame({'count': grouped.size(), 'mean': grouped.mean(), 'var': grouped.var(ddof=0)})
+        rows = batch.index.get_level_values(0).to_numpy()
+        columns = batch.index.get_level_values(1).to_numpy()
+
+        # Parallel combination of the stored and the batch count, mean and m2
+        count_a = self.amount_count[rows, type_index, columns]
+        mean_a = self.amount_mean[rows, type_index, columns]
+        count_b = batch['count'].to_numpy(dtype=np.float64)
+        mean_b = batch['mean'].to_numpy()
+        count = count_a + count_b
+        delta = mean_b - mean_a
+        self.amount_mean[rows, type_index, columns] = mean_a + delta * count_b / count
+        self.amount_m2[rows, type_index, columns] += batch['var'].to_numpy() * count_b + delta ** 2 * count_a * count_b / count
+        self.amount_count[rows, type_index, columns] = count
+        return codes
+
+    @classmethod
+    def from_frames(cls, dfs):
+        """
+        Build the store of all customers in the channel DataFrames, one batch per channel.
+
+        Args:
+            dfs (dict): Transaction type mapped to a DataFrame with customer_id, amount_cad,
+                debit_credit and transaction_date columns
+
+        Returns:
+            CustomerStore: The store with frequencies and amount statistics computed
+        """
+        store = cls()
+        # Registering the sorted IDs first gives the customers codes in customer_id order
+        store.encode(np.sort(pd.unique(np.concatenate([data['customer_id'].to_numpy() for data in dfs.values()]))))
+        for transaction_type, data in dfs.items():
+            store.add_transactions(transaction_type, data['customer_id'].to_numpy(), data['amount_cad'].to_numpy(),
+                                   data['debit_credit'].to_numpy(), channel_dates(data))
+        store.finalize()
+        return store
+
+    def transaction_freq(self, codes=slice(None)):
+        """Fill transactions_frequency of some customers (all by default) from their counts"""
+        count = len(self)
+        num_days, _, _ = date_spans(self.first_date[:count][codes], self.final_date[:count][codes])
+        self.transactions_frequency[:count][codes] = frequency_from_counts(
+            self.transaction_count[:count, :, 0][codes], np.atleast_1d(num_days)).reshape(
+            self.transactions_frequency[:count][codes].shape)
+
+    def transaction_amounts(self, codes=slice(None)):
+        """Fill the average and std amounts of some customers (all by default) from the running statistics"""
+        count = len(self)
+        amount_count = self.amount_count[:count][codes]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.avg_transaction_amount[:count][codes] = np.where(amount_count > 0, self.amount_mean[:count][codes], 0)
+            self.transaction_amount_std[:count][codes] = np.where(
+                amount_count > 0, np.sqrt(np.maximum(self.amount_m2[:count][codes], 0) / amount_count), 0)
+
+    def finalize(self):
+        """Compute the frequencies and amount statistics of every customer"""
+        self.transaction_freq()
+        self.transaction_amounts()
+
+    def to_frame(self):
+        """
+        The get_header() feature table of every customer, in code order, straight from the columns.
+
+        Call finalize first when transactions were added since the last one.
+        """
+        count = len(self)
+        features = np.concatenate([self.transactions_frequency[:count].reshape(count, -1),
+                                   self.avg_transaction_amount[:count].reshape(count, -1),
+                                   self.transaction_amount_std[:count].reshape(count, -1)], axis=1)
+        df = pd.DataFrame(features, columns=get_header()[1:])
+        df.insert(0, 'customer ID', np.array(self.customer_ids, dtype=object))
+        return df
+
 
 class Customer:
-    def __init__(self, ID):
+    __slots__ = ('store', 'code')
+
+    def __init__(self, ID, store=None):
         '''
-        self.transactions is a dictionary with keys of transaction processes and value of list of lists 
-            storing transaction information of all transaction for customer with id: ID
+        View of one customer's row in a CustomerStore.
+
+        A Customer created on its own gets a private store, so it can still be used row by
+        row with add_transaction. The statistics attributes (transaction_count,
+        transactions_frequency, avg_transaction_amount, transaction_amount_std,
+        first_date, final_date) are views into the store's columns.
+
         Each transaction should contain the method of money transfer
 
         Wire transaction: [amount_cad,debit_credit,transaction_date,transaction_time]
@@ -17,18 +249,44 @@ class Customer:
         EFT (Electronic Funds) transaction: [amount_cad,debit_credit,transaction_date,transaction_time]
         EMT (Email Money) transaction: [amount_cad,debit_credit,transaction_date,transaction_time]
         '''
-        self.ID = ID
-        self.transactions = dict()
-        self.merchant_catagories = []
-        # order of all transaction variables is ['abm', 'card', 'cheque', 'eft', 'emt', 'wire']
-        self.transaction_count = np.zeros((6,1))
-        self.transactions_frequency = np.zeros((6,3))
-        # Debit is column 0, Credit is column 2
-        self.avg_transaction_amount = np.zeros((6,2))
-        self.transaction_amount_std = np.zeros((6,2))
-
-        self.first_date = datetime.datetime(9999, 1, 1)
-        self.final_date = datetime.datetime(1, 1, 1)
+        self.store = store if store is not None else CustomerStore(capacity=1)
+        self.code = self.store.encode([ID])[0]
+
+    @classmethod
+    def view(cls, store, code):
+        """Customer view of an existing code of a store, without looking up its ID again"""
+        customer = cls.__new__(cls)
+        customer.store = store
+        customer.code = code
+        return customer
+
+    @property
+    def ID(self):
+        return self.store.customer_ids[self.code]
+
+    @property
+    def transaction_count(self):
+        return self.store.transaction_count[self.code]
+
+    @property
+    def transactions_frequency(self):
+        return self.store.transactions_frequency[self.code]
+
+    @property
+    def avg_transaction_amount(self):
+        return self.store.avg_transaction_amount[self.code]
+
+    @property
+    def transaction_amount_std(self):
+        return self.store.transaction_amount_std[self.code]
+
+    @property
+    def first_date(self):
+        return self.store.first_date[self.code]
+
+    @property
+    def final_date(self):
+        return self.store.final_date[self.code]
 
     def transaction_freq(self):
         '''
@@ -36,97 +294,41 @@ class Customer:
                     day (index 0), week (index 1) and month (index 2)
         Transaction types in order of index: [abm, card, cheque, eft, emt, wire] 
         '''
-        num_days = self.final_date - self.first_date
-        num_weeks = num_days.days//7
-        num_months = num_days.days//30
-            
-        for i,type in enumerate(['abm', 'card', 'cheque', 'eft', 'emt', 'wire']):
-            if type in self.transactions.keys():
-                transaction_count = len(self.transactions[type])
-                if len(self.transactions[type]) == 0:
-                    self.transaction_count[i,0] = transaction_count
-                    self.transactions_frequency[i,0] = transaction_count
-                    self.transactions_frequency[i,1] = transaction_count
-                    self.transactions_frequency[i,2] = transaction_count
-                else:
-                    if num_days.days == 0:
-                        self.transactions_frequency[i,0] = transaction_count
-                    else:
-                        self.transactions_frequency[i,0] = transaction_count / num_days.days
-                    
-                    if num_weeks == 0:
-                        self.transactions_frequency[i,1] = transaction_count
-                    else:
-                        self.transactions_frequency[i,1] = transaction_count / num_weeks
-
-                    if num_months == 0:
-                        self.transactions_frequency[i,2] = transaction_count
-                    else:
-                        self.transactions_frequency[i,2] = transaction_count / num_months
-                        
-                      
-                    # self.transaction_count[i,0] = len(self.transactions[type])         
-                    # self.transactions_frequency[i,0] = self.transaction_count[i,0] / num_days.days
-                    # self.transactions_frequency[i,1] = self.transaction_count[i,0] / num_weeks
-                    # self.transactions_frequency[i,2] = self.transaction_count[i,0] / num_months
-            
+        self.store.transaction_freq([self.code])
 
     def transaction_amounts(self):
         '''
         Finds avg transaction amount for each transaction type
         '''
-        for i,type in enumerate(['abm', 'card', 'cheque', 'eft', 'emt', 'wire']):
-            if type not in self.transactions.keys():
-                continue
-            total_credited = []
-            total_debited = []
-            for transaction in self.transactions[type]:
-                if transaction[3] in ['credit', 'C']:
-                    total_credited.append(transaction[2])
-                if transaction[3] in ['debit', 'D']:
-                    total_debited.append(transaction[2])
-            if len(total_credited) != 0:
-                self.avg_transaction_amount[i,1] = sum(total_credited)/len(total_credited)
-                self.transaction_amount_std[i,1] = np.std(total_credited)
-            else:
-                self.avg_transaction_amount[i,1] = 0
-                self.transaction_amount_std[i,1] = 0
-            
-            if len(total_debited) != 0:
-                self.avg_transaction_amount[i,0] = sum(total_debited)/len(total_debited)
-                self.transaction_amount_std[i,0] = np.std(total_debited)
-            else:
-                self.avg_transaction_amount[i,0] = 0
-                self.transaction_amount_std[i,0] = 0
-            
+        self.store.transaction_amounts([self.code])
 
     def add_transaction(self,type,transaction):
         '''
         type should be the transaction process
         transaction is a list of detailed transaction information
         '''
-        if type not in ['abm', 'card', 'cheque', 'eft', 'emt', 'wire', 'ach']: 
-            print("*****TRANSACTION TYPE IS NOT FOUND******\n DATA WAS NOT ALLOCATED PLEASE TRY AGAIN")
-            return 1
-        
-        if type not in self.transactions.keys():
-            self.transactions[type] = [transaction]
-        else:
-            self.transactions[type].append(transaction)
-        
         if type == 'cheque': 
                 date_col = -1 
         else: 
             date_col = -2
-        
-        date = transaction[date_col].split('-')
-        date[0], date[1], date[2] = int(date[0]), int(date[1]), int(date[2])
-        if self.first_date > datetime.datetime(date[0],date[1],date[2]):
-            self.first_date = datetime.datetime(date[0],date[1],date[2])
-        if self.final_date < datetime.datetime(date[0],date[1],date[2]):
-            self.final_date = datetime.datetime(date[0],date[1],date[2])
 
-   
+        return self.add_transactions(type, [transaction], np.array([transaction[date_col]], dtype='datetime64[D]'))
+
+    def add_transactions(self, type, transactions, dates):
+        '''
+        Add several transactions of one type at once.
+
+        transactions are rows like the ones of add_transaction and dates their
+        transaction_date already parsed into a datetime64[D] array. Only the running
+        statistics are updated, the rows are not kept.
+        '''
+        if type not in ['abm', 'card', 'cheque', 'eft', 'emt', 'wire', 'ach']: 
+            print("*****TRANSACTION TYPE IS NOT FOUND******\n DATA WAS NOT ALLOCATED PLEASE TRY AGAIN")
+            return 1
+
+        transactions = np.asarray(transactions, dtype=object).reshape(len(dates), -1)
+        self.store.add_transactions(type, np.full(len(dates), self.ID, dtype=object),
+                                    transactions[:, 2], transactions[:, 3], dates)
 
     def get_feature_vector(self):
         freq_data = []
@@ -169,39 +371,117 @@ def get_header():
     header = ['customer ID'] + freq_header + avg_header + var_header
     return header
 
-if __name__ == "__main__":
-    customers = dict()
-    # os.chdir("./Raw Data/")
-    files = os.listdir()
-    for file in files:
+def load_transaction_files(folder_path=os.curdir):
+    """
+    Load the transaction channel CSVs found in folder_path.
+
+    Returns:
+        dict: Transaction type mapped to its DataFrame. Card amounts are made positive,
+            because all the credited transactions are negative in the card.csv file but
+            all the other type of transactions are positive for both credited and debited transactions.
+    """
+    dfs = dict()
+    for file in sorted(os.listdir(folder_path)):
         if file not in ['abm.csv', 'card.csv', 'cheque.csv', 'eft.csv', 'emt.csv', 'wire.csv']:
             continue
-        data = pd.read_csv(file)
-        
-        # Because all the credited transactions are negative in the card.csv file 
-        # But all the other type of transactions are positive for both credited and debited transactions. 
-        if file == 'card.csv': 
-            data['amount_cad'] = data['amount_cad'].abs() 
-        transaction_type = file.split('.')[0]
-        for _, transaction in data.iterrows():
-            transaction = transaction.values
-            if transaction[1] not in customers.keys():
-                cur_customer = Customer(transaction[1])
-                cur_customer.add_transaction(transaction_type, transaction) 
-                customers[transaction[1]] = cur_customer
-            else:
-                cur_customer = customers[transaction[1]]
-                cur_customer.add_transaction(transaction_type, transaction) 
-                customers[transaction[1]] = cur_customer
-    
-    customer_data = []
-    for customer in customers.keys():
-        customers[customer].transaction_freq()
-        customers[customer].transaction_amounts()        
-        customer_data.append(customers[customer].get_feature_vector())
-
-    columns = get_header()
-
-    df = pd.DataFrame(customer_data, columns=columns)
-
-    pd.DataFrame.to_csv(df,'Transaction Volume and Frequency.csv')
\ No newline at end of file
+        data = load_csv(os.path.join(folder_path, file)).drop(columns='transaction_datetime')
+        if file == 'card.csv':
+            data['amount_cad'] = data['amount_cad'].abs()
+        dfs[file.split('.')[0]] = data
+    return dfs
+
+
+def customer_model_features(dfs):
+    """
+    Build the feature table with the CustomerStore behind the Customer class.
+
+    Both this and transaction_features are pinned to the original per-transaction
+    Customer class by tests/test_transaction_volume_and_frequency.py.
+    """
+    return CustomerStore.from_frames(dfs).to_frame()
+
+
+def transaction_features(dfs):
+    """
+    Columnar version of customer_model_features.
+
+    All channels are stacked into a single frame and the frequency, mean and std
+    features are computed with groupby aggregations instead of per-row Customer updates.
+
+    Args:
+        dfs (dict): Transaction type mapped to a DataFrame with customer_id, amount_cad,
+            debit_credit and transaction_date columns
+
+    Returns:
+        pd.DataFrame: Same get_header() columns as customer_model_features, one row per
+            customer sorted by customer ID
+    """
+    types = ['abm', 'card', 'cheque', 'eft', 'emt', 'wire']
+    frames = []
+    for transaction_type, data in dfs.items():
+        if transaction_type not in types:
+            continue
+        direction = data['debit_credit'].map({'debit': 0, 'D': 0, 'credit': 1, 'C': 1})
+        frames.append(pd.DataFrame({
+            'customer_id': data['customer_id'].to_numpy(),
+            'type': types.index(transaction_type),
+            'amount': data['amount_cad'].to_numpy(dtype=np.float64),
+            'direction': direction.to_numpy(),
+            'date': pd.to_datetime(data['transaction_date'], format='%Y-%m-%d').to_numpy(),
+        }))
+    combined = pd.concat(frames, ignore_index=True)
+    customer_ids = np.sort(combined['customer_id'].unique())
+
+    # The date span is taken over all transaction types of a customer
+    dates = combined.groupby('customer_id')['date'].agg(['min', 'max']).reindex(customer_ids)
+    num_days = (dates['max'] - dates['min']).dt.days.to_numpy()
+
+    counts = combined.groupby(['customer_id', 'type']).size().unstack(fill_value=0)
+    counts = counts.reindex(index=customer_ids, columns=range(len(types)), fill_value=0).to_numpy(dtype=np.float64)
+
+    amounts = combined.dropna(subset=['direction']).groupby(['customer_id', 'type', 'direction'])['amount']
+    stats = pd.DataFrame({'mean': amounts.mean(), 'std': amounts.std(ddof=0)})
+    average = np.zeros((len(customer_ids), len(types), 2))
+    std = np.zeros((len(customer_ids), len(types), 2))
+    rows = np.searchsorted(customer_ids, stats.index.get_level_values('customer_id'))
+    type_idx = stats.index.get_level_values('type').to_numpy()
+    direction_idx = stats.index.get_level_values('direction').to_numpy().astype(int)
+    average[rows, type_idx, direction_idx] = stats['mean'].to_numpy()
+    std[rows, type_idx, direction_idx] = stats['std'].to_numpy()
+
+    return assemble_features(customer_ids, num_days, counts, average, std)
+
+
+def assemble_features(customer_ids, num_days, counts, average, std):
+    """
+    Turn per-customer statistics into the get_header() feature table.
+
+    Args:
+        customer_ids (np.ndarray): Customer IDs, one per row
+        num_days (np.ndarray): Days between each customer's first and final transaction
+        counts (np.ndarray): (n_customers, 6) transaction counts per type
+        average (np.ndarray): (n_customers, 6, 2) debit/credit mean amount per type
+        std (np.ndarray): (n_customers, 6, 2) debit/credit amount std per type
+
+    Returns:
+        pd.DataFrame: Feature table with a 'customer ID' column
+    """
+    frequency = frequency_from_counts(counts, num_days)
+    features = np.concatenate([frequency.reshape(len(customer_ids), -1),
+                               average.reshape(len(customer_ids), -1),
+                               std.reshape(len(customer_ids), -1)], axis=1)
+    df = pd.DataFrame(features, columns=get_header()[1:])
+    df.insert(0, 'customer ID', customer_ids)
+    return df
+
+
+if __name__ == "__main__":
+    # os.chdir("./Raw Data/")
+    dfs = load_transaction_files()
+
+    if '--customer-model' in sys.argv:
+        df = customer_model_features(dfs)
+    else:
+        df = transaction_features(dfs)
+
+    pd.DataFrame.to_csv(df,'Transaction Volume and Frequency.csv')
@@ -0,0 +1,178 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+# Categorical columns one-hot encoded by trx_level_features.ipynb and synth_trx_level_features.ipynb
+COMP_CATEGORICAL_FIELDS = ['debit_credit', 'trx_type', 'cash_indicator', 'country', 'province', 'city',
+                           'merchant_category', 'ecommerce_ind']
+SYNTH_CATEGORICAL_FIELDS = ['debit_credit', 'trx_type', 'currency']
+
+# Missing categorical values, same as the notebooks' fillna('other')
+FILL_VALUE = 'other'
+
+
+def bit_width(max_value):
+    """Number of bits of the binary form of max_value, like len(np.binary_repr(max_value))"""
+    return max(int(max_value).bit_length(), 1)
+
+
+def unpack_bits(values, width=None, dtype=np.uint8):
+    """
+    Binary form of non-negative integer IDs as a bit matrix, most significant bit first.
+
+    The bits come from shifting and masking a uint32 array, so no string is built per
+    value and per bit like with np.binary_repr.
+
+    Args:
+        values (array-like): Integer IDs below 2**32
+        width (int): Number of bits, default bit_width of the largest value
+        dtype: uint8 for 0/1 columns or bool
+
+    Returns:
+        np.ndarray: (n_values, width) array, column 0 is the highest bit
+    """
+    values = np.asarray(values, dtype=np.uint32)
+    if width is None:
+        width = bit_width(values.max() if len(values) else 0)
+    shifts = np.arange(width - 1, -1, -1, dtype=np.uint32)
+    return ((values[:, None] >> shifts) & np.uint32(1)).astype(dtype)
+
+
+def binary_columns(values, prefix, width=None, dtype=np.uint8):
+    """
+    unpack_bits as named columns, e.g. city_bin_0 .. city_bin_18 for the synthetic bank IDs.
+
+    Returns:
+        dict: Column name f'{prefix}_{i}' mapped to the i-th highest bit, ready for df.assign
+    """
+    bits = unpack_bits(values, width, dtype)
+    return {f'{prefix}_{i}': bits[:, i] for i in range(bits.shape[1])}
+
+
+class CategoricalEncoder:
+    def __init__(self, vocab):
+        """
+        Integer-code encoder for the categorical transaction fields.
+
+        Every field value is stored as its position in a fixed vocabulary. The vocabulary
+        is saved to a JSON file so encodings stay the same across runs and datasets. Values
+        missing from the vocabulary get code -1, which is an all-zero one-hot row like
+        pd.get_dummies gives for a category it never saw.
+
+        Parameters:
+        vocab (dict): Field name mapped to its list of values, as strings
+        """
+        self.vocab = vocab
+        self.fields = list(vocab.keys())
+        sizes = [len(values) for values in vocab.values()]
+        # Start of every field's block in the one-hot / embedding index space
+        self.offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+
+    @staticmethod
+    def field_values(df, field):
+        """A field's values as strings, with missing values filled with FILL_VALUE"""
+        return df[field].astype(object).where(df[field].notna(), FILL_VALUE).astype(str)
+
+    @classmethod
+    def fit(cls, df, fields=COMP_CATEGORICAL_FIELDS):
+        """Build the vocabulary from the sorted distinct values of every field"""
+        return cls({field: sorted(cls.field_values(df, field).unique()) for field in fields})
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def load_or_fit(cls, path, df, fields=COMP_CATEGORICAL_FIELDS):
+        """
+        Encoder of the given fields from the vocabulary file, fitted on df and saved there
+        when the file does not exist or has no vocabulary for some of the fields.
+
+        Fields already in the file keep their vocabulary, so their codes stay the same.
+        """
+        vocab = cls.load(path).vocab if Path(path).exists() else {}
+        missing = [field for field in fields if field not in vocab]
+        if missing:
+            if vocab:
+                print(f"{path} has no vocabulary for {missing}, fitting it")
+            vocab.update(cls.fit(df, missing).vocab)
+            cls(vocab).save(path)
+        return cls({field: vocab[field] for field in fields})
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.vocab, f, indent=1)
+
+    @property
+    def n_features(self):
+        """Width of the one-hot expansion"""
+        return int(self.offsets[-1])
+
+    def columns(self):
+        """One-hot column names, in the pd.get_dummies naming"""
+        return [f'{field}_{value}' for field, values in self.vocab.items() for value in values]
+
+    def transform(self, df):
+        """
+        Encode the categorical fields of a frame.
+
+        Returns:
+            np.ndarray: (n_rows, n_fields) int32 codes, -1 for values outside the vocabulary
+        """
+        codes = np.empty((len(df), len(self.fields)), dtype=np.int32)
+        for i, field in enumerate(self.fields):
+            codes[:, i] = pd.Categorical(self.field_values(df, field), categories=self.vocab[field]).codes
+        return codes
+
+    def encode_frame(self, df):
+        """Replace the categorical fields of a frame by their int32 codes"""
+        codes = self.transform(df)
+        return df.assign(**{field: codes[:, i] for i, field in enumerate(self.fields)})
+
+    def embedding_indices(self, codes, oov=False):
+        """
+        Shift every field's codes into one shared index space, e.g. for a single nn.Embedding.
+
+        Args:
+            codes (np.ndarray): Codes from transform
+            oov (bool): Map values outside the vocabulary to the reserved index n_features
+                instead of -1, which nn.Embedding cannot look up. The embedding table then
+                needs n_features + 1 rows.
+
+        Returns:
+            np.ndarray: Codes plus the field offsets
+        """
+        codes = np.asarray(codes)
+        return np.where(codes >= 0, codes + self.offsets[:-1], self.n_features if oov else -1)
+
+    def to_sparse(self, codes):
+        """
+        One-hot encode codes as a CSR matrix with at most one entry per field and row.
+
+        Returns:
+            scipy.sparse.csr_matrix: (n_rows, n_features) float32 matrix
+        """
+        indices = self.embedding_indices(codes)
+        rows = np.repeat(np.arange(len(indices)), indices.shape[1])
+        cols = indices.ravel()
+        known = cols >= 0
+        data = np.ones(known.sum(), dtype=np.float32)
+        return sparse.csr_matrix((data, (rows[known], cols[known])), shape=(len(indices), self.n_features))
+
+    def to_dense(self, codes):
+        """
+        One-hot encode codes of any leading shape, e.g. a (batch, seq_len, n_fields) batch.
+
+        Returns:
+            np.ndarray: float32 array of shape codes.shape[:-1] + (n_features,)
+        """
+        indices = self.embedding_indices(codes)
+        dense = np.zeros(indices.shape[:-1] + (self.n_features + 1,), dtype=np.float32)
+        # Unknown values (-1) land in the extra last column, which is dropped
+        np.put_along_axis(dense, np.where(indices >= 0, indices, self.n_features), 1, axis=-1)
+        return dense[..., :self.n_features]